@@ -0,0 +1,275 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import platform
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from BankSystem import BankService, BankError, LEDGER_SIGNS, formatCents, timestampDate, dateTimestamp, optionValue
+from BankServer import percentile
+
+BENCHMARK_PASSWORD = 'benchmark password'
+RESULTS_VERSION = 1
+
+def peakMemory():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1048576 if sys.platform == 'darwin' else peak_rss / 1024
+
+def accountWeights(account_count, skew):
+    # Zipf-like activity: the account of rank r is picked in proportion to 1 / r ** skew, so a
+    # few accounts see most of the traffic, as in a real ledger.
+    return list(accumulate(1.0 / (account_rank + 1) ** skew for account_rank in range(account_count)))
+
+def generateLedger(bank_folder, account_count, transaction_count, day_count=365, skew=1.1, random_seed=1, backend_name='csv'):
+    if os.path.isdir(bank_folder) and os.listdir(bank_folder):
+        raise BankError("Benchmark folder is not empty: " + bank_folder)
+    random_source = random.Random(random_seed)
+    bank = BankService(bank_folder)
+    stored_password = bank.hidePass(BENCHMARK_PASSWORD)
+    bank.close()
+    for generated_path in ('stats.json', 'snapshot.bin'):
+        if os.path.isfile(os.path.join(bank_folder, generated_path)):
+            os.remove(os.path.join(bank_folder, generated_path))
+
+    # Every account gets the same password hash; hashing a million passwords would take hours and
+    # is measured by the login benchmark instead.
+    account_names = ['user' + str(account_number) for account_number in range(account_count)]
+    account_balances = [0] * account_count
+    row_count = account_count + transaction_count
+    first_timestamp = dateTimestamp((datetime.now() - timedelta(days=day_count)).strftime('%Y-%m-%d 00:00:00'))
+    seconds_per_row = day_count * 86400 / max(1, row_count)
+    cumulative_weights = accountWeights(account_count, skew)
+    written_count = 0
+
+    with open(os.path.join(bank_folder, 'transactions.csv'), 'w', newline='') as file_handle:
+        csv_writer = csv.writer(file_handle)
+        csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
+        def writeRow(account_number, transaction_type, amount_cents, row_details):
+            nonlocal written_count
+            account_balances[account_number] += LEDGER_SIGNS[transaction_type] * amount_cents
+            csv_writer.writerow([
+                account_names[account_number],
+                timestampDate(int(first_timestamp + written_count * seconds_per_row)),
+                transaction_type,
+                formatCents(amount_cents),
+                formatCents(account_balances[account_number]),
+                row_details
+            ])
+            written_count += 1
+
+        for account_number in range(account_count):
+            writeRow(account_number, 'ACCOUNT_CREATION', random_source.randrange(0, 500000), 'Initial deposit')
+        while written_count < row_count:
+            chosen_accounts = random_source.choices(range(account_count), cum_weights=cumulative_weights, k=2)
+            amount_cents = min(10000000, int(random_source.lognormvariate(8, 1.2)))
+            operation_roll = random_source.random()
+            account_number = chosen_accounts[0]
+            if operation_roll < 0.25 and written_count + 1 < row_count and chosen_accounts[1] != account_number and account_balances[account_number] >= amount_cents:
+                recipient_number = chosen_accounts[1]
+                writeRow(account_number, 'TRANSFER_OUT', amount_cents, "Transfer to " + account_names[recipient_number] + ": synthetic")
+                writeRow(recipient_number, 'TRANSFER_IN', amount_cents, "Transfer from " + account_names[account_number] + ": synthetic")
+            elif operation_roll < 0.55 and account_balances[account_number] >= amount_cents:
+                writeRow(account_number, 'WITHDRAWAL', amount_cents, 'Cash withdrawal')
+            else:
+                writeRow(account_number, 'DEPOSIT', amount_cents, 'Cash deposit')
+
+    with open(os.path.join(bank_folder, 'users.csv'), 'w', newline='') as file_handle:
+        csv_writer = csv.writer(file_handle)
+        csv_writer.writerow(['username', 'password', 'balance'])
+        for account_number in range(account_count):
+            csv_writer.writerow([account_names[account_number], stored_password, formatCents(account_balances[account_number])])
+
+    bank = BankService(bank_folder)
+    if backend_name != 'csv':
+        bank.migrateStorage(backend_name)
+    elif bank.storage.rotationDue(bank.bank_config['segment_size'], bank.bank_config['segment_days']):
+        # Otherwise the first commit of the benchmark run would close the whole generated journal.
+        bank.rotateJournal()
+    bank.close()
+    return {'accounts': account_count, 'transactions': written_count}
+
+def timeOperation(operation_function, iteration_count, time_budget):
+    # Runs the operation up to iteration_count times, stopping early once time_budget seconds have
+    # been spent (but always at least once).
+    latencies = []
+    error_count = 0
+    started_at = time.perf_counter()
+    for iteration_number in range(iteration_count):
+        call_started = time.perf_counter()
+        try:
+            operation_function(iteration_number)
+        except BankError:
+            error_count += 1
+        latencies.append(time.perf_counter() - call_started)
+        if time.perf_counter() - started_at >= time_budget:
+            break
+    elapsed_seconds = time.perf_counter() - started_at
+    latencies.sort()
+    return {
+        'samples': len(latencies),
+        'errors': error_count,
+        'seconds': round(elapsed_seconds, 6),
+        'ops_per_second': round(len(latencies) / elapsed_seconds, 3) if elapsed_seconds else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4),
+        'peak_rss_mb': peakMemory()
+    }
+
+def runBenchmarks(bank_folder, iteration_count=200, time_budget=5.0, random_seed=1):
+    random_source = random.Random(random_seed)
+    benchmark_results = {}
+
+    started_at = time.perf_counter()
+    bank = BankService(bank_folder)
+    startup_seconds = time.perf_counter() - started_at
+    try:
+        account_names = list(bank.account_index)
+        if not account_names:
+            raise BankError("Benchmark folder has no accounts: " + bank_folder)
+        statistics = bank.statistics()
+        dataset = {
+            'folder': os.path.abspath(bank_folder),
+            'storage_backend': bank.bank_config['storage_backend'],
+            'accounts': statistics['account_count'],
+            'transactions': statistics['transaction_count'],
+            'startup_seconds': round(startup_seconds, 6)
+        }
+        # Accounts are picked with the same skew as the generator, so hot accounts dominate here too.
+        cumulative_weights = accountWeights(len(account_names), 1.1)
+        def pickAccounts(pick_count):
+            return random_source.choices(account_names, cum_weights=cumulative_weights, k=pick_count)
+        def pickPair():
+            sender_username, recipient_username = pickAccounts(2)
+            while recipient_username == sender_username and len(account_names) > 1:
+                recipient_username = random_source.choice(account_names)
+            return sender_username, recipient_username
+
+        def deposit(iteration_number):
+            # Goes through validation and commitChanges like any deposit, so the ledger stays reconcilable.
+            bank.deposit(pickAccounts(1)[0], formatCents(random_source.randint(1, 10000)), 'benchmark')
+        def updateBalance(iteration_number):
+            account_username = pickAccounts(1)[0]
+            bank.updateBalance(account_username, bank.getUser(account_username).balance)
+            bank.flushAccounts()
+        def coldLogin(iteration_number):
+            # Repeat logins are answered from the verified-password cache; clearing it first measures
+            # the full key derivation.
+            with bank.password_hasher.cache_guard:
+                bank.password_hasher.verified_cache.clear()
+            bank.authenticate(pickAccounts(1)[0], BENCHMARK_PASSWORD)
+        def transfer(iteration_number):
+            sender_username, recipient_username = pickPair()
+            bank.transfer(sender_username, recipient_username, '0.01', 'benchmark')
+
+        whole_ledger_iterations = max(1, min(iteration_count, 5))
+        benchmark_operations = [
+            ('getAccounts', lambda iteration_number: bank.getAccounts(), whole_ledger_iterations),
+            ('getTrans', lambda iteration_number: bank.getTrans(), whole_ledger_iterations),
+            ('deposit', deposit, iteration_count),
+            ('updateBalance', updateBalance, iteration_count),
+            ('userTrans', lambda iteration_number: bank.userTrans(pickAccounts(1)[0], 15), iteration_count),
+            ('showStats', lambda iteration_number: bank.statistics(), iteration_count),
+            ('transfer', transfer, iteration_count),
+            ('login', lambda iteration_number: bank.authenticate(pickAccounts(1)[0], BENCHMARK_PASSWORD), iteration_count),
+            ('coldLogin', coldLogin, iteration_count),
+            ('history', lambda iteration_number: bank.history(pickAccounts(1)[0], 15), iteration_count)
+        ]
+        for operation_name, operation_function, operation_iterations in benchmark_operations:
+            benchmark_results[operation_name] = timeOperation(operation_function, operation_iterations, time_budget)
+            print(f"{operation_name:<14} {benchmark_results[operation_name]['samples']:>7} runs  p50 {benchmark_results[operation_name]['p50_ms']:>10.3f} ms  p99 {benchmark_results[operation_name]['p99_ms']:>10.3f} ms", file=sys.stderr)
+    finally:
+        bank.close()
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(' ', 'seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'dataset': dataset,
+        'settings': {'iterations': iteration_count, 'seconds_per_operation': time_budget, 'seed': random_seed},
+        'operations': benchmark_results,
+        'peak_rss_mb': peakMemory()
+    }
+
+def compareResults(baseline_results, current_results, threshold_percent=10.0):
+    # An operation regresses when its median latency or its throughput is more than threshold_percent worse.
+    regressions = []
+    print(f"{'Operation':<14} {'Base p50 ms':>12} {'New p50 ms':>12} {'Change':>8} {'Base ops/s':>12} {'New ops/s':>12} {'Change':>8}")
+    for operation_name, baseline_operation in baseline_results['operations'].items():
+        current_operation = current_results['operations'].get(operation_name)
+        if current_operation is None:
+            print(f"{operation_name:<14} missing from the new results")
+            continue
+        latency_change = (current_operation['p50_ms'] - baseline_operation['p50_ms']) / baseline_operation['p50_ms'] * 100 if baseline_operation['p50_ms'] else 0.0
+        throughput_change = (current_operation['ops_per_second'] - baseline_operation['ops_per_second']) / baseline_operation['ops_per_second'] * 100 if baseline_operation['ops_per_second'] else 0.0
+        regressed = latency_change > threshold_percent or throughput_change < -threshold_percent
+        if regressed:
+            regressions.append(operation_name)
+        print(f"{operation_name:<14} {baseline_operation['p50_ms']:>12.3f} {current_operation['p50_ms']:>12.3f} {latency_change:>+7.1f}% {baseline_operation['ops_per_second']:>12.1f} {current_operation['ops_per_second']:>12.1f} {throughput_change:>+7.1f}%{'  REGRESSION' if regressed else ''}")
+    baseline_rss, current_rss = baseline_results.get('peak_rss_mb'), current_results.get('peak_rss_mb')
+    if baseline_rss and current_rss:
+        rss_change = (current_rss - baseline_rss) / baseline_rss * 100
+        if rss_change > threshold_percent:
+            regressions.append('peak RSS')
+        print(f"Peak RSS: {baseline_rss:.1f} MB -> {current_rss:.1f} MB ({rss_change:+.1f}%){'  REGRESSION' if rss_change > threshold_percent else ''}")
+    if baseline_results.get('dataset', {}).get('transactions') != current_results.get('dataset', {}).get('transactions'):
+        print("Warning: the two runs used ledgers of different sizes")
+    print("Regressions: " + (", ".join(regressions) if regressions else "none") + f" (threshold {threshold_percent:g}%)")
+    return regressions
+
+def initialize():
+    if '--generate' in sys.argv[1:]:
+        bank_folder = optionValue('--generate', None)
+        try:
+            generated_counts = generateLedger(
+                bank_folder,
+                int(optionValue('--accounts', 10000)),
+                int(optionValue('--transactions', 100000)),
+                int(optionValue('--days', 365)),
+                float(optionValue('--skew', 1.1)),
+                int(optionValue('--seed', 1)),
+                optionValue('--backend', 'csv')
+            )
+        except BankError as err:
+            print(err)
+            sys.exit(1)
+        print(f"Generated {generated_counts['accounts']} accounts and {generated_counts['transactions']} journal rows in {bank_folder}")
+        return
+    if '--run' in sys.argv[1:]:
+        benchmark_results = runBenchmarks(optionValue('--run', None), int(optionValue('--iterations', 200)), float(optionValue('--seconds', 5.0)), int(optionValue('--seed', 1)))
+        results_text = json.dumps(benchmark_results, indent=2)
+        output_path = optionValue('--output', None)
+        if output_path:
+            with open(output_path, 'w') as file_handle:
+                file_handle.write(results_text + '\n')
+            print("Results written to " + output_path)
+        else:
+            print(results_text)
+        return
+    if '--compare' in sys.argv[1:]:
+        compare_index = sys.argv.index('--compare')
+        with open(sys.argv[compare_index + 1], 'r') as file_handle:
+            baseline_results = json.load(file_handle)
+        with open(sys.argv[compare_index + 2], 'r') as file_handle:
+            current_results = json.load(file_handle)
+        sys.exit(1 if compareResults(baseline_results, current_results, float(optionValue('--threshold', 10.0))) else 0)
+    print("Usage: python BankBench.py --generate FOLDER [--accounts N] [--transactions N] [--days N] [--skew S] [--seed N] [--backend csv|sqlite]")
+    print("       python BankBench.py --run FOLDER [--iterations N] [--seconds S] [--seed N] [--output results.json]")
+    print("       python BankBench.py --compare BASE.json NEW.json [--threshold PERCENT]")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    initialize()
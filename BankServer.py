@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import functools
+import threading
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from BankSystem import BankService, BankError, AuthenticationError, InvalidInputError, InvalidAmountError, TransactionResult, logProblem, optionValue
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+class BankServer:
+    def __init__(self, bank_service=None, worker_count=8):
+        self.bank = bank_service or BankService()
+        self.executor = ThreadPoolExecutor(max_workers=worker_count)
+        self.open_sessions = 0
+        self.request_handlers = {
+            'ping': self.handlePing,
+            'create_account': self.handleCreateAccount,
+            'login': self.handleLogin,
+            'logout': self.handleLogout,
+            'balance': self.handleBalance,
+            'deposit': self.handleDeposit,
+            'withdraw': self.handleWithdraw,
+            'transfer': self.handleTransfer,
+            'history': self.handleHistory,
+            'stats': self.handleStats,
+            'sync': self.handleSync
+        }
+
+    async def runService(self, service_method, *method_args):
+        # Service calls block on disk syncs, so they run on worker threads and the
+        # per-account locks inside BankService keep concurrent sessions consistent.
+        event_loop = asyncio.get_running_loop()
+        return await event_loop.run_in_executor(self.executor, functools.partial(service_method, *method_args))
+
+    def sessionUser(self, session_state):
+        if session_state['username'] is None:
+            raise AuthenticationError("Not logged in!")
+        return session_state['username']
+
+    def requestAmount(self, request_data):
+        # Amounts may be sent as JSON numbers or as strings such as "12.34"; the service
+        # converts them to integer cents and rejects anything that is not a whole cent.
+        request_amount = request_data.get('amount')
+        if isinstance(request_amount, bool) or not isinstance(request_amount, (int, float, str)):
+            raise InvalidAmountError("Invalid amount!")
+        return request_amount
+
+    def requestCount(self, request_data, field_name, default_count):
+        # History paging values may be JSON numbers or digit strings; anything else is refused
+        # here instead of failing inside the history scan.
+        request_count = request_data.get(field_name)
+        if request_count is None:
+            return default_count
+        if isinstance(request_count, str) and request_count.strip().isdigit():
+            request_count = int(request_count)
+        if isinstance(request_count, bool) or not isinstance(request_count, int) or request_count < 0:
+            raise InvalidInputError("History " + field_name + " must be a non-negative whole number!")
+        return request_count
+
+    def resultData(self, service_result):
+        if isinstance(service_result, TransactionResult):
+            return vars(service_result)
+        return service_result
+
+    async def handlePing(self, request_data, session_state):
+        return 'pong'
+
+    async def handleCreateAccount(self, request_data, session_state):
+        return await self.runService(
+            self.bank.createAccount,
+            str(request_data.get('username') or '').strip(),
+            str(request_data.get('password') or ''),
+            self.requestAmount(request_data) if request_data.get('amount') is not None else 0
+        )
+
+    async def handleLogin(self, request_data, session_state):
+        login_username = str(request_data.get('username') or '').strip()
+        await self.runService(self.bank.authenticate, login_username, str(request_data.get('password') or ''))
+        session_state['username'] = login_username
+        return {'username': login_username}
+
+    async def handleLogout(self, request_data, session_state):
+        session_state['username'] = None
+        return None
+
+    async def handleBalance(self, request_data, session_state):
+        return await self.runService(self.bank.balance, self.sessionUser(session_state))
+
+    async def handleDeposit(self, request_data, session_state):
+        return await self.runService(self.bank.deposit, self.sessionUser(session_state), self.requestAmount(request_data), str(request_data.get('description') or ''))
+
+    async def handleWithdraw(self, request_data, session_state):
+        return await self.runService(self.bank.withdraw, self.sessionUser(session_state), self.requestAmount(request_data), str(request_data.get('description') or ''))
+
+    async def handleTransfer(self, request_data, session_state):
+        return await self.runService(
+            self.bank.transfer,
+            self.sessionUser(session_state),
+            str(request_data.get('recipient') or '').strip(),
+            self.requestAmount(request_data),
+            str(request_data.get('description') or '')
+        )
+
+    async def handleHistory(self, request_data, session_state):
+        return await self.runService(self.bank.history, self.sessionUser(session_state), self.requestCount(request_data, 'limit', 15), self.requestCount(request_data, 'skip', 0))
+
+    async def handleStats(self, request_data, session_state):
+        return await self.runService(self.bank.statistics)
+
+    async def handleSync(self, request_data, session_state):
+        # With write-behind durability a client can ask for everything it has done so far to be on disk.
+        await self.runService(self.bank.syncChanges)
+        return None
+
+    async def handleRequest(self, request_data, session_state):
+        if not isinstance(request_data, dict):
+            raise InvalidInputError("Request must be a JSON object!")
+        request_handler = self.request_handlers.get(request_data.get('op'))
+        if request_handler is None:
+            raise InvalidInputError("Unknown operation!")
+        return self.resultData(await request_handler(request_data, session_state))
+
+    async def handleSession(self, stream_reader, stream_writer):
+        session_state = {'username': None}
+        self.open_sessions += 1
+        try:
+            while True:
+                raw_line = await stream_reader.readline()
+                if not raw_line:
+                    break
+                if not raw_line.strip():
+                    continue
+                request_data = None
+                try:
+                    request_data = json.loads(raw_line)
+                    response_data = {'ok': True, 'result': await self.handleRequest(request_data, session_state)}
+                except ValueError:
+                    response_data = {'ok': False, 'error': 'InvalidInputError', 'message': "Malformed request!"}
+                except BankError as err:
+                    response_data = {'ok': False, 'error': type(err).__name__, 'message': str(err)}
+                except Exception as err:
+                    # An unexpected failure ends only this request, not the whole session.
+                    logProblem("Problem handling request: " + str(err))
+                    response_data = {'ok': False, 'error': 'InternalError', 'message': "Request could not be processed!"}
+                if isinstance(request_data, dict) and 'id' in request_data:
+                    response_data['id'] = request_data['id']
+                stream_writer.write((json.dumps(response_data, default=str) + '\n').encode())
+                await stream_writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as err:
+            logProblem("Problem in client session: " + str(err))
+        finally:
+            self.open_sessions -= 1
+            stream_writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            bank_server = await asyncio.start_unix_server(self.handleSession, path=unix_path)
+            print("Bank server listening on " + unix_path)
+        else:
+            bank_server = await asyncio.start_server(self.handleSession, host, port)
+            print("Bank server listening on " + host + ":" + str(port))
+        async with bank_server:
+            await bank_server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.bank.close()
+
+
+class BankClient:
+    def __init__(self, stream_reader, stream_writer):
+        self.stream_reader = stream_reader
+        self.stream_writer = stream_writer
+        self.request_counter = 0
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            stream_reader, stream_writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            stream_reader, stream_writer = await asyncio.open_connection(host, port)
+        return cls(stream_reader, stream_writer)
+
+    async def call(self, operation_name, **request_fields):
+        self.request_counter += 1
+        request_fields.update({'id': self.request_counter, 'op': operation_name})
+        self.stream_writer.write((json.dumps(request_fields) + '\n').encode())
+        await self.stream_writer.drain()
+        raw_line = await self.stream_reader.readline()
+        if not raw_line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(raw_line)
+
+    async def close(self):
+        self.stream_writer.close()
+        await self.stream_writer.wait_closed()
+
+
+class AsyncBarrier:
+    # asyncio.Barrier needs Python 3.11. A client that fails before the start aborts the barrier,
+    # so the clients already waiting raise BrokenBarrierError instead of waiting forever.
+    def __init__(self, party_count):
+        self.party_count = party_count
+        self.arrived_count = 0
+        self.broken = False
+        self.release_event = asyncio.Event()
+
+    async def wait(self):
+        self.arrived_count += 1
+        if self.arrived_count >= self.party_count:
+            self.release_event.set()
+        await self.release_event.wait()
+        if self.broken:
+            raise threading.BrokenBarrierError()
+
+    def abort(self):
+        self.broken = True
+        self.release_event.set()
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    value_index = min(len(sorted_values) - 1, max(0, int(round(percent / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[value_index]
+
+async def loadTest(client_count=20, operations_per_client=200, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    run_prefix = 'load' + format(int(time.time() * 1000) % 0xFFFFFF, 'x') + '_'
+    account_names = [run_prefix + str(client_number) for client_number in range(client_count)]
+    starting_balance = Decimal('1000.00')
+    latencies = []
+    error_counts = {}
+    net_change = [Decimal('0.00')]
+
+    def requireOk(operation_response, account_username):
+        if not operation_response['ok']:
+            raise BankError(account_username + ": " + operation_response['message'])
+
+    async def runClient(client_number):
+        account_username = account_names[client_number]
+        random_source = random.Random(client_number)
+        bank_client = None
+        try:
+            try:
+                bank_client = await BankClient.connect(host, port, unix_path)
+                requireOk(await bank_client.call('create_account', username=account_username, password='load', amount=str(starting_balance)), account_username)
+                requireOk(await bank_client.call('login', username=account_username, password='load'), account_username)
+            except Exception:
+                startup_barrier.abort()
+                raise
+            await startup_barrier.wait()
+            for operation_number in range(operations_per_client):
+                operation_roll = random_source.random()
+                operation_amount = Decimal(random_source.randint(100, 5000)).scaleb(-2)
+                started_at = time.perf_counter()
+                if operation_roll < 0.4:
+                    operation_response = await bank_client.call('deposit', amount=str(operation_amount), description='load test')
+                elif operation_roll < 0.7:
+                    operation_response = await bank_client.call('withdraw', amount=str(operation_amount), description='load test')
+                elif operation_roll < 0.95:
+                    recipient_username = random_source.choice([other_name for other_name in account_names if other_name != account_username] or [account_username])
+                    operation_response = await bank_client.call('transfer', recipient=recipient_username, amount=str(operation_amount), description='load test')
+                else:
+                    operation_response = await bank_client.call('balance')
+                latencies.append(time.perf_counter() - started_at)
+                if not operation_response['ok']:
+                    error_counts[operation_response['error']] = error_counts.get(operation_response['error'], 0) + 1
+                elif operation_roll < 0.4:
+                    net_change[0] += operation_amount
+                elif operation_roll < 0.7:
+                    net_change[0] -= operation_amount
+        finally:
+            if bank_client is not None:
+                await bank_client.close()
+
+    async def finalBalance(account_username):
+        bank_client = await BankClient.connect(host, port, unix_path)
+        try:
+            await bank_client.call('login', username=account_username, password='load')
+            return Decimal((await bank_client.call('balance'))['result'])
+        finally:
+            await bank_client.close()
+
+    startup_barrier = AsyncBarrier(client_count)
+    started_at = time.perf_counter()
+    client_results = await asyncio.gather(*(runClient(client_number) for client_number in range(client_count)), return_exceptions=True)
+    elapsed_seconds = time.perf_counter() - started_at
+    client_failures = [client_result for client_result in client_results if isinstance(client_result, Exception)]
+    if client_failures:
+        # Report the failure that aborted the run rather than the clients it released from the barrier.
+        first_failure = next((client_failure for client_failure in client_failures if not isinstance(client_failure, threading.BrokenBarrierError)), client_failures[0])
+        print("Load test failed: " + (str(first_failure) or type(first_failure).__name__))
+        return False
+    final_balances = await asyncio.gather(*(finalBalance(account_username) for account_username in account_names))
+
+    latencies.sort()
+    expected_total = starting_balance * client_count + net_change[0]
+    print(f"Clients: {client_count}, operations: {len(latencies)}, elapsed: {elapsed_seconds:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed_seconds:.1f} ops/sec")
+    print(f"Latency p50: {percentile(latencies, 50) * 1000:.2f} ms, p99: {percentile(latencies, 99) * 1000:.2f} ms, max: {latencies[-1] * 1000 if latencies else 0.0:.2f} ms")
+    for error_name in sorted(error_counts):
+        print(f"Rejected ({error_name}): {error_counts[error_name]}")
+    balance_consistent = sum(final_balances) == expected_total
+    print(f"Balance check: {'OK' if balance_consistent else 'MISMATCH'} (total ${sum(final_balances):,.2f}, expected ${expected_total:,.2f})")
+    print(f"The accounts {account_names[0]} to {account_names[-1]} stay in the server's bank data")
+    return balance_consistent
+
+
+def initialize():
+    host = optionValue('--host', DEFAULT_HOST)
+    port = int(optionValue('--port', DEFAULT_PORT))
+    unix_path = optionValue('--unix', None)
+    if '--load-test' in sys.argv[1:]:
+        client_count = int(optionValue('--clients', 20))
+        operations_per_client = int(optionValue('--ops', 200))
+        sys.exit(0 if asyncio.run(loadTest(client_count, operations_per_client, host, port, unix_path)) else 1)
+
+    bank_server = BankServer(worker_count=int(optionValue('--workers', 8)))
+    try:
+        asyncio.run(bank_server.serve(host, port, unix_path))
+    except KeyboardInterrupt:
+        print("Bank server stopped")
+    finally:
+        bank_server.close()
+
+if __name__ == "__main__":
+    initialize()
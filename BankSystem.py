@@ -1,19 +1,3773 @@
 import csv
+import io
 import os
+import sys
+import json
+import mmap
+import zlib
+import gzip
+import lzma
+import struct
+import heapq
+import bisect
+import sqlite3
 import base64
-from datetime import datetime
+import hashlib
+import hmac
+import threading
+import contextlib
+import functools
+import atexit
+import tracemalloc
+import cProfile
+import pstats
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import getpass
 import time
 
+def logProblem(problem_text):
+    print(problem_text, file=sys.stderr)
+
+def headlessDefault():
+    return os.environ.get('BANK_HEADLESS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+LEDGER_SIGNS = {'ACCOUNT_CREATION': 1, 'DEPOSIT': 1, 'TRANSFER_IN': 1, 'WITHDRAWAL': -1, 'TRANSFER_OUT': -1}
+# Amounts and balances are kept in 8-byte integer columns, snapshots and replay folds; this limit
+# (ten trillion dollars) leaves room to add many of them up without overflowing.
+MAXIMUM_CENTS = 10 ** 15
+# Decimal exponent of the largest amount in dollars; anything above it is rejected before scaling,
+# since scaling "1e999999999" raises decimal.Overflow instead of giving a number to compare.
+MAXIMUM_DIGITS = 13
+
+def parseCents(amount_text):
+    # Files written by this program always use two decimals, which parse with a single int() call;
+    # older float-formatted values ("10.0", "1e-05", "0.30000000000000004") fall back to Decimal.
+    amount_cents = None
+    if len(amount_text) > 3 and amount_text[-3] == '.':
+        try:
+            amount_cents = int(amount_text[:-3] + amount_text[-2:])
+        except ValueError:
+            pass
+    if amount_cents is None:
+        try:
+            decimal_value = Decimal(amount_text)
+        except InvalidOperation:
+            raise ValueError("Invalid amount: " + repr(amount_text))
+        if not decimal_value.is_finite():
+            raise ValueError("Invalid amount: " + repr(amount_text))
+        if decimal_value.adjusted() > MAXIMUM_DIGITS:
+            raise ValueError("Amount out of range: " + repr(amount_text))
+        amount_cents = int(decimal_value.scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    if not -MAXIMUM_CENTS <= amount_cents <= MAXIMUM_CENTS:
+        raise ValueError("Amount out of range: " + repr(amount_text))
+    return amount_cents
+
+def formatCents(amount_cents):
+    if amount_cents < 0:
+        return '-%d.%02d' % divmod(-amount_cents, 100)
+    return '%d.%02d' % divmod(amount_cents, 100)
+
+def toCents(amount_value):
+    if isinstance(amount_value, bool):
+        raise ValueError("Invalid amount: " + repr(amount_value))
+    if isinstance(amount_value, int):
+        return amount_value * 100
+    if isinstance(amount_value, float):
+        amount_value = repr(amount_value)
+    try:
+        decimal_value = Decimal(str(amount_value).strip())
+    except InvalidOperation:
+        raise ValueError("Invalid amount: " + repr(amount_value))
+    if not decimal_value.is_finite():
+        raise ValueError("Invalid amount: " + repr(amount_value))
+    if decimal_value.adjusted() > MAXIMUM_DIGITS:
+        raise ValueError("Amount out of range: " + repr(amount_value))
+    if decimal_value and decimal_value.adjusted() < -2:
+        raise ValueError("Amount has fractions of a cent: " + repr(amount_value))
+    cents_value = decimal_value.scaleb(2)
+    if cents_value != cents_value.to_integral_value():
+        raise ValueError("Amount has fractions of a cent: " + repr(amount_value))
+    return int(cents_value)
+
+def centsToDecimal(amount_cents):
+    return Decimal(amount_cents).scaleb(-2)
+
+LEDGER_EPOCH = datetime(1970, 1, 1)
+
+def dateTimestamp(date_text):
+    # Only the exact "YYYY-MM-DD HH:MM:SS" layout written by newTransRecord is converted, so
+    # timestampDate() gives back the same text; anything else returns None and is kept verbatim.
+    if len(date_text) != 19 or date_text[4] != '-' or date_text[7] != '-' or date_text[10] != ' ' or date_text[13] != ':' or date_text[16] != ':':
+        return None
+    try:
+        return (datetime.fromisoformat(date_text) - LEDGER_EPOCH) // timedelta(seconds=1)
+    except ValueError:
+        return None
+
+def timestampDate(timestamp_value):
+    return (LEDGER_EPOCH + timedelta(seconds=timestamp_value)).isoformat(' ')
+
+def isLedgerDay(day_text):
+    return len(day_text) == 10 and day_text[4] == '-' and day_text[7] == '-' and (day_text[:4] + day_text[5:7] + day_text[8:]).isdigit()
+
+class AccountRecord:
+    __slots__ = ('username', 'password', 'balance')
+
+    def __init__(self, record_username, record_password, record_balance):
+        self.username = sys.intern(record_username)
+        self.password = record_password
+        self.balance = record_balance
+
+    def asDict(self):
+        return {'username': self.username, 'password': self.password, 'balance': self.balance}
+
+class TransactionRecord:
+    __slots__ = ('username', 'date', 'type', 'amount', 'balance', 'details')
+
+    def __init__(self, record_username, record_date, record_type, record_amount, record_balance, record_details):
+        self.username = sys.intern(record_username)
+        self.date = record_date
+        self.type = sys.intern(record_type)
+        self.amount = record_amount
+        self.balance = record_balance
+        self.details = record_details
+
+    def asDict(self):
+        return {
+            'username': self.username,
+            'date': self.date,
+            'type': self.type,
+            'amount': self.amount,
+            'balance': self.balance,
+            'details': self.details
+        }
+
+class TransactionColumns:
+    # Whole-ledger loads keep one array slot per column instead of one object per row:
+    # amounts, balances and timestamps are 8-byte integers, usernames, types and repeated
+    # details are shared strings, and a row becomes a TransactionRecord only when read.
+    def __init__(self):
+        self.usernames = []
+        self.type_codes = array('H')
+        self.type_names = []
+        self.type_numbers = {}
+        self.timestamps = array('q')
+        self.irregular_dates = {}
+        self.amounts = array('q')
+        self.balances = array('q')
+        self.details = []
+        self.shared_strings = {}
+        self.rejected_rows = []
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def shared(self, text_value):
+        return self.shared_strings.setdefault(text_value, text_value)
+
+    def append(self, transaction_record):
+        self.appendRow(
+            transaction_record.username, transaction_record.date, transaction_record.type,
+            transaction_record.amount, transaction_record.balance, transaction_record.details
+        )
+
+    def typeNumber(self, record_type):
+        type_number = self.type_numbers.get(record_type)
+        if type_number is None:
+            type_number = self.type_numbers[record_type] = len(self.type_names)
+            self.type_names.append(sys.intern(record_type))
+        return type_number
+
+    def appendRow(self, record_username, record_date, record_type, record_amount, record_balance, record_details):
+        type_number = self.typeNumber(record_type)
+        timestamp_value = dateTimestamp(record_date)
+        if timestamp_value is None:
+            timestamp_value = -1
+            self.irregular_dates[len(self.amounts)] = record_date
+        self.usernames.append(self.shared(record_username))
+        self.type_codes.append(type_number)
+        self.timestamps.append(timestamp_value)
+        self.amounts.append(record_amount)
+        self.balances.append(record_balance)
+        self.details.append(self.shared(record_details))
+
+    def extend(self, other_columns):
+        # Appends the rows of a table parsed elsewhere (a loader worker), renumbering its types and
+        # sharing its strings with the ones already held here.
+        # The builtin map() calls keep this loop in C; it runs once per row on the merging process.
+        row_base = len(self.amounts)
+        type_map = [self.typeNumber(type_name) for type_name in other_columns.type_names]
+        if type_map == list(range(len(type_map))):
+            self.type_codes.extend(other_columns.type_codes)
+        else:
+            self.type_codes.extend(map(type_map.__getitem__, other_columns.type_codes))
+        for row_number, record_date in other_columns.irregular_dates.items():
+            self.irregular_dates[row_base + row_number] = record_date
+        shared_strings = self.shared_strings
+        self.usernames.extend(map(shared_strings.setdefault, other_columns.usernames, other_columns.usernames))
+        self.timestamps.extend(other_columns.timestamps)
+        self.amounts.extend(other_columns.amounts)
+        self.balances.extend(other_columns.balances)
+        self.details.extend(map(shared_strings.setdefault, other_columns.details, other_columns.details))
+
+    def __getitem__(self, row_number):
+        if row_number < 0:
+            row_number += len(self.amounts)
+        timestamp_value = self.timestamps[row_number]
+        if timestamp_value == -1 and row_number in self.irregular_dates:
+            record_date = self.irregular_dates[row_number]
+        else:
+            record_date = timestampDate(timestamp_value)
+        return TransactionRecord(
+            self.usernames[row_number],
+            record_date,
+            self.type_names[self.type_codes[row_number]],
+            self.amounts[row_number],
+            self.balances[row_number],
+            self.details[row_number]
+        )
+
+    def __iter__(self):
+        for row_number in range(len(self.amounts)):
+            yield self[row_number]
+
+def lowerName(account_username):
+    # Most usernames are already lowercase; sharing the original string saves a copy per account.
+    lowered_name = account_username.lower()
+    return account_username if lowered_name == account_username else lowered_name
+
+class AccountSearchIndex:
+    # Lowercased usernames are kept in one sorted list for prefix search with bisect, and every
+    # three-letter slice maps to the ascending numbers of the names containing it, so a substring
+    # search only checks the names listed under the term's rarest trigram.
+    def __init__(self, account_usernames=()):
+        ordered_usernames = sorted(account_usernames, key=str.lower)
+        self.usernames = ordered_usernames
+        self.lowered_names = [lowerName(account_username) for account_username in ordered_usernames]
+        self.indexed_usernames = set(ordered_usernames)
+        self.sorted_names = list(self.lowered_names)
+        self.sorted_numbers = array('I', range(len(ordered_usernames)))
+        self.short_numbers = array('I')
+        # A name repeating a trigram is listed under it twice in a row; searches skip the repeat.
+        trigram_lists = defaultdict(list)
+        for name_number, lowered_name in enumerate(self.lowered_names):
+            if len(lowered_name) < 3:
+                self.short_numbers.append(name_number)
+            for slice_start in range(len(lowered_name) - 2):
+                trigram_lists[lowered_name[slice_start:slice_start + 3]].append(name_number)
+        self.trigram_postings = {name_trigram: array('I', trigram_list) for name_trigram, trigram_list in trigram_lists.items()}
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def __contains__(self, account_username):
+        return account_username in self.indexed_usernames
+
+    def add(self, account_username):
+        if account_username in self.indexed_usernames:
+            return
+        name_number = len(self.usernames)
+        lowered_name = lowerName(account_username)
+        self.usernames.append(account_username)
+        self.lowered_names.append(lowered_name)
+        self.indexed_usernames.add(account_username)
+        insert_position = bisect.bisect_right(self.sorted_names, lowered_name)
+        self.sorted_names.insert(insert_position, lowered_name)
+        self.sorted_numbers.insert(insert_position, name_number)
+        if len(lowered_name) < 3:
+            self.short_numbers.append(name_number)
+        for slice_start in range(len(lowered_name) - 2):
+            self.trigram_postings.setdefault(lowered_name[slice_start:slice_start + 3], array('I')).append(name_number)
+
+    def prefixMatches(self, lowered_term):
+        sorted_position = bisect.bisect_left(self.sorted_names, lowered_term)
+        while sorted_position < len(self.sorted_names) and self.sorted_names[sorted_position].startswith(lowered_term):
+            yield self.usernames[self.sorted_numbers[sorted_position]]
+            sorted_position += 1
+
+    def substringMatches(self, lowered_term):
+        if len(lowered_term) >= 3:
+            candidate_lists = [self.trigram_postings.get(lowered_term[slice_start:slice_start + 3], ()) for slice_start in range(len(lowered_term) - 2)]
+            candidate_numbers = min(candidate_lists, key=len)
+        else:
+            # A shorter term appears in a name only inside one of its trigrams (or the name is
+            # shorter than three letters), so those lists are merged in name order.
+            candidate_numbers = heapq.merge(self.short_numbers, *[trigram_list for name_trigram, trigram_list in self.trigram_postings.items() if lowered_term in name_trigram])
+        previous_number = None
+        for name_number in candidate_numbers:
+            if name_number == previous_number:
+                continue
+            previous_number = name_number
+            lowered_name = self.lowered_names[name_number]
+            if lowered_term in lowered_name and not lowered_name.startswith(lowered_term):
+                yield self.usernames[name_number]
+
+    def search(self, search_term, result_limit=None, skip_count=0):
+        # Names starting with the term come first in alphabetical order, then names that contain it elsewhere.
+        lowered_term = search_term.lower()
+        matching_usernames = self.prefixMatches(lowered_term)
+        if lowered_term:
+            matching_usernames = chain(matching_usernames, self.substringMatches(lowered_term))
+        return list(islice(matching_usernames, skip_count, None if result_limit is None else skip_count + result_limit))
+
+SNAPSHOT_MAGIC = b'BANKSNAP'
+SNAPSHOT_VERSION = 2
+# magic, version, users.csv size and CRC, journal position and CRC, string count, account count,
+# indexed user count, offset count, indexed day count, late record count, string table size, payload CRC
+SNAPSHOT_HEADER = struct.Struct('<8sIQIQIIIIQIQQI')
+
+JOURNAL_HEADER = b'username,date,type,amount,balance,details\r\n'
+SEGMENT_MAGIC = b'BANKSEG1'
+# Closed ledger segment: compressed journal records, a JSON footer, then this trailer
+# (magic, footer size, footer CRC) so the footer is read without decompressing the records.
+SEGMENT_TRAILER = struct.Struct('<8sQI')
+SEGMENT_COMPRESSORS = {'gzip': gzip.compress, 'lzma': lzma.compress}
+SEGMENT_DECOMPRESSORS = {'gzip': gzip.decompress, 'lzma': lzma.decompress}
+# Changed account rows are appended to accounts.log, whose first line names the users.csv it applies
+# to (size and CRC); users.csv is only rewritten once the log outgrows it (or this size), or when a
+# snapshot is saved.
+ACCOUNT_LOG_SIZE = 1024 * 1024
+# Whole-ledger loads parse the journal in slices of about this many bytes (and each closed segment
+# whole) on worker processes; a ledger smaller than two slices is parsed in this process.
+LEDGER_CHUNK_SIZE = 8 * 1024 * 1024
+# Journal lines are checked for quotes with "QUOTE_CODE in raw_line", a plain byte search that is much
+# quicker per line than searching for a one-byte string.
+QUOTE_CODE = ord('"')
+
+def splitsRecord(raw_line):
+    # Records are one line each, but older versions wrote line breaks inside quoted fields. A line with an
+    # odd number of quotes starts or ends such a record.
+    return QUOTE_CODE in raw_line and raw_line.count(b'"') % 2 == 1
+
+def recordFields(raw_line):
+    # Fields without a quote cannot hold a comma or a line break, so such a line is split directly.
+    if QUOTE_CODE in raw_line:
+        return next(csv.reader([raw_line.decode('utf-8', 'replace')]), [])
+    line_text = raw_line.decode('utf-8', 'replace').rstrip('\r\n')
+    return line_text.split(',') if line_text else []
+
+class RecordLines:
+    # Iterates (offset, line) over the lines that hold a whole record. Every line of a record that spans
+    # several lines is left out, and so is a line without a line break, which is still being written. Every
+    # reader of the ledger goes through here, so they all see the same records. Once iteration ends,
+    # end_offset is where a later read carries on: after the last line, or at the start of a record
+    # that is not finished yet.
+    def __init__(self, raw_lines, line_offset=0):
+        self.raw_lines = raw_lines
+        self.start_offset = line_offset
+        self.end_offset = line_offset
+
+    def __iter__(self):
+        split_record = False
+        line_offset = split_start = self.start_offset
+        for raw_line in self.raw_lines:
+            if not raw_line.endswith(b'\n'):
+                continue
+            # The byte search first keeps the common line, with no quotes at all, from paying for a call.
+            if QUOTE_CODE in raw_line and splitsRecord(raw_line):
+                split_record = not split_record
+                if split_record:
+                    split_start = line_offset
+            elif not split_record:
+                yield line_offset, raw_line
+            line_offset += len(raw_line)
+        self.end_offset = split_start if split_record else line_offset
+
+class FileLock:
+    def __init__(self, lock_file_path):
+        self.lock_file_path = lock_file_path
+        self.lock_handle = None
+        self.held_mode = None
+        self.hold_depth = 0
+        self.shared_holders = 0
+        self.exclusive_owner = None
+        self.exclusive_depth = 0
+        self.exclusive_waiters = 0
+        self.waiting_shared = 0
+        self.pinned = False
+        self.thread_holds = threading.local()
+        # Guards only the bookkeeping below; it is never held while a caller works under the lock.
+        self.thread_guard = threading.Condition()
+
+    def lockFile(self, requested_mode):
+        if self.held_mode != fcntl.LOCK_EX and self.held_mode != requested_mode:
+            if self.lock_handle is None:
+                self.lock_handle = open(self.lock_file_path, 'a+')
+            fcntl.flock(self.lock_handle.fileno(), requested_mode)
+            self.held_mode = requested_mode
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=False):
+        # Shared holds let several processes, and several threads of this one, read at once; an exclusive
+        # hold waits for all of them. Nested holds in the same thread reuse the outer hold instead of blocking on it.
+        if fcntl is None:
+            yield
+            return
+        current_thread = threading.get_ident()
+        own_shared = getattr(self.thread_holds, 'shared', 0)
+        with self.thread_guard:
+            exclusive_hold = exclusive or self.exclusive_owner == current_thread
+            if self.exclusive_owner == current_thread:
+                self.exclusive_depth += 1
+            elif exclusive:
+                # Shared holds of threads waiting here do not count, so a read can go on to write,
+                # and two readers doing so at once take turns instead of waiting for each other.
+                self.exclusive_waiters += 1
+                self.waiting_shared += own_shared
+                try:
+                    self.thread_guard.wait_for(lambda: self.exclusive_owner is None and self.shared_holders == self.waiting_shared)
+                finally:
+                    self.exclusive_waiters -= 1
+                    self.waiting_shared -= own_shared
+                self.exclusive_owner = current_thread
+                self.exclusive_depth = 1
+            else:
+                # A waiting writer goes before new readers, but never before a nested read of a thread already reading.
+                if not own_shared:
+                    self.thread_guard.wait_for(lambda: self.exclusive_owner is None and not self.exclusive_waiters)
+                self.shared_holders += 1
+            self.hold_depth += 1
+            try:
+                self.lockFile(fcntl.LOCK_EX if exclusive_hold else fcntl.LOCK_SH)
+            except BaseException:
+                self.endHold(exclusive_hold)
+                raise
+        if not exclusive_hold:
+            self.thread_holds.shared = own_shared + 1
+        try:
+            yield
+        finally:
+            if not exclusive_hold:
+                self.thread_holds.shared = own_shared
+            with self.thread_guard:
+                self.endHold(exclusive_hold)
+
+    def endHold(self, exclusive_hold):
+        if exclusive_hold:
+            self.exclusive_depth -= 1
+            if self.exclusive_depth == 0:
+                self.exclusive_owner = None
+        else:
+            self.shared_holders -= 1
+        self.hold_depth -= 1
+        self.releaseIdle()
+        self.thread_guard.notify_all()
+
+    def pin(self):
+        # Keeps the exclusive lock after the current holds end, until unpin(), whichever thread asks;
+        # used while changes are queued in memory that other processes must not commit around.
+        if fcntl is None:
+            return
+        with self.thread_guard:
+            self.lockFile(fcntl.LOCK_EX)
+            self.pinned = True
+
+    def unpin(self):
+        if fcntl is None:
+            return
+        with self.thread_guard:
+            self.pinned = False
+            self.releaseIdle()
+
+    def releaseIdle(self):
+        if self.hold_depth == 0 and not self.pinned and self.held_mode is not None:
+            fcntl.flock(self.lock_handle.fileno(), fcntl.LOCK_UN)
+            self.held_mode = None
+
+    def close(self):
+        with self.thread_guard:
+            if self.lock_handle is not None and self.held_mode is None:
+                self.lock_handle.close()
+                self.lock_handle = None
+
+class CsvStorage:
+    backend_name = 'csv'
+
+    def __init__(self, bank_folder, folder_lock=None):
+        self.users_file_path = os.path.join(bank_folder, 'users.csv')
+        self.transactions_file_path = os.path.join(bank_folder, 'transactions.csv')
+        self.pending_file_path = os.path.join(bank_folder, 'commit.pending')
+        self.account_log_path = os.path.join(bank_folder, 'accounts.log')
+        self.snapshot_file_path = os.path.join(bank_folder, 'snapshot.bin')
+        self.segments_folder = os.path.join(bank_folder, 'segments')
+        self.rewrite_file_path = os.path.join(bank_folder, 'rewrite.pending')
+        self.bank_folder = bank_folder
+        self.folder_lock = folder_lock or FileLock(os.path.join(bank_folder, 'bank.lock'))
+        self.transaction_index = {}
+        self.day_index_days = []
+        self.day_index_offsets = array('q')
+        self.late_offsets = array('q')
+        self.indexed_position = 0
+        self.indexed_journal = None
+        self.seen_version = None
+        self.startup_snapshot = None
+        self.snapshot_version = None
+        self.closed_segments = []
+        self.segments_journal = None
+        self.segment_cache = None
+        self.account_log_ready = False
+        self.reader_journal = None
+
+    def setup(self):
+        with self.folder_lock.hold(exclusive=True):
+            if not os.path.isfile(self.users_file_path):
+                with open(self.users_file_path, 'w', newline='') as file_handle:
+                    csv_writer = csv.writer(file_handle)
+                    csv_writer.writerow(['username', 'password', 'balance'])
+
+            if not os.path.isfile(self.transactions_file_path):
+                with open(self.transactions_file_path, 'w', newline='') as file_handle:
+                    csv_writer = csv.writer(file_handle)
+                    csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
+
+            self.loadSegments()
+            self.recoverJournal()
+            self.finishRotation()
+            self.replayPendingCommit()
+            self.startup_snapshot = self.readSnapshot()
+            self.buildTransIndex()
+            self.seen_version = self.dataVersion()
+
+    def syncFolder(self):
+        try:
+            folder_descriptor = os.open(self.bank_folder, os.O_RDONLY)
+        except (OSError, AttributeError):
+            return
+        try:
+            os.fsync(folder_descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(folder_descriptor)
+
+    def dataVersion(self):
+        # Every write replaces users.csv, grows the account log or grows the journal, so their inode, mtime and size change
+        # whenever any process commits.
+        version_parts = []
+        for watched_path in (self.users_file_path, self.account_log_path, self.transactions_file_path, self.pending_file_path):
+            try:
+                file_status = os.stat(watched_path)
+                version_parts.append((file_status.st_ino, file_status.st_mtime_ns, file_status.st_size))
+            except OSError:
+                version_parts.append(None)
+        return tuple(version_parts)
+
+    def isStale(self):
+        return self.dataVersion() != self.seen_version
+
+    def writeLock(self):
+        return self.folder_lock.hold(exclusive=True)
+
+    def refresh(self):
+        # The version is taken before re-reading, so a commit that lands meanwhile is seen as stale again.
+        self.seen_version = self.dataVersion()
+        with self.folder_lock.hold():
+            indexed_segments = [closed_segment['end_position'] for closed_segment in self.closed_segments]
+            self.loadSegments()
+            current_segments = [closed_segment['end_position'] for closed_segment in self.closed_segments]
+            try:
+                journal_status = os.stat(self.transactions_file_path)
+            except OSError:
+                journal_status = None
+            # A rotation by another program closes the records already indexed here into a new segment,
+            # so indexing can carry on from the same position as long as the older segments are unchanged.
+            journal_continues = journal_status and current_segments[:len(indexed_segments)] == indexed_segments and (
+                journal_status.st_ino == self.indexed_journal or len(current_segments) > len(indexed_segments)
+            )
+            if journal_continues and journal_status.st_size + self.journalShift() >= self.indexed_position:
+                self.buildTransIndex(self.indexed_position)
+            else:
+                self.startup_snapshot = self.readSnapshot()
+                self.buildTransIndex()
+
+    def replaceFile(self, target_path, file_content):
+        temporary_path = target_path + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_path, 'wb') as file_handle:
+            file_handle.write(file_content)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(temporary_path, target_path)
+        self.syncFolder()
+
+    def replayPendingCommit(self):
+        with self.folder_lock.hold(exclusive=True):
+            if not os.path.isfile(self.pending_file_path):
+                return
+            try:
+                with open(self.pending_file_path, 'r') as file_handle:
+                    pending_commit = json.load(file_handle)
+                # Commits written before the account log carry no log offset and rewrite users.csv.
+                accounts_offset = pending_commit.get('accounts_offset')
+                if accounts_offset is not None and not os.path.isfile(self.account_log_path):
+                    accounts_offset = None
+                self.applyCommit(
+                    pending_commit['journal_offset'], pending_commit['journal_rows'].encode('utf-8'), accounts_offset,
+                    self.encodeAccounts(self.pendingAccounts(pending_commit), include_header=False),
+                    self.loadAccounts() if accounts_offset is None else ()
+                )
+                os.remove(self.pending_file_path)
+                self.syncFolder()
+            except Exception as err:
+                logProblem("Problem replaying pending commit: " + str(err))
+
+    def applyCommit(self, journal_offset, journal_rows, accounts_offset, account_rows, all_accounts):
+        # Truncating to the recorded offsets first makes a replay after a crash idempotent. Without an
+        # account log offset, users.csv is rewritten from all_accounts and the log started again.
+        for target_path, target_offset, target_rows in ((self.transactions_file_path, journal_offset, journal_rows), (self.account_log_path, accounts_offset, account_rows)):
+            if target_offset is None:
+                continue
+            with open(target_path, 'rb+') as file_handle:
+                file_handle.truncate(target_offset)
+                file_handle.seek(target_offset)
+                file_handle.write(target_rows)
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+        if accounts_offset is None:
+            self.compactAccounts(all_accounts)
+
+    def accountLogHeader(self, users_content):
+        return ('users.csv,%d,%d\r\n' % (len(users_content), zlib.crc32(users_content))).encode('utf-8')
+
+    def compactAccounts(self, all_accounts):
+        # users.csv goes first: a log left behind by a crash in between names the old users.csv and is ignored.
+        users_content = self.encodeAccounts(all_accounts)
+        self.replaceFile(self.users_file_path, users_content)
+        self.replaceFile(self.account_log_path, self.accountLogHeader(users_content))
+        self.account_log_ready = True
+
+    def readAccountLog(self, users_content):
+        # Rows appended since users.csv was last written; a log written for another users.csv is ignored.
+        self.account_log_ready = False
+        try:
+            with open(self.account_log_path, 'rb') as file_handle:
+                log_content = file_handle.read()
+        except OSError:
+            return []
+        log_header = self.accountLogHeader(users_content)
+        if not log_content.startswith(log_header):
+            return []
+        self.account_log_ready = True
+        log_accounts = []
+        # A row cut off by a crash has no line break yet; its commit is still pending and is replayed.
+        log_rows = log_content[len(log_header):log_content.rfind(b'\n') + 1].decode('utf-8')
+        for line_fields in csv.reader(io.StringIO(log_rows, newline='')):
+            if len(line_fields) != 3:
+                continue
+            try:
+                log_accounts.append(AccountRecord(line_fields[0], line_fields[1], parseCents(line_fields[2])))
+            except ValueError:
+                continue
+        return log_accounts
+
+    def recoverJournal(self):
+        try:
+            with open(self.transactions_file_path, 'rb+') as file_handle:
+                file_handle.seek(0, os.SEEK_END)
+                journal_size = file_handle.tell()
+                if journal_size == 0:
+                    return
+                file_handle.seek(journal_size - 1)
+                if file_handle.read(1) == b'\n':
+                    return
+
+                # The last record was cut off mid-write; drop it back to the previous line break.
+                scan_position = journal_size
+                while scan_position > 0:
+                    block_start = max(0, scan_position - 4096)
+                    file_handle.seek(block_start)
+                    data_block = file_handle.read(scan_position - block_start)
+                    newline_index = data_block.rfind(b'\n')
+                    if newline_index != -1:
+                        file_handle.truncate(block_start + newline_index + 1)
+                        break
+                    scan_position = block_start
+                else:
+                    file_handle.truncate(0)
+                    file_handle.write(JOURNAL_HEADER)
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+        except Exception as err:
+            logProblem("Problem recovering transaction journal: " + str(err))
+
+    def loadSegments(self):
+        closed_segments = []
+        try:
+            segment_names = sorted(segment_name for segment_name in os.listdir(self.segments_folder) if segment_name.startswith('segment-') and segment_name.endswith('.seg'))
+        except OSError:
+            segment_names = []
+        for segment_name in segment_names:
+            try:
+                segment_footer = self.readSegmentFooter(os.path.join(self.segments_folder, segment_name))
+            except (OSError, ValueError, struct.error) as err:
+                logProblem("Problem reading ledger segment " + segment_name + ": " + str(err))
+                continue
+            if closed_segments and segment_footer['start_position'] != closed_segments[-1]['end_position']:
+                logProblem("Problem reading ledger segment " + segment_name + ": does not follow the previous segment")
+                continue
+            closed_segments.append(segment_footer)
+        try:
+            self.segments_journal = os.stat(self.transactions_file_path).st_ino
+        except OSError:
+            self.segments_journal = None
+        self.closed_segments = closed_segments
+
+    def readSegmentFooter(self, segment_path, include_balances=False):
+        with open(segment_path, 'rb') as file_handle:
+            segment_size = file_handle.seek(0, os.SEEK_END)
+            if segment_size < SEGMENT_TRAILER.size:
+                raise ValueError("segment is too short")
+            file_handle.seek(segment_size - SEGMENT_TRAILER.size)
+            segment_magic, footer_size, footer_crc = SEGMENT_TRAILER.unpack(file_handle.read(SEGMENT_TRAILER.size))
+            payload_size = segment_size - SEGMENT_TRAILER.size - footer_size
+            if segment_magic != SEGMENT_MAGIC or payload_size < 0:
+                raise ValueError("not a ledger segment")
+            file_handle.seek(payload_size)
+            footer_bytes = file_handle.read(footer_size)
+        if zlib.crc32(footer_bytes) != footer_crc:
+            raise ValueError("segment footer checksum mismatch")
+        segment_footer = json.loads(footer_bytes.decode('utf-8'))
+        if not include_balances:
+            segment_footer.pop('closing_balances', None)
+        segment_footer['path'] = segment_path
+        segment_footer['payload_size'] = payload_size
+        return segment_footer
+
+    def segmentData(self, closed_segment):
+        # The last segment read is kept decompressed, since history pages and queries tend to stay in one.
+        segment_cache = self.segment_cache
+        if segment_cache and segment_cache[0] == closed_segment['path']:
+            return segment_cache[1]
+        with open(closed_segment['path'], 'rb') as file_handle:
+            segment_records = SEGMENT_DECOMPRESSORS[closed_segment['compression']](file_handle.read(closed_segment['payload_size']))
+        if len(segment_records) != closed_segment['records_size'] or zlib.crc32(segment_records) != closed_segment['records_crc']:
+            raise ValueError("ledger segment " + os.path.basename(closed_segment['path']) + " is damaged")
+        self.segment_cache = (closed_segment['path'], segment_records)
+        return segment_records
+
+    def journalShift(self, closed_segments=None):
+        # Offsets are logical ledger positions: closed segments keep the offsets their records had in the
+        # journal, and the active journal carries on after the last of them (its header is not counted).
+        closed_segments = self.closed_segments if closed_segments is None else closed_segments
+        if not closed_segments:
+            return 0
+        return closed_segments[-1]['end_position'] - len(JOURNAL_HEADER)
+
+    def finishRotation(self):
+        # A full rewrite that stopped before removing the old segments is rolled forward; a rotation that
+        # stopped after writing its segment still has the segment's records at the start of the journal.
+        try:
+            if os.path.isfile(self.rewrite_file_path):
+                with open(self.rewrite_file_path, 'r') as file_handle:
+                    rewritten_journal = json.load(file_handle)['journal']
+                if os.path.isfile(rewritten_journal):
+                    os.replace(rewritten_journal, self.transactions_file_path)
+                self.removeSegments()
+                return
+            if not self.closed_segments:
+                return
+            closed_segment = self.closed_segments[-1]
+            with open(self.transactions_file_path, 'rb') as file_handle:
+                file_handle.readline()
+                leading_records = file_handle.read(closed_segment['records_size'])
+                if len(leading_records) != closed_segment['records_size'] or zlib.crc32(leading_records) != closed_segment['records_crc']:
+                    return
+                remaining_records = file_handle.read()
+            self.replaceFile(self.transactions_file_path, JOURNAL_HEADER + remaining_records)
+            self.loadSegments()
+        except Exception as err:
+            logProblem("Problem finishing ledger rotation: " + str(err))
+
+    def removeSegments(self):
+        for closed_segment in self.closed_segments:
+            os.remove(closed_segment['path'])
+        self.syncFolder()
+        if os.path.isfile(self.rewrite_file_path):
+            os.remove(self.rewrite_file_path)
+        self.loadSegments()
+
+    def loadAccounts(self):
+        with self.folder_lock.hold():
+            accounts_collection = []
+            startup_snapshot, self.startup_snapshot = self.startup_snapshot, None
+            users_content = b''
+            try:
+                if os.path.isfile(self.users_file_path):
+                    with open(self.users_file_path, 'rb') as file_handle:
+                        users_content = file_handle.read()
+                    if startup_snapshot and startup_snapshot['users_size'] == len(users_content) and startup_snapshot['users_crc'] == zlib.crc32(users_content):
+                        accounts_collection = startup_snapshot['accounts']
+                        if self.indexed_position == startup_snapshot['journal_position']:
+                            self.snapshot_version = self.seen_version
+                    else:
+                        csv_reader = csv.DictReader(io.StringIO(users_content.decode('utf-8'), newline=None))
+                        for row_data in csv_reader:
+                            if 'username' in row_data and 'password' in row_data and 'balance' in row_data:
+                                try:
+                                    accounts_collection.append(AccountRecord(row_data['username'], row_data['password'], parseCents(row_data['balance'])))
+                                except ValueError:
+                                    continue
+                accounts_collection = self.overlayAccounts(accounts_collection, self.readAccountLog(users_content))
+            except Exception as err:
+                logProblem("Problem reading account data: " + str(err))
+            return self.overlayPendingAccounts(accounts_collection)
+
+    def overlayAccounts(self, accounts_collection, newer_accounts):
+        if not newer_accounts:
+            return accounts_collection
+        newer_by_username = {account_item.username: account_item for account_item in newer_accounts}
+        merged_accounts = [newer_by_username.pop(account_item.username, account_item) for account_item in accounts_collection]
+        merged_accounts.extend(newer_by_username.values())
+        return merged_accounts
+
+    def pendingAccounts(self, pending_commit):
+        amounts_in_cents = pending_commit.get('amount_unit') == 'cents'
+        pending_accounts = []
+        for account_item in pending_commit['accounts']:
+            pending_balance = account_item['balance'] if amounts_in_cents else parseCents(str(account_item['balance']))
+            pending_accounts.append(AccountRecord(account_item['username'], account_item['password'], pending_balance))
+        return pending_accounts
+
+    def overlayPendingAccounts(self, accounts_collection):
+        if not os.path.isfile(self.pending_file_path):
+            return accounts_collection
+        try:
+            with open(self.pending_file_path, 'r') as file_handle:
+                pending_accounts = self.pendingAccounts(json.load(file_handle))
+        except Exception as err:
+            logProblem("Problem reading pending commit: " + str(err))
+            return accounts_collection
+        return self.overlayAccounts(accounts_collection, pending_accounts)
+
+    def ledgerChunks(self):
+        # (source name, closed segment or None, start offset, end offset) for every part of the ledger:
+        # each closed segment whole, then the active journal cut at line breaks after its header.
+        ledger_chunks = [
+            (os.path.join('segments', os.path.basename(closed_segment['path'])), closed_segment, 0, closed_segment['records_size'])
+            for closed_segment in self.closed_segments
+        ]
+        if not os.path.isfile(self.transactions_file_path):
+            return ledger_chunks
+        with open(self.transactions_file_path, 'rb') as file_handle:
+            chunk_start = len(file_handle.readline())
+            journal_size = os.fstat(file_handle.fileno()).st_size
+            while chunk_start < journal_size:
+                chunk_end = chunk_start + LEDGER_CHUNK_SIZE
+                if chunk_end + LEDGER_CHUNK_SIZE // 2 >= journal_size:
+                    chunk_end = journal_size
+                else:
+                    file_handle.seek(chunk_end - 1)
+                    chunk_end += len(file_handle.readline()) - 1
+                    # Quotes inside a quoted field are doubled, so an odd count (an odd number of lines that
+                    # splitsRecord() flags) means the cut falls inside a record with a line break in it; the
+                    # slice is carried on until that record ends.
+                    file_handle.seek(chunk_start)
+                    quote_count = file_handle.read(chunk_end - chunk_start).count(b'"')
+                    while quote_count % 2:
+                        next_line = file_handle.readline()
+                        if not next_line:
+                            break
+                        chunk_end += len(next_line)
+                        quote_count += next_line.count(b'"')
+                ledger_chunks.append(('transactions.csv', None, chunk_start, chunk_end))
+                chunk_start = chunk_end
+        return ledger_chunks
+
+    def loadTrans(self, worker_count=None):
+        with self.folder_lock.hold():
+            transaction_table = TransactionColumns()
+            try:
+                ledger_chunks = self.ledgerChunks()
+                chunk_arguments = (
+                    [self.bank_folder] * len(ledger_chunks),
+                    [closed_segment for _, closed_segment, _, _ in ledger_chunks],
+                    [chunk_start for _, _, chunk_start, _ in ledger_chunks],
+                    [chunk_end for _, _, _, chunk_end in ledger_chunks]
+                )
+                worker_count = min(len(ledger_chunks), worker_count or os.cpu_count() or 1)
+                # The folder lock held here keeps writers out until every worker has read its slice.
+                if worker_count > 1:
+                    load_pool = ProcessPoolExecutor(max_workers=worker_count)
+                    chunk_results = load_pool.map(parseLedgerChunk, *chunk_arguments)
+                else:
+                    load_pool = None
+                    chunk_results = map(parseLedgerChunk, *chunk_arguments)
+                try:
+                    # Slices are merged in ledger order; line numbers count from each file's first line,
+                    # the journal's header being line 1.
+                    source_lines = defaultdict(int, {'transactions.csv': 1})
+                    for (source_name, _, _, _), (chunk_table, chunk_rejects, chunk_lines) in zip(ledger_chunks, chunk_results):
+                        transaction_table.extend(chunk_table)
+                        for line_number, reject_reason in chunk_rejects:
+                            transaction_table.rejected_rows.append({'source': source_name, 'line': source_lines[source_name] + line_number, 'reason': reject_reason})
+                        source_lines[source_name] += chunk_lines
+                finally:
+                    if load_pool is not None:
+                        load_pool.shutdown()
+            except Exception as err:
+                logProblem("Problem reading transaction data: " + str(err))
+            for rejected_row in transaction_table.rejected_rows[:20]:
+                logProblem(f"Problem reading transaction data: {rejected_row['source']} line {rejected_row['line']}: {rejected_row['reason']}")
+            if len(transaction_table.rejected_rows) > 20:
+                logProblem(f"Problem reading transaction data: {len(transaction_table.rejected_rows) - 20} more rejected row(s)")
+            return transaction_table
+
+    def encodeAccounts(self, accounts_to_encode, include_header=True):
+        row_buffer = io.StringIO()
+        csv_writer = csv.writer(row_buffer)
+        if include_header:
+            csv_writer.writerow(['username', 'password', 'balance'])
+        for account_item in accounts_to_encode:
+            csv_writer.writerow([account_item.username, account_item.password, formatCents(account_item.balance)])
+        return row_buffer.getvalue().encode('utf-8')
+
+    def encodeTrans(self, transactions_to_encode):
+        row_buffer = io.StringIO()
+        csv_writer = csv.writer(row_buffer)
+        encoded_rows = []
+        for transaction_item in transactions_to_encode:
+            row_buffer.seek(0)
+            row_buffer.truncate()
+            csv_writer.writerow([
+                transaction_item.username,
+                transaction_item.date,
+                transaction_item.type,
+                formatCents(transaction_item.amount),
+                formatCents(transaction_item.balance),
+                transaction_item.details
+            ])
+            encoded_rows.append((transaction_item, row_buffer.getvalue().encode('utf-8')))
+        return encoded_rows
+
+    def storeAccounts(self, accounts_to_save):
+        with self.folder_lock.hold(exclusive=True):
+            try:
+                self.compactAccounts(accounts_to_save)
+                self.seen_version = self.dataVersion()
+                return True
+            except Exception as err:
+                logProblem("Problem saving account data: " + str(err))
+                return False
+
+    def updateAccounts(self, changed_accounts, all_accounts):
+        with self.folder_lock.hold(exclusive=True):
+            if self.isStale():
+                logProblem("Problem saving account data: changed by another process")
+                return False
+            # Committed like an operation with no journal rows, so only the changed rows are written.
+            if self.writeCommit(changed_accounts, all_accounts, []) is None:
+                return False
+            self.seen_version = self.dataVersion()
+            return True
+
+    def storeTrans(self, transactions_to_save):
+        with self.folder_lock.hold(exclusive=True):
+            temporary_path = self.transactions_file_path + '.' + str(os.getpid()) + '.tmp'
+            try:
+                with open(temporary_path, 'w', newline='') as file_handle:
+                    csv_writer = csv.writer(file_handle)
+                    csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
+                    for transaction_item in transactions_to_save:
+                        csv_writer.writerow([
+                            transaction_item.username,
+                            transaction_item.date,
+                            transaction_item.type,
+                            formatCents(transaction_item.amount),
+                            formatCents(transaction_item.balance),
+                            transaction_item.details
+                        ])
+                    file_handle.flush()
+                    os.fsync(file_handle.fileno())
+                if self.closed_segments:
+                    # The new journal holds every record, so the closed segments go once it is in place;
+                    # finishRotation() completes both steps if the program stops in between.
+                    self.replaceFile(self.rewrite_file_path, json.dumps({'journal': temporary_path}).encode('utf-8'))
+                os.replace(temporary_path, self.transactions_file_path)
+                self.syncFolder()
+                if self.closed_segments:
+                    self.removeSegments()
+            except Exception as err:
+                logProblem("Problem saving transaction data: " + str(err))
+                return False
+            self.buildTransIndex()
+            self.seen_version = self.dataVersion()
+            return True
+
+    def buildTransIndex(self, start_position=0):
+        with self.folder_lock.hold():
+            if not start_position:
+                self.transaction_index = {}
+                self.day_index_days = []
+                self.day_index_offsets = array('q')
+                self.late_offsets = array('q')
+            try:
+                with open(self.transactions_file_path, 'rb') as file_handle:
+                    self.indexed_journal = os.fstat(file_handle.fileno()).st_ino
+                    if not start_position and self.startup_snapshot and self.snapshotMatchesJournal(file_handle, self.startup_snapshot):
+                        # Only the journal tail written after the snapshot is scanned.
+                        self.transaction_index = self.startup_snapshot['index']
+                        self.day_index_days = self.startup_snapshot['days']
+                        self.day_index_offsets = self.startup_snapshot['day_offsets']
+                        self.late_offsets = self.startup_snapshot['late_offsets']
+                        start_position = self.startup_snapshot['journal_position']
+                    offsets_by_prefix = {}
+                    latest_day = self.day_index_days[-1].encode('utf-8') if self.day_index_days else None
+                    line_offset = start_position
+                    for line_source, line_offset in self.journalSources(start_position):
+                        record_lines = RecordLines(line_source, line_offset)
+                        for line_offset, raw_line in record_lines:
+                            if raw_line.startswith(b'"'):
+                                line_fields = next(csv.reader([raw_line.decode('utf-8')]), None)
+                                if line_fields and line_fields[0]:
+                                    self.indexRecord(line_fields[0], line_offset)
+                                    if len(line_fields) > 1 and line_fields[1][:10].encode('utf-8') != latest_day:
+                                        self.indexDay(line_fields[1][:10], line_offset)
+                                        latest_day = self.day_index_days[-1].encode('utf-8') if self.day_index_days else None
+                            else:
+                                field_end = raw_line.find(b',')
+                                username_prefix = raw_line[:field_end]
+                                user_offsets = offsets_by_prefix.get(username_prefix)
+                                if user_offsets is not None:
+                                    user_offsets.append(line_offset)
+                                elif username_prefix:
+                                    line_username = username_prefix.decode('utf-8')
+                                    self.indexRecord(line_username, line_offset)
+                                    offsets_by_prefix[username_prefix] = self.transaction_index[line_username]
+                                if username_prefix and field_end > 0 and raw_line[field_end + 1:field_end + 11] != latest_day:
+                                    self.indexDay(raw_line[field_end + 1:field_end + 11].decode('utf-8', 'replace'), line_offset)
+                                    latest_day = self.day_index_days[-1].encode('utf-8') if self.day_index_days else None
+                        line_offset = record_lines.end_offset
+                    self.indexed_position = line_offset
+            except Exception as err:
+                logProblem("Problem indexing transaction data: " + str(err))
+
+    def journalChecksum(self, file_handle, journal_position):
+        # The journal is append-only, so its header and the last 64 KiB before the snapshot
+        # position are enough to tell whether the snapshot still describes the same file.
+        file_handle.seek(0)
+        journal_checksum = zlib.crc32(file_handle.read(min(journal_position, 65536)))
+        file_handle.seek(max(0, journal_position - 65536))
+        return zlib.crc32(file_handle.read(journal_position - max(0, journal_position - 65536)), journal_checksum)
+
+    def snapshotMatchesJournal(self, file_handle, snapshot_data):
+        journal_size = os.fstat(file_handle.fileno()).st_size
+        snapshot_offset = snapshot_data['journal_position'] - self.journalShift()
+        if snapshot_offset < 0 or journal_size < snapshot_offset:
+            return False
+        return self.journalChecksum(file_handle, snapshot_offset) == snapshot_data['journal_crc']
+
+    def readSnapshot(self):
+        if not os.path.isfile(self.snapshot_file_path):
+            return None
+        try:
+            with open(self.snapshot_file_path, 'rb') as file_handle:
+                with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as snapshot_map:
+                    return self.decodeSnapshot(memoryview(snapshot_map))
+        except (OSError, ValueError, BufferError, struct.error, UnicodeDecodeError) as err:
+            logProblem("Problem reading snapshot: " + str(err))
+            return None
+
+    def decodeSnapshot(self, snapshot_view):
+        try:
+            (snapshot_magic, snapshot_version, users_size, users_crc, journal_position, journal_crc, string_count,
+             account_count, index_user_count, offset_count, day_count, late_count, string_table_size, payload_crc) = SNAPSHOT_HEADER.unpack_from(snapshot_view)
+            if snapshot_magic != SNAPSHOT_MAGIC or snapshot_version != SNAPSHOT_VERSION:
+                raise ValueError("unknown snapshot format")
+            if zlib.crc32(snapshot_view[SNAPSHOT_HEADER.size:]) != payload_crc:
+                raise ValueError("snapshot checksum mismatch")
+            
+            section_position = SNAPSHOT_HEADER.size
+            def column(type_code, item_count):
+                nonlocal section_position
+                column_values = array(type_code)
+                section_end = section_position + item_count * column_values.itemsize
+                column_values.frombytes(snapshot_view[section_position:section_end])
+                section_position = section_end
+                return column_values
+            
+            account_usernames = column('i', account_count)
+            account_passwords = column('i', account_count)
+            account_balances = column('q', account_count)
+            index_usernames = column('i', index_user_count)
+            index_counts = column('q', index_user_count)
+            index_offsets = column('q', offset_count)
+            day_numbers = column('i', day_count)
+            day_offsets = column('q', day_count)
+            late_offsets = column('q', late_count)
+            string_table = bytes(snapshot_view[section_position:section_position + string_table_size]).decode('utf-8')
+            if section_position + string_table_size != len(snapshot_view):
+                raise ValueError("snapshot size mismatch")
+        finally:
+            snapshot_view.release()
+        
+        string_values = string_table.split('\x00')
+        if len(string_values) != string_count + 1:
+            raise ValueError("snapshot string table is damaged")
+        snapshot_accounts = [
+            AccountRecord(string_values[account_usernames[account_number]], string_values[account_passwords[account_number]], account_balances[account_number])
+            for account_number in range(account_count)
+        ]
+        snapshot_index = {}
+        offsets_view = memoryview(index_offsets).cast('B')
+        offset_start = 0
+        for user_number in range(index_user_count):
+            offset_end = offset_start + index_counts[user_number] * index_offsets.itemsize
+            user_offsets = array('q')
+            user_offsets.frombytes(offsets_view[offset_start:offset_end])
+            snapshot_index[string_values[index_usernames[user_number]]] = user_offsets
+            offset_start = offset_end
+        return {
+            'users_size': users_size,
+            'users_crc': users_crc,
+            'journal_position': journal_position,
+            'journal_crc': journal_crc,
+            'accounts': snapshot_accounts,
+            'index': snapshot_index,
+            'days': [string_values[day_number] for day_number in day_numbers],
+            'day_offsets': day_offsets,
+            'late_offsets': late_offsets
+        }
+
+    def saveSnapshot(self, all_accounts):
+        with self.folder_lock.hold(exclusive=True):
+            if self.snapshot_version is not None and self.snapshot_version == self.seen_version:
+                return True
+            if self.isStale():
+                return False
+            try:
+                with open(self.users_file_path, 'rb') as file_handle:
+                    users_content = file_handle.read()
+                # The snapshot records users.csv, so rows waiting in the account log are folded into it first.
+                if not self.account_log_ready or os.path.getsize(self.account_log_path) != len(self.accountLogHeader(users_content)):
+                    self.compactAccounts(all_accounts)
+                    self.seen_version = self.dataVersion()
+                    with open(self.users_file_path, 'rb') as file_handle:
+                        users_content = file_handle.read()
+                with open(self.transactions_file_path, 'rb') as file_handle:
+                    journal_crc = self.journalChecksum(file_handle, self.indexed_position - self.journalShift())
+                
+                # Each distinct string is stored once, terminated by a NUL character.
+                string_numbers = {}
+                string_parts = []
+                def stringNumber(text_value):
+                    string_number = string_numbers.get(text_value)
+                    if string_number is None:
+                        if '\x00' in text_value:
+                            raise ValueError("NUL character in " + repr(text_value))
+                        string_number = string_numbers[text_value] = len(string_parts)
+                        string_parts.append(text_value)
+                    return string_number
+                
+                account_usernames, account_passwords, account_balances = array('i'), array('i'), array('q')
+                for account_item in all_accounts:
+                    account_usernames.append(stringNumber(account_item.username))
+                    account_passwords.append(stringNumber(account_item.password))
+                    account_balances.append(account_item.balance)
+                index_usernames, index_counts, index_offsets = array('i'), array('q'), array('q')
+                for indexed_username, user_offsets in self.transaction_index.items():
+                    index_usernames.append(stringNumber(indexed_username))
+                    index_counts.append(len(user_offsets))
+                    index_offsets.extend(user_offsets)
+                day_numbers = array('i', (stringNumber(indexed_day) for indexed_day in self.day_index_days))
+                
+                string_parts.append('')
+                string_bytes = '\x00'.join(string_parts).encode('utf-8')
+                payload = b''.join([
+                    account_usernames.tobytes(), account_passwords.tobytes(), account_balances.tobytes(),
+                    index_usernames.tobytes(), index_counts.tobytes(), index_offsets.tobytes(),
+                    day_numbers.tobytes(), self.day_index_offsets.tobytes(), self.late_offsets.tobytes(), string_bytes
+                ])
+                snapshot_header = SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(users_content), zlib.crc32(users_content), self.indexed_position, journal_crc,
+                    len(string_numbers), len(account_balances), len(index_counts), len(index_offsets),
+                    len(day_numbers), len(self.late_offsets), len(string_bytes), zlib.crc32(payload)
+                )
+                self.replaceFile(self.snapshot_file_path, snapshot_header + payload)
+            except Exception as err:
+                logProblem("Problem saving snapshot: " + str(err))
+                return False
+            self.snapshot_version = self.seen_version
+            return True
+
+    def indexDay(self, record_day, record_offset):
+        # Records are appended in time order, so each day is kept as the offset of its first record.
+        # A record dated before the latest indexed day, or not dated as YYYY-MM-DD, is listed on its own.
+        if self.day_index_days and record_day == self.day_index_days[-1]:
+            return
+        if (not self.day_index_days or record_day > self.day_index_days[-1]) and isLedgerDay(record_day):
+            self.day_index_days.append(record_day)
+            self.day_index_offsets.append(record_offset)
+        else:
+            self.late_offsets.append(record_offset)
+
+    def indexRecord(self, record_username, record_offset):
+        # Offsets are kept in 8-byte arrays rather than lists of int objects (about 8 bytes per
+        # journal row instead of 36).
+        user_offsets = self.transaction_index.get(record_username)
+        if user_offsets is None:
+            user_offsets = self.transaction_index[sys.intern(record_username)] = array('q')
+        user_offsets.append(record_offset)
+
+    def parseTransLine(self, raw_line):
+        # A record is exactly one line; an unclosed quote means the line is only part of one.
+        if splitsRecord(raw_line):
+            return None
+        line_fields = recordFields(raw_line)
+        if len(line_fields) != 6:
+            return None
+        try:
+            return TransactionRecord(line_fields[0], line_fields[1], line_fields[2], parseCents(line_fields[3]), parseCents(line_fields[4]), line_fields[5])
+        except ValueError:
+            return None
+
+    def readTransAt(self, record_offsets):
+        transactions_list = []
+        try:
+            file_handle, closed_segments = self.openJournal()
+            with file_handle:
+                segment_ends = [closed_segment['end_position'] for closed_segment in closed_segments]
+                journal_shift = self.journalShift(closed_segments)
+                for record_offset in record_offsets:
+                    segment_number = bisect.bisect_right(segment_ends, record_offset)
+                    if segment_number < len(closed_segments):
+                        segment_records = self.segmentData(closed_segments[segment_number])
+                        line_start = record_offset - closed_segments[segment_number]['start_position']
+                        raw_line = segment_records[line_start:segment_records.find(b'\n', line_start) + 1]
+                    else:
+                        file_handle.seek(record_offset - journal_shift)
+                        raw_line = file_handle.readline()
+                    transaction_record = self.parseTransLine(raw_line) if raw_line.endswith(b'\n') else None
+                    if transaction_record:
+                        transactions_list.append(transaction_record)
+        except Exception as err:
+            logProblem("Problem reading transaction data: " + str(err))
+        return transactions_list
+
+    def commitChanges(self, changed_accounts, all_accounts, transactions_to_append):
+        with self.folder_lock.hold(exclusive=True):
+            if self.isStale():
+                logProblem("Problem saving transaction data: changed by another process")
+                return None
+            journal_position = self.writeCommit(changed_accounts, all_accounts, transactions_to_append)
+            self.seen_version = self.dataVersion()
+            return journal_position
+
+    def writeCommit(self, changed_accounts, all_accounts, transactions_to_append):
+        self.replayPendingCommit()
+        if os.path.isfile(self.pending_file_path):
+            return None
+        encoded_rows = self.encodeTrans(transactions_to_append)
+        journal_rows = b''.join(encoded_row for _, encoded_row in encoded_rows)
+        account_rows = self.encodeAccounts(changed_accounts, include_header=False)
+        try:
+            journal_offset = os.path.getsize(self.transactions_file_path)
+            accounts_offset = None
+            if self.account_log_ready and os.path.isfile(self.account_log_path):
+                accounts_offset = os.path.getsize(self.account_log_path)
+                if accounts_offset + len(account_rows) > max(ACCOUNT_LOG_SIZE, os.path.getsize(self.users_file_path)):
+                    accounts_offset = None
+            pending_commit = {
+                'journal_offset': journal_offset,
+                'journal_rows': journal_rows.decode('utf-8'),
+                'accounts_offset': accounts_offset,
+                'accounts': [account_item.asDict() for account_item in changed_accounts],
+                'amount_unit': 'cents'
+            }
+            self.replaceFile(self.pending_file_path, json.dumps(pending_commit).encode('utf-8'))
+        except Exception as err:
+            logProblem("Problem saving transaction data: " + str(err))
+            return None
+        # Once the pending commit is on disk the change is durable; if applying it fails here it is
+        # replayed by replayPendingCommit() before the next commit or on the next start.
+        try:
+            self.applyCommit(journal_offset, journal_rows, accounts_offset, account_rows, all_accounts)
+            os.remove(self.pending_file_path)
+        except Exception as err:
+            logProblem("Problem applying transaction data: " + str(err))
+        row_offset = journal_offset + self.journalShift()
+        for transaction_item, encoded_row in encoded_rows:
+            self.indexRecord(transaction_item.username, row_offset)
+            self.indexDay(transaction_item.date[:10], row_offset)
+            row_offset += len(encoded_row)
+        self.indexed_position = row_offset
+        return row_offset
+
+    def appendTrans(self, transactions_to_append):
+        with self.folder_lock.hold(exclusive=True):
+            encoded_rows = self.encodeTrans(transactions_to_append)
+            try:
+                with open(self.transactions_file_path, 'ab') as file_handle:
+                    row_offset = file_handle.seek(0, os.SEEK_END) + self.journalShift()
+                    file_handle.write(b''.join(encoded_row for _, encoded_row in encoded_rows))
+                    file_handle.flush()
+                    os.fsync(file_handle.fileno())
+            except Exception as err:
+                logProblem("Problem saving transaction data: " + str(err))
+                return None
+            for transaction_item, encoded_row in encoded_rows:
+                self.indexRecord(transaction_item.username, row_offset)
+                self.indexDay(transaction_item.date[:10], row_offset)
+                row_offset += len(encoded_row)
+            self.indexed_position = row_offset
+            self.seen_version = self.dataVersion()
+            return row_offset
+
+    def journalPosition(self):
+        with self.folder_lock.hold():
+            journal_shift = self.journalShift()
+            try:
+                file_handle, closed_segments = self.openJournal()
+                with file_handle:
+                    journal_shift = self.journalShift(closed_segments)
+                    journal_size = file_handle.seek(0, os.SEEK_END)
+                    scan_position = journal_size
+                    while scan_position > 0:
+                        block_start = max(0, scan_position - 4096)
+                        file_handle.seek(block_start)
+                        newline_index = file_handle.read(scan_position - block_start).rfind(b'\n')
+                        if newline_index != -1:
+                            return block_start + newline_index + 1 + journal_shift
+                        scan_position = block_start
+            except Exception as err:
+                logProblem("Problem reading transaction data: " + str(err))
+            return journal_shift
+
+    def openReader(self):
+        # A report reader keeps the journal file and segment list it opened first, so a rotation or
+        # rewrite while a long export runs does not change the ledger it is reading.
+        self.reader_journal = self.openJournal()
+
+    def openJournal(self):
+        # Records before a known journal position are never rewritten in place (commits append,
+        # and full rewrites and rotations replace the file), so an open handle can be read without the lock.
+        # The segment list returned with it is the one that matches that journal file.
+        with self.folder_lock.hold():
+            file_handle = open(self.transactions_file_path, 'rb')
+            if os.fstat(file_handle.fileno()).st_ino != self.segments_journal:
+                self.loadSegments()
+            return file_handle, self.closed_segments
+
+    def journalSources(self, start_position):
+        # Yields (line iterator, offset of its first line) for the records from start_position on: first the
+        # closed segments, then the active journal.
+        if self.reader_journal is not None:
+            yield from self.journalParts(self.reader_journal[0], self.reader_journal[1], start_position)
+            return
+        file_handle, closed_segments = self.openJournal()
+        with file_handle:
+            yield from self.journalParts(file_handle, closed_segments, start_position)
+
+    def journalParts(self, file_handle, closed_segments, start_position):
+        for closed_segment in closed_segments:
+            if closed_segment['end_position'] > start_position:
+                segment_records = io.BytesIO(self.segmentData(closed_segment))
+                yield segment_records, closed_segment['start_position'] + segment_records.seek(max(0, start_position - closed_segment['start_position']))
+        journal_shift = self.journalShift(closed_segments)
+        file_handle.seek(0)
+        header_size = len(file_handle.readline())
+        yield file_handle, file_handle.seek(max(start_position - journal_shift, header_size)) + journal_shift
+
+    def journalLines(self, start_position, end_position):
+        for line_source, line_offset in self.journalSources(start_position):
+            for line_offset, raw_line in RecordLines(line_source, line_offset):
+                if line_offset >= end_position:
+                    return
+                yield raw_line
+
+    def readTransFrom(self, start_position, end_position):
+        try:
+            for raw_line in self.journalLines(start_position, end_position):
+                transaction_record = self.parseTransLine(raw_line)
+                if transaction_record:
+                    yield transaction_record
+        except Exception as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def readTransShard(self, start_position, end_position, shard_number, shard_count):
+        try:
+            for raw_line in self.journalLines(start_position, end_position):
+                if not raw_line.startswith(b'"') and zlib.crc32(raw_line.split(b',', 1)[0]) % shard_count != shard_number:
+                    continue
+                transaction_record = self.parseTransLine(raw_line)
+                if transaction_record and shardNumber(transaction_record.username, shard_count) == shard_number:
+                    yield transaction_record
+        except Exception as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def dayRegion(self, start_day, end_day):
+        # Journal span from the first record of start_day up to the first record after end_day.
+        first_day = bisect.bisect_left(self.day_index_days, start_day) if start_day else 0
+        after_last_day = bisect.bisect_right(self.day_index_days, end_day) if end_day else len(self.day_index_days)
+        region_start = self.day_index_offsets[first_day] if first_day < len(self.day_index_days) else self.indexed_position
+        region_end = self.day_index_offsets[after_last_day] if after_last_day < len(self.day_index_days) else self.indexed_position
+        return region_start, max(region_start, region_end)
+
+    def queryTrans(self, start_day=None, end_day=None, type_names=None, account_username=None, minimum_cents=None, maximum_cents=None):
+        region_start, region_end = self.dayRegion(start_day, end_day)
+        late_before = [late_offset for late_offset in self.late_offsets if late_offset < region_start]
+        late_after = [late_offset for late_offset in self.late_offsets if late_offset >= region_end]
+        if account_username is not None:
+            user_offsets = self.transaction_index.get(account_username, array('q'))
+            def userOwns(record_offset):
+                offset_position = bisect.bisect_left(user_offsets, record_offset)
+                return offset_position < len(user_offsets) and user_offsets[offset_position] == record_offset
+            candidate_records = self.readTransAt(
+                [late_offset for late_offset in late_before if userOwns(late_offset)]
+                + list(user_offsets[bisect.bisect_left(user_offsets, region_start):bisect.bisect_left(user_offsets, region_end)])
+                + [late_offset for late_offset in late_after if userOwns(late_offset)]
+            )
+        else:
+            candidate_records = chain(self.readTransAt(late_before), self.readTransFrom(region_start, region_end), self.readTransAt(late_after))
+        for transaction_record in candidate_records:
+            if transactionMatches(transaction_record, start_day, end_day, type_names, minimum_cents, maximum_cents):
+                yield transaction_record
+
+    def countUserTrans(self, target_username):
+        return len(self.transaction_index.get(target_username, ()))
+
+    def userTrans(self, target_username, record_limit=None, skip_newest=0):
+        user_offsets = self.transaction_index.get(target_username, ())
+        end_position = max(0, len(user_offsets) - skip_newest)
+        start_position = 0 if record_limit is None else max(0, end_position - record_limit)
+        return self.readTransAt(user_offsets[start_position:end_position])
+
+    def reversedLines(self, file_handle, block_size=65536):
+        # The lines of a file from the last to the first, each with its line break; the part after the
+        # last line break comes first, as it is.
+        read_position = file_handle.seek(0, os.SEEK_END)
+        carried_fragment = b''
+        line_break = b''
+        while read_position > 0:
+            read_length = min(block_size, read_position)
+            read_position -= read_length
+            file_handle.seek(read_position)
+            block_lines = (file_handle.read(read_length) + carried_fragment).split(b'\n')
+            carried_fragment = block_lines.pop(0)
+            for raw_line in reversed(block_lines):
+                yield raw_line + line_break
+                line_break = b'\n'
+        yield carried_fragment + line_break
+
+    def tailTrans(self, record_count, block_size=65536):
+        if record_count <= 0:
+            return
+        try:
+            file_handle, closed_segments = self.openJournal()
+            with file_handle:
+                # Read backwards, a record with a line break in a quoted field also starts and ends on a line with
+                # an odd number of quotes, so RecordLines leaves it out in the same way. Older records continue
+                # in the closed segments, newest segment first.
+                line_sources = chain([self.reversedLines(file_handle, block_size)], (
+                    reversed(io.BytesIO(self.segmentData(closed_segment)).readlines()) for closed_segment in reversed(closed_segments)
+                ))
+                records_yielded = 0
+                for line_source in line_sources:
+                    for _, raw_line in RecordLines(line_source):
+                        transaction_record = self.parseTransLine(raw_line)
+                        if transaction_record:
+                            yield transaction_record
+                            records_yielded += 1
+                            if records_yielded >= record_count:
+                                return
+        except Exception as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def rotationDue(self, segment_size, segment_days):
+        try:
+            if segment_size and os.path.getsize(self.transactions_file_path) - len(JOURNAL_HEADER) >= segment_size:
+                return True
+            if segment_days:
+                first_day = bisect.bisect_left(self.day_index_offsets, self.journalShift() + len(JOURNAL_HEADER))
+                return first_day < len(self.day_index_days) and self.day_index_days[first_day] <= (datetime.now() - timedelta(days=segment_days)).strftime('%Y-%m-%d')
+        except OSError:
+            pass
+        return False
+
+    def rotateJournal(self, segment_compression='gzip'):
+        # Closes every record in the active journal into a compressed, read-only segment and starts an
+        # empty journal. Offsets do not change, so the index and any saved journal positions stay valid.
+        with self.folder_lock.hold(exclusive=True):
+            if self.isStale() or os.path.isfile(self.pending_file_path):
+                return False
+            try:
+                with open(self.transactions_file_path, 'rb') as file_handle:
+                    header_size = len(file_handle.readline())
+                    segment_records = file_handle.read()
+                segment_records = segment_records[:segment_records.rfind(b'\n') + 1]
+                if not segment_records:
+                    return False
+                start_position = self.journalShift() + header_size
+                segment_footer = {
+                    'start_position': start_position,
+                    'end_position': start_position + len(segment_records),
+                    'record_count': 0,
+                    'first_date': None,
+                    'last_date': None,
+                    'type_counts': {},
+                    'type_volumes': {},
+                    'closing_balances': {},
+                    'compression': segment_compression,
+                    'records_size': len(segment_records),
+                    'records_crc': zlib.crc32(segment_records)
+                }
+                # The totals count exactly the records every reader sees; refused lines are left out.
+                for _, ledger_row, _ in ledgerRows(segment_records):
+                    if ledger_row is None:
+                        continue
+                    account_username, record_date, transaction_type, amount_cents, balance_cents, _ = ledger_row
+                    segment_footer['record_count'] += 1
+                    segment_footer['first_date'] = segment_footer['first_date'] or record_date
+                    segment_footer['last_date'] = record_date
+                    segment_footer['type_counts'][transaction_type] = segment_footer['type_counts'].get(transaction_type, 0) + 1
+                    segment_footer['type_volumes'][transaction_type] = segment_footer['type_volumes'].get(transaction_type, 0) + amount_cents
+                    segment_footer['closing_balances'][account_username] = balance_cents
+                footer_bytes = json.dumps(segment_footer, sort_keys=True).encode('utf-8')
+                os.makedirs(self.segments_folder, exist_ok=True)
+                segment_path = os.path.join(self.segments_folder, 'segment-%016d.seg' % start_position)
+                self.replaceFile(segment_path, b''.join([
+                    SEGMENT_COMPRESSORS[segment_compression](segment_records),
+                    footer_bytes,
+                    SEGMENT_TRAILER.pack(SEGMENT_MAGIC, len(footer_bytes), zlib.crc32(footer_bytes))
+                ]))
+                self.replaceFile(self.transactions_file_path, JOURNAL_HEADER)
+                self.loadSegments()
+                self.indexed_journal = self.segments_journal
+            except Exception as err:
+                logProblem("Problem rotating transaction journal: " + str(err))
+                return False
+            self.seen_version = self.dataVersion()
+            return True
+
+    def closedSummary(self):
+        # Totals for every record in closed segments, read from the segment footers alone.
+        with self.folder_lock.hold():
+            if not self.closed_segments:
+                return None
+            closed_summary = {'end_position': self.closed_segments[-1]['end_position'], 'transaction_count': 0, 'type_counts': {}, 'type_volumes': {}, 'closing_balances': {}}
+            for closed_segment in self.closed_segments:
+                segment_footer = self.readSegmentFooter(closed_segment['path'], include_balances=True)
+                closed_summary['transaction_count'] += segment_footer['record_count']
+                for type_name, type_count in segment_footer['type_counts'].items():
+                    closed_summary['type_counts'][type_name] = closed_summary['type_counts'].get(type_name, 0) + type_count
+                for type_name, type_volume in segment_footer['type_volumes'].items():
+                    closed_summary['type_volumes'][type_name] = closed_summary['type_volumes'].get(type_name, 0) + type_volume
+                closed_summary['closing_balances'].update(segment_footer['closing_balances'])
+            return closed_summary
+
+    def close(self):
+        if self.reader_journal is not None:
+            self.reader_journal[0].close()
+            self.reader_journal = None
+        self.folder_lock.close()
+
+class SqliteStorage:
+    backend_name = 'sqlite'
+    # Amounts and balances are stored as INTEGER cents, like the CSV files and snapshots.
+    schema_version = 1
+    schema_statements = (
+        "CREATE TABLE IF NOT EXISTS accounts ("
+        "username TEXT PRIMARY KEY, password TEXT NOT NULL, balance INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS transactions ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, date TEXT NOT NULL, type TEXT NOT NULL, "
+        "amount INTEGER NOT NULL, balance INTEGER NOT NULL, details TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS transactions_username ON transactions (username, id)",
+        "CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date, id)"
+    )
+
+    def __init__(self, bank_folder, folder_lock=None):
+        self.database_path = os.path.join(bank_folder, 'bank.db')
+        self.folder_lock = folder_lock or FileLock(os.path.join(bank_folder, 'bank.lock'))
+        self.connection = None
+        self.seen_version = None
+
+    def openReader(self):
+        self.connection = sqlite3.connect(self.database_path, check_same_thread=False)
+
+    def setup(self):
+        self.openReader()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < self.schema_version:
+            self.upgradeSchema()
+        self.seen_version = self.dataVersion()
+
+    def upgradeSchema(self):
+        # Databases written before version 1 kept dollars in REAL columns; they are copied into
+        # INTEGER cents columns in one transaction, checked again under the write lock so two
+        # programs opening the same old database convert it only once.
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] < self.schema_version:
+                column_types = {row_data[1]: row_data[2] for row_data in self.connection.execute("PRAGMA table_info(accounts)")}
+                if column_types.get('balance') == 'REAL':
+                    self.connection.execute("ALTER TABLE accounts RENAME TO accounts_real")
+                    self.connection.execute("ALTER TABLE transactions RENAME TO transactions_real")
+                    self.connection.execute("DROP INDEX IF EXISTS transactions_username")
+                    self.connection.execute("DROP INDEX IF EXISTS transactions_date")
+                for schema_statement in self.schema_statements:
+                    self.connection.execute(schema_statement)
+                if column_types.get('balance') == 'REAL':
+                    self.connection.execute(
+                        "INSERT INTO accounts (username, password, balance) "
+                        "SELECT username, password, CAST(ROUND(balance * 100) AS INTEGER) FROM accounts_real ORDER BY rowid"
+                    )
+                    self.connection.execute(
+                        "INSERT INTO transactions (id, username, date, type, amount, balance, details) "
+                        "SELECT id, username, date, type, CAST(ROUND(amount * 100) AS INTEGER), CAST(ROUND(balance * 100) AS INTEGER), details "
+                        "FROM transactions_real ORDER BY id"
+                    )
+                    self.connection.execute("DROP TABLE accounts_real")
+                    self.connection.execute("DROP TABLE transactions_real")
+                self.connection.execute("PRAGMA user_version = %d" % self.schema_version)
+            self.connection.commit()
+        except sqlite3.Error as err:
+            self.connection.rollback()
+            raise StorageError("Problem upgrading database: " + str(err))
+
+    def dataVersion(self):
+        # data_version only changes when another connection commits to the database.
+        try:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as err:
+            logProblem("Problem reading database version: " + str(err))
+            return None
+
+    def isStale(self):
+        return self.dataVersion() != self.seen_version
+
+    def writeLock(self):
+        return self.folder_lock.hold(exclusive=True)
+
+    def refresh(self):
+        self.seen_version = self.dataVersion()
+
+    def saveSnapshot(self, all_accounts):
+        return False
+
+    def rotationDue(self, segment_size, segment_days):
+        return False
+
+    def rotateJournal(self, segment_compression='gzip'):
+        return False
+
+    def closedSummary(self):
+        return None
+
+    def ledgerChunks(self):
+        return None
+
+    def transRecord(self, row_data):
+        return TransactionRecord(*row_data)
+
+    def transValues(self, transaction_items):
+        for transaction_item in transaction_items:
+            yield (
+                transaction_item.username,
+                transaction_item.date,
+                transaction_item.type,
+                transaction_item.amount,
+                transaction_item.balance,
+                transaction_item.details
+            )
+
+    def loadAccounts(self):
+        try:
+            account_rows = self.connection.execute("SELECT username, password, balance FROM accounts ORDER BY rowid")
+            return [AccountRecord(*row_data) for row_data in account_rows]
+        except sqlite3.Error as err:
+            logProblem("Problem reading account data: " + str(err))
+            return []
+
+    def storeAccounts(self, accounts_to_save):
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM accounts")
+                self.connection.executemany(
+                    "INSERT INTO accounts (username, password, balance) VALUES (?, ?, ?)",
+                    ((account_item.username, account_item.password, account_item.balance) for account_item in accounts_to_save)
+                )
+            return True
+        except sqlite3.Error as err:
+            logProblem("Problem saving account data: " + str(err))
+            return False
+
+    def updateAccounts(self, changed_accounts, all_accounts):
+        if self.isStale():
+            logProblem("Problem saving account data: changed by another process")
+            return False
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO accounts (username, password, balance) VALUES (?, ?, ?) "
+                    "ON CONFLICT (username) DO UPDATE SET password = excluded.password, balance = excluded.balance",
+                    ((account_item.username, account_item.password, account_item.balance) for account_item in changed_accounts)
+                )
+            return True
+        except sqlite3.Error as err:
+            logProblem("Problem saving account data: " + str(err))
+            return False
+
+    def loadTrans(self, worker_count=None):
+        transaction_table = TransactionColumns()
+        for transaction_record in self.readTransFrom(0, self.journalPosition()):
+            transaction_table.append(transaction_record)
+        return transaction_table
+
+    def storeTrans(self, transactions_to_save):
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM transactions")
+                self.connection.executemany(
+                    "INSERT INTO transactions (username, date, type, amount, balance, details) VALUES (?, ?, ?, ?, ?, ?)",
+                    self.transValues(transactions_to_save)
+                )
+            return True
+        except sqlite3.Error as err:
+            logProblem("Problem saving transaction data: " + str(err))
+            return False
+
+    def commitChanges(self, changed_accounts, all_accounts, transactions_to_append):
+        if self.isStale():
+            logProblem("Problem saving transaction data: changed by another process")
+            return None
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO accounts (username, password, balance) VALUES (?, ?, ?) "
+                    "ON CONFLICT (username) DO UPDATE SET password = excluded.password, balance = excluded.balance",
+                    ((account_item.username, account_item.password, account_item.balance) for account_item in changed_accounts)
+                )
+                self.connection.executemany(
+                    "INSERT INTO transactions (username, date, type, amount, balance, details) VALUES (?, ?, ?, ?, ?, ?)",
+                    self.transValues(transactions_to_append)
+                )
+            return self.journalPosition()
+        except sqlite3.Error as err:
+            logProblem("Problem saving transaction data: " + str(err))
+            return None
+
+    def appendTrans(self, transactions_to_append):
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO transactions (username, date, type, amount, balance, details) VALUES (?, ?, ?, ?, ?, ?)",
+                    self.transValues(transactions_to_append)
+                )
+            return self.journalPosition()
+        except sqlite3.Error as err:
+            logProblem("Problem saving transaction data: " + str(err))
+            return None
+
+    def journalPosition(self):
+        try:
+            return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+            return 0
+
+    def readTransFrom(self, start_position, end_position):
+        try:
+            transaction_rows = self.connection.execute(
+                "SELECT username, date, type, amount, balance, details FROM transactions WHERE id > ? AND id <= ? ORDER BY id",
+                (start_position, end_position)
+            )
+            for row_data in transaction_rows:
+                yield self.transRecord(row_data)
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def readTransShard(self, start_position, end_position, shard_number, shard_count):
+        for transaction_record in self.readTransFrom(start_position, end_position):
+            if shardNumber(transaction_record.username, shard_count) == shard_number:
+                yield transaction_record
+
+    def queryTrans(self, start_day=None, end_day=None, type_names=None, account_username=None, minimum_cents=None, maximum_cents=None):
+        query_conditions = []
+        query_values = []
+        if start_day:
+            query_conditions.append("date >= ?")
+            query_values.append(start_day)
+        if end_day:
+            # Every date on end_day sorts below end_day followed by the highest character.
+            query_conditions.append("date < ?")
+            query_values.append(end_day + '\uffff')
+        if type_names:
+            query_conditions.append("type IN (" + ", ".join("?" * len(type_names)) + ")")
+            query_values.extend(sorted(type_names))
+        if account_username is not None:
+            query_conditions.append("username = ?")
+            query_values.append(account_username)
+        if minimum_cents is not None:
+            query_conditions.append("amount >= ?")
+            query_values.append(minimum_cents)
+        if maximum_cents is not None:
+            query_conditions.append("amount <= ?")
+            query_values.append(maximum_cents)
+        try:
+            transaction_rows = self.connection.execute(
+                "SELECT username, date, type, amount, balance, details FROM transactions"
+                + (" WHERE " + " AND ".join(query_conditions) if query_conditions else "") + " ORDER BY id",
+                query_values
+            )
+            for row_data in transaction_rows:
+                yield self.transRecord(row_data)
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def countUserTrans(self, target_username):
+        try:
+            return self.connection.execute("SELECT COUNT(*) FROM transactions WHERE username = ?", (target_username,)).fetchone()[0]
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+            return 0
+
+    def userTrans(self, target_username, record_limit=None, skip_newest=0):
+        try:
+            transaction_rows = self.connection.execute(
+                "SELECT username, date, type, amount, balance, details FROM transactions WHERE username = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (target_username, -1 if record_limit is None else record_limit, skip_newest)
+            ).fetchall()
+            return [self.transRecord(row_data) for row_data in reversed(transaction_rows)]
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+            return []
+
+    def tailTrans(self, record_count):
+        try:
+            transaction_rows = self.connection.execute(
+                "SELECT username, date, type, amount, balance, details FROM transactions ORDER BY id DESC LIMIT ?",
+                (record_count,)
+            )
+            for row_data in transaction_rows:
+                yield self.transRecord(row_data)
+        except sqlite3.Error as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.folder_lock.close()
+
+STORAGE_BACKENDS = {
+    CsvStorage.backend_name: CsvStorage,
+    SqliteStorage.backend_name: SqliteStorage
+}
+
+# every-op commits each change before returning; group queues it for the writer thread and waits
+# for its group to be committed; none returns at once and leaves the commit to the writer thread.
+DURABILITY_LEVELS = ('every-op', 'group', 'none')
+
+# Every PasswordHasher in the process with the same worker count shares one thread pool, so opening
+# several banks (a server, a test run) does not multiply the hashing threads. Each scrypt derivation
+# needs about 16 MB with the default settings, which is why the default pool is capped.
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+HASH_POOLS = {}
+HASH_POOLS_GUARD = threading.Lock()
+
+def acquireHashPool(worker_count):
+    with HASH_POOLS_GUARD:
+        if worker_count not in HASH_POOLS:
+            HASH_POOLS[worker_count] = [ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='password-hash'), 0]
+        HASH_POOLS[worker_count][1] += 1
+        return HASH_POOLS[worker_count][0]
+
+def releaseHashPool(worker_count):
+    # The pool is shut down when its last hasher is closed.
+    with HASH_POOLS_GUARD:
+        hash_pool, user_count = HASH_POOLS[worker_count]
+        if user_count > 1:
+            HASH_POOLS[worker_count][1] = user_count - 1
+            return
+        del HASH_POOLS[worker_count]
+    hash_pool.shutdown(wait=True)
+
+class PasswordHasher:
+    def __init__(self, algorithm='scrypt', scrypt_n=16384, scrypt_r=8, scrypt_p=1, pbkdf2_iterations=240000, worker_count=None, cache_size=1024):
+        if algorithm == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+            algorithm = 'pbkdf2'
+        if algorithm not in ('scrypt', 'pbkdf2'):
+            raise ValueError("Unknown password hash: " + str(algorithm))
+        self.algorithm = algorithm
+        self.scrypt_n = int(scrypt_n)
+        self.scrypt_r = int(scrypt_r)
+        self.scrypt_p = int(scrypt_p)
+        self.pbkdf2_iterations = int(pbkdf2_iterations)
+        # hashlib releases the GIL while deriving, so a small pool verifies logins in parallel and
+        # also caps how many memory-hard scrypt derivations run at once.
+        self.worker_count = int(worker_count or DEFAULT_HASH_WORKERS)
+        if self.worker_count < 1:
+            raise ValueError("hash_workers must be at least 1")
+        self.hash_pool = acquireHashPool(self.worker_count)
+        self.cache_size = int(cache_size)
+        self.cache_key = os.urandom(32)
+        self.verified_cache = OrderedDict()
+        self.cache_guard = threading.Lock()
+        self.dummy_hash = None
+
+    def currentParameters(self):
+        if self.algorithm == 'scrypt':
+            return ['scrypt', str(self.scrypt_n), str(self.scrypt_r), str(self.scrypt_p)]
+        return ['pbkdf2_sha256', str(self.pbkdf2_iterations)]
+
+    def derive(self, plain_password, salt_bytes, hash_parameters):
+        if hash_parameters[0] == 'scrypt':
+            scrypt_n, scrypt_r, scrypt_p = (int(parameter_value) for parameter_value in hash_parameters[1:4])
+            return hashlib.scrypt(plain_password.encode('utf-8'), salt=salt_bytes, n=scrypt_n, r=scrypt_r, p=scrypt_p,
+                                  maxmem=max(32 * 1024 * 1024, 256 * scrypt_r * scrypt_n), dklen=32)
+        if hash_parameters[0] == 'pbkdf2_sha256':
+            return hashlib.pbkdf2_hmac('sha256', plain_password.encode('utf-8'), salt_bytes, int(hash_parameters[1]), dklen=32)
+        raise ValueError("Unknown password hash: " + hash_parameters[0])
+
+    def hashNow(self, plain_password):
+        hash_parameters = self.currentParameters()
+        salt_bytes = os.urandom(16)
+        derived_key = self.derive(plain_password, salt_bytes, hash_parameters)
+        return '$'.join(hash_parameters + [base64.b64encode(salt_bytes).decode(), base64.b64encode(derived_key).decode()])
+
+    def verifyNow(self, plain_password, stored_password):
+        # Returns (password matches, stored value should be rehashed with the current settings).
+        if '$' not in stored_password:
+            try:
+                legacy_password = base64.b64decode(stored_password.encode(), validate=True)
+            except (ValueError, UnicodeError):
+                return False, False
+            return hmac.compare_digest(legacy_password, plain_password.encode('utf-8')), True
+        stored_fields = stored_password.split('$')
+        try:
+            salt_bytes = base64.b64decode(stored_fields[-2])
+            expected_key = base64.b64decode(stored_fields[-1])
+            derived_key = self.derive(plain_password, salt_bytes, stored_fields[:-2])
+        except (ValueError, IndexError, TypeError):
+            return False, False
+        return hmac.compare_digest(derived_key, expected_key), stored_fields[:-2] != self.currentParameters()
+
+    def hash(self, plain_password):
+        stored_password = self.hash_pool.submit(self.hashNow, plain_password).result()
+        self.remember(plain_password, stored_password)
+        return stored_password
+
+    def remember(self, plain_password, stored_password):
+        # Only a keyed digest is cached, and the key never leaves this process.
+        if self.cache_size <= 0:
+            return
+        password_digest = hmac.new(self.cache_key, plain_password.encode('utf-8'), hashlib.sha256).digest()
+        with self.cache_guard:
+            self.verified_cache[stored_password] = password_digest
+            self.verified_cache.move_to_end(stored_password)
+            while len(self.verified_cache) > self.cache_size:
+                self.verified_cache.popitem(last=False)
+
+    def verify(self, plain_password, stored_password):
+        password_digest = hmac.new(self.cache_key, plain_password.encode('utf-8'), hashlib.sha256).digest()
+        with self.cache_guard:
+            cached_digest = self.verified_cache.get(stored_password)
+            if cached_digest is not None:
+                self.verified_cache.move_to_end(stored_password)
+        if cached_digest is not None and hmac.compare_digest(cached_digest, password_digest):
+            return True, False
+        
+        password_matches, needs_rehash = self.hash_pool.submit(self.verifyNow, plain_password, stored_password).result()
+        if password_matches and not needs_rehash:
+            self.remember(plain_password, stored_password)
+        return password_matches, needs_rehash
+
+    def rejectUnknown(self, plain_password):
+        # Unknown usernames still cost one derivation, so response time does not reveal which names exist.
+        if self.dummy_hash is None:
+            self.dummy_hash = self.hashNow(os.urandom(8).hex())
+        self.hash_pool.submit(self.verifyNow, plain_password, self.dummy_hash).result()
+        return False
+
+    def close(self):
+        if self.hash_pool is not None:
+            self.hash_pool = None
+            releaseHashPool(self.worker_count)
+
+METERED_SERVICE_METHODS = (
+    'getAccounts', 'getTrans', 'storeAccounts', 'storeTrans', 'loadAccounts', 'flushAccounts', 'saveSnapshot', 'rotateJournal',
+    'createAccount', 'authenticate', 'changePassword', 'deposit', 'withdraw', 'transfer', 'history', 'recentTransactions',
+    'listAccounts', 'searchAccounts', 'findTransactions', 'statistics', 'exportReport', 'reconcile', 'rebuildAccounts', 'verifyStats',
+    'flushQueue', 'waitForCommit'
+)
+METERED_STORAGE_METHODS = ('loadAccounts', 'loadTrans', 'storeAccounts', 'storeTrans', 'commitChanges', 'readTransAt', 'buildTransIndex', 'refresh')
+
+def threadIoCounters():
+    # Bytes read and written by the calling thread (Linux only); None where the counters are unavailable.
+    try:
+        with open('/proc/thread-self/io', 'rb') as file_handle:
+            io_fields = dict(io_line.split(b': ') for io_line in file_handle.read().splitlines())
+        return int(io_fields[b'rchar']), int(io_fields[b'wchar'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def resultRows(result_value):
+    if isinstance(result_value, (list, tuple, TransactionColumns)):
+        return len(result_value)
+    return 0
+
+class OperationMetrics:
+    # Nothing is wrapped until enable() is called, so with metrics off every instrumented method runs
+    # exactly as written. Enabled, each call adds two clock reads and two reads of the thread I/O counters.
+    def __init__(self):
+        self.enabled = False
+        self.operation_totals = {}
+        self.metrics_guard = threading.Lock()
+        self.instrumented_targets = []
+        self.wrapped_methods = []
+        self.profile_mode = None
+        self.profiled_operations = set()
+        self.operation_profiles = {}
+        self.allocation_peaks = {}
+        self.profile_state = threading.local()
+        self.started_tracing = False
+        self.enabled_at = None
+
+    def addTarget(self, target_object, method_names, metric_prefix):
+        with self.metrics_guard:
+            self.instrumented_targets.append((target_object, method_names, metric_prefix))
+            if self.enabled:
+                self.wrapMethods(target_object, method_names, metric_prefix)
+
+    def wrapMethods(self, target_object, method_names, metric_prefix):
+        for method_name in method_names:
+            if hasattr(target_object, method_name):
+                setattr(target_object, method_name, self.measured(metric_prefix + method_name, getattr(target_object, method_name)))
+                self.wrapped_methods.append((target_object, method_name))
+
+    def enable(self, profile_mode=None, profiled_operations=()):
+        if profile_mode not in (None, 'cprofile', 'tracemalloc'):
+            raise InvalidInputError("Unknown profile mode: " + str(profile_mode))
+        with self.metrics_guard:
+            self.restoreMethods()
+            self.profile_mode = profile_mode
+            self.profiled_operations = set(profiled_operations)
+            if profile_mode == 'tracemalloc' and not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self.started_tracing = True
+            for target_object, method_names, metric_prefix in self.instrumented_targets:
+                self.wrapMethods(target_object, method_names, metric_prefix)
+            self.enabled = True
+            self.enabled_at = self.enabled_at or datetime.now()
+
+    def disable(self):
+        with self.metrics_guard:
+            self.restoreMethods()
+            if self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+            self.enabled = False
+
+    def restoreMethods(self):
+        # The wrappers are instance attributes shadowing the class methods, so deleting them restores the originals.
+        for target_object, method_name in self.wrapped_methods:
+            target_object.__dict__.pop(method_name, None)
+        self.wrapped_methods = []
+
+    def reset(self):
+        with self.metrics_guard:
+            self.operation_totals = {}
+            self.operation_profiles = {}
+            self.allocation_peaks = {}
+            self.enabled_at = datetime.now() if self.enabled else None
+
+    def measured(self, operation_name, bound_method):
+        @functools.wraps(bound_method)
+        def measuredCall(*call_args, **call_kwargs):
+            profile_call = operation_name in self.profiled_operations and not getattr(self.profile_state, 'active', False)
+            if profile_call:
+                self.profile_state.active = True
+                profile_started = self.startProfile(operation_name)
+            io_before = threadIoCounters()
+            started_at = time.perf_counter()
+            call_failed = True
+            try:
+                call_result = bound_method(*call_args, **call_kwargs)
+                call_failed = False
+                return call_result
+            finally:
+                elapsed_seconds = time.perf_counter() - started_at
+                io_after = threadIoCounters()
+                if profile_call:
+                    self.stopProfile(operation_name, profile_started)
+                    self.profile_state.active = False
+                row_count = resultRows(call_args[0]) if call_args else 0
+                if not call_failed:
+                    row_count = max(row_count, resultRows(call_result))
+                self.record(
+                    operation_name, elapsed_seconds, call_failed, row_count,
+                    io_after[0] - io_before[0] if io_before and io_after else 0,
+                    io_after[1] - io_before[1] if io_before and io_after else 0
+                )
+        return measuredCall
+
+    def record(self, operation_name, elapsed_seconds, call_failed=False, row_count=0, bytes_read=0, bytes_written=0):
+        with self.metrics_guard:
+            operation_total = self.operation_totals.get(operation_name)
+            if operation_total is None:
+                operation_total = self.operation_totals[operation_name] = {
+                    'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0, 'bytes_read': 0, 'bytes_written': 0
+                }
+            operation_total['calls'] += 1
+            operation_total['errors'] += call_failed
+            operation_total['seconds'] += elapsed_seconds
+            operation_total['max_seconds'] = max(operation_total['max_seconds'], elapsed_seconds)
+            operation_total['rows'] += row_count
+            operation_total['bytes_read'] += bytes_read
+            operation_total['bytes_written'] += bytes_written
+
+    def startProfile(self, operation_name):
+        if self.profile_mode == 'cprofile':
+            with self.metrics_guard:
+                operation_profile = self.operation_profiles.setdefault(operation_name, cProfile.Profile())
+            try:
+                operation_profile.enable()
+            except ValueError:
+                # Another thread is already being profiled; this call is only timed.
+                return None
+            return operation_profile
+        if self.profile_mode == 'tracemalloc' and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[0]
+        return None
+
+    def stopProfile(self, operation_name, profile_started):
+        if profile_started is None:
+            return
+        if self.profile_mode == 'cprofile':
+            profile_started.disable()
+            return
+        snapshot_before, traced_before = profile_started
+        traced_after, traced_peak = tracemalloc.get_traced_memory()
+        call_peak = traced_peak - traced_before
+        with self.metrics_guard:
+            allocation_peak = self.allocation_peaks.get(operation_name)
+            if allocation_peak is not None and allocation_peak['peak_bytes'] >= call_peak:
+                return
+        # Only the call with the highest peak keeps its allocation sites.
+        allocation_sites = tracemalloc.take_snapshot().compare_to(snapshot_before, 'lineno')[:10]
+        with self.metrics_guard:
+            self.allocation_peaks[operation_name] = {
+                'peak_bytes': call_peak,
+                'retained_bytes': traced_after - traced_before,
+                'sites': [str(allocation_site) for allocation_site in allocation_sites]
+            }
+
+    def metricsReport(self):
+        with self.metrics_guard:
+            operation_rows = []
+            for operation_name, operation_total in self.operation_totals.items():
+                operation_row = dict(operation_total, operation=operation_name)
+                operation_row['average_ms'] = operation_total['seconds'] / operation_total['calls'] * 1000 if operation_total['calls'] else 0.0
+                operation_rows.append(operation_row)
+            return sorted(operation_rows, key=lambda operation_row: operation_row['seconds'], reverse=True)
+
+    def profileReport(self, operation_name, line_limit=25):
+        with self.metrics_guard:
+            operation_profile = self.operation_profiles.get(operation_name)
+            allocation_peak = self.allocation_peaks.get(operation_name)
+        if operation_profile is not None:
+            report_buffer = io.StringIO()
+            try:
+                pstats.Stats(operation_profile, stream=report_buffer).sort_stats('cumulative').print_stats(line_limit)
+            except TypeError:
+                return None
+            return report_buffer.getvalue()
+        if allocation_peak is not None:
+            return "\n".join([
+                f"Peak allocation: {allocation_peak['peak_bytes']:,} bytes, retained: {allocation_peak['retained_bytes']:,} bytes",
+                "Largest allocation changes during that call:"
+            ] + allocation_peak['sites'])
+        return None
+
+    def metricsDocument(self):
+        return {
+            'enabled': self.enabled,
+            'since': self.enabled_at.isoformat(' ', 'seconds') if self.enabled_at else None,
+            'profile_mode': self.profile_mode,
+            'profiled_operations': sorted(self.profiled_operations),
+            'operations': self.metricsReport(),
+            'profiles': {operation_name: self.profileReport(operation_name) for operation_name in sorted(set(self.operation_profiles) | set(self.allocation_peaks))}
+        }
+
+def benchmarkPasswordHashing(seconds_per_setting=1.0):
+    cost_settings = [
+        ('pbkdf2', {'pbkdf2_iterations': 100000}),
+        ('pbkdf2', {'pbkdf2_iterations': 240000}),
+        ('pbkdf2', {'pbkdf2_iterations': 600000}),
+        ('scrypt', {'scrypt_n': 8192}),
+        ('scrypt', {'scrypt_n': 16384}),
+        ('scrypt', {'scrypt_n': 32768})
+    ]
+    worker_count = os.cpu_count() or 1
+    print(f"{'Algorithm':<10} {'Cost':<18} {'Serial logins/s':>16} {'Pooled logins/s':>16}")
+    for algorithm_name, cost_parameters in cost_settings:
+        if algorithm_name == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+            continue
+        password_hasher = PasswordHasher(algorithm_name, worker_count=worker_count, cache_size=0, **cost_parameters)
+        stored_password = password_hasher.hashNow('benchmark password')
+        
+        serial_count = 0
+        started_at = time.perf_counter()
+        while time.perf_counter() - started_at < seconds_per_setting:
+            password_hasher.verifyNow('benchmark password', stored_password)
+            serial_count += 1
+        serial_rate = serial_count / (time.perf_counter() - started_at)
+        
+        pooled_count = 0
+        started_at = time.perf_counter()
+        while time.perf_counter() - started_at < seconds_per_setting:
+            pending_checks = [password_hasher.hash_pool.submit(password_hasher.verifyNow, 'benchmark password', stored_password) for _ in range(worker_count * 2)]
+            for pending_check in pending_checks:
+                pending_check.result()
+            pooled_count += len(pending_checks)
+        pooled_rate = pooled_count / (time.perf_counter() - started_at)
+        
+        cost_text = ', '.join(parameter_name.split('_')[-1] + '=' + str(parameter_value) for parameter_name, parameter_value in cost_parameters.items())
+        print(f"{algorithm_name:<10} {cost_text:<18} {serial_rate:>16.1f} {pooled_rate:>16.1f}")
+        password_hasher.close()
+    
+    password_hasher = PasswordHasher()
+    stored_password = password_hasher.hash('benchmark password')
+    password_hasher.verify('benchmark password', stored_password)
+    cached_count = 0
+    started_at = time.perf_counter()
+    while time.perf_counter() - started_at < seconds_per_setting:
+        password_hasher.verify('benchmark password', stored_password)
+        cached_count += 1
+    print(f"Cached repeat logins: {cached_count / (time.perf_counter() - started_at):.0f}/s ({worker_count} workers)")
+    password_hasher.close()
+
+def benchmarkRecordMemory(row_count=200000):
+    sample_types = list(LEDGER_SIGNS)
+    sample_details = ['Cash deposit', 'Cash withdrawal', 'Salary', 'Rent', 'Groceries']
+    journal_buffer = io.StringIO()
+    csv_writer = csv.writer(journal_buffer)
+    csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
+    for row_number in range(row_count):
+        csv_writer.writerow([
+            'user' + str(row_number % 1000),
+            timestampDate(1704067200 + row_number * 37),
+            sample_types[row_number % len(sample_types)],
+            formatCents(row_number % 500000),
+            formatCents(row_number * 300 + row_number % 100),
+            sample_details[row_number % len(sample_details)]
+        ])
+    journal_text = journal_buffer.getvalue()
+    
+    def loadDicts():
+        # The layout used before record types: one csv.DictReader dict per row with string amounts.
+        return list(csv.DictReader(io.StringIO(journal_text)))
+    
+    def loadRecords():
+        csv_reader = csv.reader(io.StringIO(journal_text))
+        next(csv_reader)
+        return [TransactionRecord(line_fields[0], line_fields[1], line_fields[2], parseCents(line_fields[3]), parseCents(line_fields[4]), line_fields[5]) for line_fields in csv_reader]
+    
+    def loadColumns():
+        csv_reader = csv.reader(io.StringIO(journal_text))
+        next(csv_reader)
+        transaction_table = TransactionColumns()
+        for line_fields in csv_reader:
+            transaction_table.appendRow(line_fields[0], line_fields[1], line_fields[2], parseCents(line_fields[3]), parseCents(line_fields[4]), line_fields[5])
+        return transaction_table
+    
+    print(f"{row_count} journal rows")
+    print(f"{'Layout':<20} {'Bytes/row':>10} {'Total MB':>10} {'Load s':>8}")
+    for layout_name, load_function in (('dict per row', loadDicts), ('TransactionRecord', loadRecords), ('TransactionColumns', loadColumns)):
+        started_at = time.perf_counter()
+        loaded_rows = load_function()
+        load_seconds = time.perf_counter() - started_at
+        del loaded_rows
+        tracemalloc.start()
+        loaded_rows = load_function()
+        used_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded_rows
+        print(f"{layout_name:<20} {used_bytes / row_count:>10.1f} {used_bytes / 1048576:>10.1f} {load_seconds:>8.2f}")
+
+class BankError(Exception):
+    pass
+
+class InvalidInputError(BankError):
+    pass
+
+class InvalidAmountError(BankError):
+    pass
+
+class InsufficientFundsError(BankError):
+    pass
+
+class AccountNotFoundError(BankError):
+    pass
+
+class AccountExistsError(BankError):
+    pass
+
+class SelfTransferError(BankError):
+    pass
+
+class AuthenticationError(BankError):
+    pass
+
+class StorageError(BankError):
+    pass
+
+class TransactionResult:
+    def __init__(self, transaction_record):
+        self.username = transaction_record.username
+        self.date = transaction_record.date
+        self.type = transaction_record.type
+        self.amount = centsToDecimal(transaction_record.amount)
+        self.balance = centsToDecimal(transaction_record.balance)
+        self.details = transaction_record.details
+
+    def __repr__(self):
+        return f"TransactionResult({self.type} {self.username} amount={self.amount} balance={self.balance})"
+
+REPORT_COLUMNS = {
+    'statement': ['username', 'date', 'type', 'amount', 'balance', 'details'],
+    'transactions': ['username', 'date', 'type', 'amount', 'balance', 'details'],
+    'daily': ['date', 'type', 'count', 'volume'],
+    'top': ['rank', 'username', 'balance'],
+    'accounts': ['username', 'balance']
+}
+REPORT_FORMATS = ('csv', 'jsonl')
+
+def publicRecord(internal_record):
+    public_record = internal_record.asDict()
+    for money_field in ('amount', 'balance'):
+        if money_field in public_record:
+            public_record[money_field] = centsToDecimal(public_record[money_field])
+    return public_record
+
+def publicAccount(account_record):
+    # Account results carry no password field, so the stored hash never leaves the service.
+    return {'username': account_record.username, 'balance': centsToDecimal(account_record.balance)}
+
+def shardNumber(account_username, shard_count):
+    return zlib.crc32(account_username.encode('utf-8')) % shard_count
+
+def shardPath(output_path, shard_number):
+    path_stem, path_extension = os.path.splitext(output_path)
+    return path_stem + '.part' + str(shard_number) + path_extension
+
+def reportDate(date_text):
+    if date_text in (None, ''):
+        return None
+    try:
+        return datetime.strptime(str(date_text).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise InvalidInputError("Dates must be written as YYYY-MM-DD!")
+
+def dateInRange(date_text, start_date, end_date):
+    return (start_date is None or date_text[:10] >= start_date) and (end_date is None or date_text[:10] <= end_date)
+
+def transactionMatches(transaction_record, start_date, end_date, type_names, minimum_cents, maximum_cents):
+    return (
+        dateInRange(transaction_record.date, start_date, end_date)
+        and (not type_names or transaction_record.type in type_names)
+        and (minimum_cents is None or transaction_record.amount >= minimum_cents)
+        and (maximum_cents is None or transaction_record.amount <= maximum_cents)
+    )
+
+def writeReportRows(report_rows, output_target, output_format, column_names):
+    if output_format not in REPORT_FORMATS:
+        raise InvalidInputError("Unknown report format: " + str(output_format))
+    if isinstance(output_target, str):
+        temporary_path = output_target + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temporary_path, 'w', newline='', encoding='utf-8') as file_handle:
+                row_count = writeReportRows(report_rows, file_handle, output_format, column_names)
+            os.replace(temporary_path, output_target)
+        except OSError as err:
+            raise StorageError("Report could not be written: " + str(err))
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return row_count
+    
+    row_count = 0
+    if output_format == 'csv':
+        csv_writer = csv.writer(output_target)
+        csv_writer.writerow(column_names)
+        for report_row in report_rows:
+            csv_writer.writerow([report_row[column_name] for column_name in column_names])
+            row_count += 1
+    else:
+        for report_row in report_rows:
+            output_target.write(json.dumps(report_row, default=str) + '\n')
+            row_count += 1
+    return row_count
+
+def ledgerRows(chunk_bytes):
+    # Yields (line number within the chunk, row, None) for every record in a slice of the ledger, where row
+    # is (username, date, type, amount in cents, balance in cents, details), and (line number, None, reason)
+    # for every line that is refused. Lines left out by RecordLines are refused together.
+    line_number = 1
+    next_offset = 0
+    for line_offset, raw_line in RecordLines(io.BytesIO(chunk_bytes)):
+        if line_offset != next_offset:
+            skipped_lines = chunk_bytes.count(b'\n', next_offset, line_offset)
+            yield line_number, None, "record spans " + str(skipped_lines) + " lines"
+            line_number += skipped_lines
+        next_offset = line_offset + len(raw_line)
+        line_fields = recordFields(raw_line)
+        if len(line_fields) != 6:
+            yield line_number, None, "expected 6 fields, found " + str(len(line_fields))
+        else:
+            try:
+                yield line_number, (line_fields[0], line_fields[1], line_fields[2], parseCents(line_fields[3]), parseCents(line_fields[4]), line_fields[5]), None
+            except ValueError as err:
+                yield line_number, None, str(err)
+        line_number += 1
+    skipped_lines = chunk_bytes.count(b'\n', next_offset)
+    if skipped_lines:
+        yield line_number, None, "record spans " + str(skipped_lines) + " lines"
+
+def parseLedgerRows(chunk_bytes):
+    # Returns the parsed rows, the rejected ones as (line number within the chunk, reason), and the
+    # number of lines in the chunk.
+    chunk_table = TransactionColumns()
+    chunk_rejects = []
+    for line_number, ledger_row, reject_reason in ledgerRows(chunk_bytes):
+        if ledger_row is None:
+            chunk_rejects.append((line_number, reject_reason))
+        else:
+            chunk_table.appendRow(*ledger_row)
+    chunk_table.shared_strings = {}
+    return chunk_table, chunk_rejects, chunk_bytes.count(b'\n')
+
+def readLedgerChunk(bank_folder, closed_segment, start_offset, end_offset):
+    if closed_segment is not None:
+        return CsvStorage(bank_folder).segmentData(closed_segment)
+    with open(os.path.join(bank_folder, 'transactions.csv'), 'rb') as file_handle:
+        file_handle.seek(start_offset)
+        return file_handle.read(end_offset - start_offset)
+
+def parseLedgerChunk(bank_folder, closed_segment, start_offset, end_offset):
+    # Runs in a worker process: parses one closed segment or one slice of the active journal.
+    return parseLedgerRows(readLedgerChunk(bank_folder, closed_segment, start_offset, end_offset))
+
+def transfersMatch(outgoing_record, incoming_record):
+    # Both halves of a transfer are written together, the outgoing one first, and name each other.
+    if outgoing_record.amount != incoming_record.amount:
+        return False
+    incoming_prefix = "Transfer from " + outgoing_record.username + ": "
+    if not incoming_record.details.startswith(incoming_prefix):
+        return False
+    return outgoing_record.details == "Transfer to " + incoming_record.username + ": " + incoming_record.details[len(incoming_prefix):]
+
+class LedgerReplay:
+    # Folds one contiguous part of the ledger without knowing the balances it starts from. A record's
+    # anchor is its recorded balance minus the user's signed amounts so far in this part, so the record
+    # is right exactly when its anchor equals the user's balance before the part. Only each user's first
+    # anchor and the records that differ from it are kept, and are checked once the parts are merged.
+    def __init__(self, problem_limit=50):
+        self.problem_limit = problem_limit
+        self.record_count = 0
+        self.line_count = 0
+        self.delta_total = 0
+        # username -> [first anchor, first record number, first recorded balance, signed total, records at first anchor]
+        self.user_folds = {}
+        self.deviant_records = []
+        self.problems = []
+        self.rejected_rows = []
+        self.leading_transfer = None
+        self.open_transfer = None
+
+    def problem(self, record_number, problem_text):
+        if len(self.problems) <= self.problem_limit:
+            self.problems.append((record_number, problem_text))
+
+    def reject(self, line_number, reject_reason):
+        if len(self.rejected_rows) <= self.problem_limit:
+            self.rejected_rows.append((self.record_count, line_number, reject_reason))
+
+    def add(self, transaction_record):
+        self.record_count += 1
+        record_number = self.record_count
+        account_username = transaction_record.username
+        transaction_type = transaction_record.type
+        transfer_paired = False
+        if self.open_transfer is not None:
+            open_number, open_record = self.open_transfer
+            self.open_transfer = None
+            transfer_paired = transaction_type == 'TRANSFER_IN' and transfersMatch(open_record, transaction_record)
+            if not transfer_paired:
+                self.problem(open_number, f"transfer of {formatCents(open_record.amount)} from {open_record.username} has no matching TRANSFER_IN")
+        if transaction_type == 'TRANSFER_OUT':
+            self.open_transfer = (record_number, transaction_record)
+        elif transaction_type == 'TRANSFER_IN' and not transfer_paired:
+            if record_number == 1:
+                # May be the second half of a transfer that ends the previous part.
+                self.leading_transfer = transaction_record
+            else:
+                self.problem(record_number, f"transfer of {formatCents(transaction_record.amount)} to {account_username} has no matching TRANSFER_OUT")
+        
+        entry_sign = LEDGER_SIGNS.get(transaction_type)
+        if entry_sign is None:
+            self.problem(record_number, f"unknown transaction type {transaction_type!r} for {account_username}")
+            return
+        signed_amount = entry_sign * transaction_record.amount
+        self.delta_total += signed_amount
+        user_fold = self.user_folds.get(account_username)
+        if user_fold is None:
+            self.user_folds[account_username] = [transaction_record.balance - signed_amount, record_number, transaction_record.balance, signed_amount, 1]
+            return
+        user_fold[3] += signed_amount
+        record_anchor = transaction_record.balance - user_fold[3]
+        if record_anchor == user_fold[0]:
+            user_fold[4] += 1
+        elif len(self.deviant_records) <= self.problem_limit:
+            self.deviant_records.append((record_number, account_username, transaction_record.balance, record_anchor))
+
+    def folds(self):
+        # (username, first anchor, first record number, first recorded balance, signed total, records at first anchor)
+        if self.user_folds is not None:
+            return ((account_username,) + tuple(user_fold) for account_username, user_fold in self.user_folds.items())
+        fold_values = self.fold_values
+        return zip(self.fold_usernames, fold_values[0::5], fold_values[1::5], fold_values[2::5], fold_values[3::5], fold_values[4::5])
+
+    def pack(self):
+        # One integer array pickles and loads far faster than a dict of small lists on its way back
+        # from a worker process, and the merge reads it on a single core.
+        try:
+            fold_values = array('q', chain.from_iterable(self.user_folds.values()))
+        except OverflowError:
+            # Totals of a damaged ledger can pass 64 bits; the dict is sent as it is.
+            return
+        self.fold_usernames = list(self.user_folds)
+        self.fold_values = fold_values
+        self.user_folds = None
+
+def replayLedgerChunk(bank_folder, closed_segment, start_offset, end_offset, problem_limit):
+    # Runs in a worker process: replays one closed segment or one slice of the active journal.
+    chunk_bytes = readLedgerChunk(bank_folder, closed_segment, start_offset, end_offset)
+    ledger_replay = LedgerReplay(problem_limit)
+    for line_number, ledger_row, reject_reason in ledgerRows(chunk_bytes):
+        if ledger_row is None:
+            ledger_replay.reject(line_number, reject_reason)
+        else:
+            ledger_replay.add(TransactionRecord(*ledger_row))
+    ledger_replay.line_count = chunk_bytes.count(b'\n')
+    ledger_replay.pack()
+    return ledger_replay
+
+def exportLedgerShard(bank_folder, backend_name, journal_end, shard_number, shard_count, start_date, end_date, output_path, output_format):
+    # Runs in a worker process: each shard re-reads the journal but only parses its own users' lines.
+    report_storage = STORAGE_BACKENDS[backend_name](bank_folder)
+    report_storage.openReader()
+    try:
+        shard_rows = (
+            publicRecord(transaction_record)
+            for transaction_record in report_storage.readTransShard(0, journal_end, shard_number, shard_count)
+            if dateInRange(transaction_record.date, start_date, end_date)
+        )
+        return writeReportRows(shard_rows, output_path, output_format, REPORT_COLUMNS['transactions'])
+    finally:
+        report_storage.close()
+
+class BankService:
+    def __init__(self, bank_folder='bank_data'):
+        self.bank_folder = bank_folder
+        self.config_file_path = os.path.join(self.bank_folder, 'config.json')
+        self.stats_file_path = os.path.join(self.bank_folder, 'stats.json')
+        self.bank_config = self.loadConfig()
+        if self.bank_config['durability'] not in DURABILITY_LEVELS:
+            raise InvalidInputError("Unknown durability level: " + str(self.bank_config['durability']))
+        self.password_hasher = self.createHasher()
+        self.folder_lock = FileLock(os.path.join(self.bank_folder, 'bank.lock'))
+        self.storage = self.createStorage(self.bank_config['storage_backend'])
+        self.metrics = OperationMetrics()
+        self.metrics.addTarget(self, METERED_SERVICE_METHODS, 'service.')
+        self.metrics.addTarget(self.storage, METERED_STORAGE_METHODS, 'storage.')
+        if self.bank_config['metrics']:
+            self.metrics.enable(self.bank_config['profile_mode'], self.bank_config['profile_operations'])
+        self.account_index = {}
+        self.dirty_accounts = set()
+        self.account_stats = {}
+        self.transaction_stats = {}
+        self.balance_low_heap = []
+        self.balance_high_heap = []
+        self.search_index = None
+        self.storage_lock = threading.RLock()
+        self.account_locks = {}
+        self.account_locks_guard = threading.Lock()
+        self.commit_condition = threading.Condition()
+        self.commit_tickets = threading.local()
+        self.queued_records = []
+        self.queued_sequence = 0
+        self.committed_sequence = 0
+        self.failed_sequence = 0
+        self.queue_started = 0.0
+        self.writer_thread = None
+        self.writer_stopping = False
+        self.setupFiles()
+        self.loadAccounts()
+        self.loadStats()
+        self.snapshot_position = self.transaction_stats['journal_position']
+
+    def checkUser(self, username_to_check):
+        return username_to_check in self.account_index
+
+    def accountLock(self, account_username):
+        # Each entry is [lock, users]; users counts the callers holding or waiting for the lock.
+        with self.account_locks_guard:
+            if account_username not in self.account_locks:
+                self.account_locks[account_username] = [threading.Lock(), 0]
+            lock_entry = self.account_locks[account_username]
+            lock_entry[1] += 1
+            return lock_entry[0]
+
+    def releaseAccountLock(self, account_username):
+        # Entries are dropped once nobody uses them, so names that never became accounts
+        # (a refused create, a transfer to a missing recipient) do not stay in the map.
+        with self.account_locks_guard:
+            lock_entry = self.account_locks[account_username]
+            lock_entry[1] -= 1
+            if lock_entry[1] == 0:
+                del self.account_locks[account_username]
+
+    @contextlib.contextmanager
+    def lockAccounts(self, *account_usernames):
+        # Locks are always taken in username order, so two transfers in opposite directions cannot deadlock.
+        locked_usernames = sorted(set(account_usernames))
+        held_locks = [self.accountLock(account_username) for account_username in locked_usernames]
+        try:
+            for account_lock in held_locks:
+                account_lock.acquire()
+            try:
+                yield
+            finally:
+                for account_lock in reversed(held_locks):
+                    account_lock.release()
+        finally:
+            for account_username in locked_usernames:
+                self.releaseAccountLock(account_username)
+        # Under group durability the change is only queued. Waiting for its group here, once the
+        # account locks are released, lets other sessions add their changes to the same group.
+        commit_sequence = getattr(self.commit_tickets, 'sequence', 0)
+        if self.bank_config['durability'] == 'group' and commit_sequence > self.committed_sequence:
+            self.waitForCommit(commit_sequence)
+
+    def getBal(self, username_for_balance):
+        user_record = self.getUser(username_for_balance)
+        if user_record:
+            return user_record.balance
+        else:
+            return 0
+
+    def setBalance(self, user_to_update, new_balance_value):
+        self.updateBalance(user_to_update, new_balance_value)
+
+    def addTrans(self, trans_username, trans_type, trans_amount, trans_balance, trans_description=""):
+        return self.saveTrans(trans_username, trans_type, trans_amount, trans_balance, trans_description)
+
+    def hidePass(self, plain_password):
+        return self.password_hasher.hash(plain_password)
+
+    def checkPassword(self, account_username, input_password):
+        self.reloadIfStale()
+        user_data = self.getUser(account_username)
+        if not user_data:
+            return self.password_hasher.rejectUnknown(input_password)
+        stored_password = user_data.password
+        password_matches, needs_rehash = self.password_hasher.verify(input_password, stored_password)
+        if password_matches and needs_rehash:
+            self.rehashPassword(account_username, stored_password, input_password)
+        return password_matches
+
+    def rehashPassword(self, account_username, old_stored_password, plain_password):
+        # Old Base64 records and hashes made with other cost settings are upgraded on a successful login.
+        new_stored_password = self.hidePass(plain_password)
+        with self.writeAccess():
+            account_record = self.getUser(account_username)
+            if account_record is None or account_record.password != old_stored_password:
+                return
+            account_record.password = new_stored_password
+            self.dirty_accounts.add(account_username)
+            self.flushAccounts()
+
+    def createHasher(self):
+        try:
+            return PasswordHasher(
+                self.bank_config['password_hash'],
+                scrypt_n=self.bank_config['scrypt_n'],
+                scrypt_r=self.bank_config['scrypt_r'],
+                scrypt_p=self.bank_config['scrypt_p'],
+                pbkdf2_iterations=self.bank_config['pbkdf2_iterations'],
+                worker_count=self.bank_config['hash_workers'],
+                cache_size=self.bank_config['auth_cache_size']
+            )
+        except (TypeError, ValueError) as err:
+            raise InvalidInputError("Invalid password hash settings: " + str(err))
+
+    def setupFiles(self):
+        if not os.path.isdir(self.bank_folder):
+            os.mkdir(self.bank_folder)
+        self.storage.setup()
+
+    def loadConfig(self):
+        bank_config = {
+            'storage_backend': 'csv',
+            'password_hash': 'scrypt',
+            'scrypt_n': 16384,
+            'scrypt_r': 8,
+            'scrypt_p': 1,
+            'pbkdf2_iterations': 240000,
+            'hash_workers': None,
+            'auth_cache_size': 1024,
+            'snapshot_interval': 4194304,
+            'segment_size': 16777216,
+            'segment_days': 0,
+            'segment_compression': 'gzip',
+            'metrics': False,
+            'profile_mode': None,
+            'profile_operations': [],
+            'load_workers': None,
+            'durability': 'every-op',
+            'group_commit_size': 512,
+            'group_commit_interval': 0.005
+        }
+        bank_config.update(self.readConfigFile())
+        if os.environ.get('BANK_STORAGE_BACKEND'):
+            bank_config['storage_backend'] = os.environ['BANK_STORAGE_BACKEND']
+        return bank_config
+
+    def readConfigFile(self):
+        try:
+            if os.path.isfile(self.config_file_path):
+                with open(self.config_file_path, 'r') as file_handle:
+                    return json.load(file_handle)
+        except Exception as err:
+            logProblem("Problem reading configuration: " + str(err))
+        return {}
+
+    def saveConfig(self, changed_settings):
+        # Only the settings already in config.json and the changed ones are written, so defaults and the
+        # BANK_STORAGE_BACKEND override never become permanent.
+        saved_config = self.readConfigFile()
+        saved_config.update(changed_settings)
+        temporary_path = self.config_file_path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temporary_path, 'w') as file_handle:
+                json.dump(saved_config, file_handle, indent=2)
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+            os.replace(temporary_path, self.config_file_path)
+        except Exception as err:
+            logProblem("Problem saving configuration: " + str(err))
+
+    def createStorage(self, backend_name):
+        if backend_name not in STORAGE_BACKENDS:
+            raise InvalidInputError("Unknown storage backend: " + str(backend_name))
+        return STORAGE_BACKENDS[backend_name](self.bank_folder, self.folder_lock)
+
+    def migrateStorage(self, target_backend):
+        if target_backend == self.bank_config['storage_backend']:
+            raise InvalidInputError("Storage backend is already " + target_backend)
+        target_storage = self.createStorage(target_backend)
+        target_storage.setup()
+        with self.storage_lock:
+            self.flushAccounts()
+            if not target_storage.storeAccounts(self.storage.loadAccounts()):
+                raise StorageError("Accounts could not be migrated!")
+            if not target_storage.storeTrans(self.storage.readTransFrom(0, self.storage.journalPosition())):
+                raise StorageError("Transactions could not be migrated!")
+            target_storage.close()
+            self.bank_config['storage_backend'] = target_backend
+            self.saveConfig({'storage_backend': target_backend})
+            return len(self.account_index), self.transaction_stats['transaction_count']
+
+    def getAccounts(self):
+        return self.storage.loadAccounts()
+
+    def getTrans(self, worker_count=None):
+        return self.storage.loadTrans(worker_count or self.bank_config['load_workers'])
+
+    def storeAccounts(self, accounts_to_save):
+        return self.storage.storeAccounts(accounts_to_save)
+
+    def storeTrans(self, transactions_to_save):
+        self.storage.storeTrans(transactions_to_save)
+        self.computeTransStats()
+        self.saveStats()
+
+    def tailTrans(self, record_count):
+        with self.storage_lock:
+            self.flushQueue()
+            return list(self.storage.tailTrans(record_count))
+
+    def journalPosition(self):
+        with self.storage_lock:
+            self.flushQueue()
+            return self.storage.journalPosition()
+
+    def readTransFrom(self, start_position, end_position):
+        with self.storage_lock:
+            self.flushQueue()
+            return list(self.storage.readTransFrom(start_position, end_position))
+
+    def reloadIfStale(self):
+        with self.storage_lock:
+            if not self.storage.isStale():
+                return False
+            self.storage.refresh()
+            self.loadAccounts()
+            saved_position = self.transaction_stats.get('journal_position', 0)
+            if 0 < saved_position <= self.storage.journalPosition():
+                self.computeTransStats(saved_position, self.transaction_stats)
+            else:
+                self.computeTransStats()
+            return True
+
+    @contextlib.contextmanager
+    def writeAccess(self):
+        # Other processes commit under the same folder lock, so anything they wrote is reloaded
+        # here before a change is validated and written; the caller re-validates when it was.
+        with self.storage_lock, self.storage.writeLock():
+            yield self.reloadIfStale()
+            self.commit_tickets.sequence = self.queued_sequence
+
+    def loadAccounts(self):
+        self.account_index = {}
+        for account_record in self.getAccounts():
+            self.account_index[account_record.username] = account_record
+        self.dirty_accounts.clear()
+        self.resetAccountStats()
+        if self.search_index is not None:
+            # Accounts are never removed, so a reload only has to add the names other programs created;
+            # a large batch of them is cheaper to index from scratch on the next search.
+            new_usernames = [account_username for account_username in self.account_index if account_username not in self.search_index]
+            if len(new_usernames) > 1000:
+                self.search_index = None
+            else:
+                for account_username in new_usernames:
+                    self.search_index.add(account_username)
+
+    def resetAccountStats(self):
+        self.account_stats = {
+            'account_count': len(self.account_index),
+            'balance_total': sum(account_record.balance for account_record in self.account_index.values())
+        }
+        self.balance_low_heap = [(account_record.balance, account_record.username) for account_record in self.account_index.values()]
+        self.balance_high_heap = [(-account_record.balance, account_record.username) for account_record in self.account_index.values()]
+        heapq.heapify(self.balance_low_heap)
+        heapq.heapify(self.balance_high_heap)
+
+    def trackBalance(self, account_username, previous_balance, current_balance):
+        if previous_balance is None:
+            self.account_stats['account_count'] += 1
+            previous_balance = 0
+        self.account_stats['balance_total'] += current_balance - previous_balance
+        if len(self.balance_low_heap) > 2 * len(self.account_index) + 64:
+            self.resetAccountStats()
+            return
+        heapq.heappush(self.balance_low_heap, (current_balance, account_username))
+        heapq.heappush(self.balance_high_heap, (-current_balance, account_username))
+
+    def balanceExtremes(self):
+        # Heap entries go stale when a balance changes; they are discarded lazily here.
+        while self.balance_low_heap:
+            lowest_balance, account_username = self.balance_low_heap[0]
+            account_record = self.account_index.get(account_username)
+            if account_record and account_record.balance == lowest_balance:
+                break
+            heapq.heappop(self.balance_low_heap)
+        while self.balance_high_heap:
+            negated_balance, account_username = self.balance_high_heap[0]
+            account_record = self.account_index.get(account_username)
+            if account_record and account_record.balance == -negated_balance:
+                break
+            heapq.heappop(self.balance_high_heap)
+        if not self.balance_low_heap or not self.balance_high_heap:
+            return None, None
+        return self.balance_low_heap[0][0], -self.balance_high_heap[0][0]
+
+    def trackTrans(self, transaction_record):
+        transaction_type = transaction_record.type
+        self.transaction_stats['transaction_count'] += 1
+        type_counts = self.transaction_stats['type_counts']
+        type_volumes = self.transaction_stats['type_volumes']
+        type_counts[transaction_type] = type_counts.get(transaction_type, 0) + 1
+        type_volumes[transaction_type] = type_volumes.get(transaction_type, 0) + transaction_record.amount
+
+    def computeTransStats(self, start_position=0, base_stats=None):
+        self.transaction_stats = base_stats or {
+            'storage_backend': self.storage.backend_name,
+            'journal_position': 0,
+            'transaction_count': 0,
+            'type_counts': {},
+            'type_volumes': {}
+        }
+        closed_summary = None if base_stats else self.storage.closedSummary()
+        if closed_summary:
+            # Closed segments carry their own totals, so only the active journal is read.
+            start_position = closed_summary['end_position']
+            self.transaction_stats['transaction_count'] = closed_summary['transaction_count']
+            self.transaction_stats['type_counts'] = closed_summary['type_counts']
+            self.transaction_stats['type_volumes'] = closed_summary['type_volumes']
+        end_position = self.storage.journalPosition()
+        for transaction_record in self.storage.readTransFrom(start_position, end_position):
+            self.trackTrans(transaction_record)
+        self.transaction_stats['journal_position'] = end_position
+
+    def readStats(self):
+        try:
+            if os.path.isfile(self.stats_file_path):
+                with open(self.stats_file_path, 'r') as file_handle:
+                    return json.load(file_handle)
+        except Exception as err:
+            logProblem("Problem reading statistics data: " + str(err))
+        return {}
+
+    def loadStats(self):
+        saved_document = self.readStats()
+        saved_stats = saved_document.get('transactions')
+        if (saved_stats and saved_document.get('amount_unit') == 'cents'
+                and saved_stats.get('storage_backend') == self.storage.backend_name
+                and 0 < saved_stats.get('journal_position', 0) <= self.storage.journalPosition()):
+            self.computeTransStats(saved_stats['journal_position'], saved_stats)
+        else:
+            self.computeTransStats()
+        self.saveStats()
+
+    def saveStats(self):
+        lowest_balance, highest_balance = self.balanceExtremes()
+        stats_document = {
+            'amount_unit': 'cents',
+            'accounts': {
+                'account_count': self.account_stats['account_count'],
+                'balance_total': self.account_stats['balance_total'],
+                'lowest_balance': lowest_balance,
+                'highest_balance': highest_balance
+            },
+            'transactions': self.transaction_stats
+        }
+        temporary_path = self.stats_file_path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temporary_path, 'w') as file_handle:
+                json.dump(stats_document, file_handle, indent=2)
+            os.replace(temporary_path, self.stats_file_path)
+        except Exception as err:
+            logProblem("Problem saving statistics data: " + str(err))
+
+    def verifyStats(self):
+        # The file is read again here: every commit rewrites it, so the copy read at startup is out of date
+        # as soon as this program changes anything.
+        with self.storage_lock:
+            self.flushQueue()
+            saved_document = self.readStats()
+            if not saved_document:
+                return ["Statistics file missing or unreadable"]
+            if saved_document.get('amount_unit') != 'cents':
+                return ["Statistics file was written in an older format"]
+        
+            account_collection = self.getAccounts()
+            balance_values = [account_record.balance for account_record in account_collection]
+            expected_accounts = {
+                'account_count': len(account_collection),
+                'balance_total': sum(balance_values),
+                'lowest_balance': min(balance_values) if balance_values else None,
+                'highest_balance': max(balance_values) if balance_values else None
+            }
+            expected_transactions = {
+                'storage_backend': self.storage.backend_name,
+                'journal_position': self.storage.journalPosition(),
+                'transaction_count': 0,
+                'type_counts': {},
+                'type_volumes': {}
+            }
+            start_position = 0
+            closed_summary = self.storage.closedSummary()
+            if closed_summary:
+                start_position = closed_summary['end_position']
+                for field_name in ('transaction_count', 'type_counts', 'type_volumes'):
+                    expected_transactions[field_name] = closed_summary[field_name]
+            for transaction_record in self.storage.readTransFrom(start_position, expected_transactions['journal_position']):
+                transaction_type = transaction_record.type
+                expected_transactions['transaction_count'] += 1
+                expected_transactions['type_counts'][transaction_type] = expected_transactions['type_counts'].get(transaction_type, 0) + 1
+                expected_transactions['type_volumes'][transaction_type] = expected_transactions['type_volumes'].get(transaction_type, 0) + transaction_record.amount
+        
+            mismatches = []
+            def compare(section_name, expected_values, saved_values):
+                for field_name, expected_value in expected_values.items():
+                    saved_value = saved_values.get(field_name)
+                    if isinstance(expected_value, dict):
+                        compare(section_name + '.' + field_name, expected_value, saved_value or {})
+                        continue
+                    if expected_value == saved_value:
+                        continue
+                    mismatches.append(f"{section_name}.{field_name}: expected {expected_value}, found {saved_value}")
+            compare('accounts', expected_accounts, saved_document.get('accounts', {}))
+            compare('transactions', expected_transactions, saved_document.get('transactions', {}))
+            return mismatches
+
+    def ledgerParts(self, ledger_chunks, problem_limit, worker_count=None):
+        # Yields (source name, LedgerReplay) in ledger order. At most two parts per worker are in
+        # flight, so memory stays bounded however long the ledger is.
+        worker_count = min(len(ledger_chunks), worker_count or self.bank_config['load_workers'] or os.cpu_count() or 1)
+        if worker_count <= 1:
+            for source_name, closed_segment, chunk_start, chunk_end in ledger_chunks:
+                yield source_name, replayLedgerChunk(self.bank_folder, closed_segment, chunk_start, chunk_end, problem_limit)
+            return
+        with ProcessPoolExecutor(max_workers=worker_count) as replay_pool:
+            pending_parts = deque()
+            for source_name, closed_segment, chunk_start, chunk_end in ledger_chunks:
+                pending_parts.append((source_name, replay_pool.submit(replayLedgerChunk, self.bank_folder, closed_segment, chunk_start, chunk_end, problem_limit)))
+                if len(pending_parts) >= worker_count * 2:
+                    source_name, pending_part = pending_parts.popleft()
+                    yield source_name, pending_part.result()
+            while pending_parts:
+                source_name, pending_part = pending_parts.popleft()
+                yield source_name, pending_part.result()
+
+    def replayLedger(self, report, problem_limit=50, full_replay=False, worker_count=None):
+        # Streams the ledger once and folds every record into per-user balances, checking each recorded
+        # balance against the running total and each TRANSFER_OUT against the TRANSFER_IN written with it.
+        # The CSV ledger is cut into the same parts as a whole-ledger load and replayed on worker processes;
+        # merging the parts in order finishes the checks that depend on the balances before each part.
+        # Closed segments are taken from their footers' closing balances unless full_replay is set.
+        ledger_balances = {}
+        record_base = 0
+        closed_summary = None if full_replay else self.storage.closedSummary()
+        if closed_summary:
+            ledger_balances = closed_summary['closing_balances']
+            record_base = closed_summary['transaction_count']
+        ledger_total = sum(ledger_balances.values())
+        ledger_chunks = self.storage.ledgerChunks()
+        if ledger_chunks is None:
+            single_part = LedgerReplay(problem_limit)
+            for transaction_record in self.storage.readTransFrom(0, self.storage.journalPosition()):
+                single_part.add(transaction_record)
+            ledger_parts = [(self.storage.backend_name, single_part)]
+        else:
+            if closed_summary:
+                ledger_chunks = [ledger_chunk for ledger_chunk in ledger_chunks if ledger_chunk[1] is None]
+            ledger_parts = self.ledgerParts(ledger_chunks, problem_limit, worker_count)
+        
+        source_lines = defaultdict(int, {'transactions.csv': 1})
+        open_transfer = None
+        for source_name, ledger_replay in ledger_parts:
+            part_problems = [(record_base + record_number, f"Record {record_base + record_number}: {problem_text}") for record_number, problem_text in ledger_replay.problems]
+            for record_number, line_number, reject_reason in ledger_replay.rejected_rows:
+                part_problems.append((record_base + record_number, f"{source_name} line {source_lines[source_name] + line_number}: {reject_reason}"))
+            source_lines[source_name] += ledger_replay.line_count
+            
+            leading_transfer = ledger_replay.leading_transfer
+            if open_transfer is not None:
+                if leading_transfer is not None and transfersMatch(open_transfer[1], leading_transfer):
+                    leading_transfer = None
+                else:
+                    part_problems.append((open_transfer[0], f"Record {open_transfer[0]}: transfer of {formatCents(open_transfer[1].amount)} from {open_transfer[1].username} has no matching TRANSFER_IN"))
+            if leading_transfer is not None:
+                part_problems.append((record_base + 1, f"Record {record_base + 1}: transfer of {formatCents(leading_transfer.amount)} to {leading_transfer.username} has no matching TRANSFER_OUT"))
+            open_transfer = None
+            if ledger_replay.open_transfer is not None:
+                open_transfer = (record_base + ledger_replay.open_transfer[0], ledger_replay.open_transfer[1])
+            
+            opening_balances = {}
+            for account_username, first_anchor, first_number, first_balance, signed_total, anchored_count in ledger_replay.folds():
+                opening_balance = opening_balances[account_username] = ledger_balances.get(account_username, 0)
+                if first_anchor != opening_balance:
+                    record_number = record_base + first_number
+                    part_problems.append((record_number, f"Record {record_number}: {account_username} balance {formatCents(first_balance)} does not follow from previous balance (expected {formatCents(first_balance - first_anchor + opening_balance)})"))
+                    if anchored_count > 1:
+                        part_problems.append((record_number, f"Record {record_number}: {anchored_count - 1} later record(s) of {account_username} in this part of the ledger are off by the same amount"))
+                ledger_balances[account_username] = opening_balance + signed_total
+            for record_number, account_username, recorded_balance, record_anchor in ledger_replay.deviant_records:
+                opening_balance = opening_balances[account_username]
+                if record_anchor != opening_balance:
+                    part_problems.append((record_base + record_number, f"Record {record_base + record_number}: {account_username} balance {formatCents(recorded_balance)} does not follow from previous balance (expected {formatCents(recorded_balance - record_anchor + opening_balance)})"))
+            
+            part_problems.sort(key=lambda part_problem: part_problem[0])
+            for _, problem_text in part_problems:
+                report(problem_text)
+            record_base += ledger_replay.record_count
+            ledger_total += ledger_replay.delta_total
+        if open_transfer is not None:
+            report(f"Record {open_transfer[0]}: transfer of {formatCents(open_transfer[1].amount)} from {open_transfer[1].username} has no matching TRANSFER_IN")
+        return ledger_balances, record_base, ledger_total
+
+    def reconcile(self, problem_limit=50, full_replay=False, worker_count=None):
+        # Replays the ledger (see replayLedger) and checks that every account balance equals the sum
+        # of its ledger deltas. All arithmetic is in integer cents.
+        problems = []
+        def report(problem_text):
+            if len(problems) < problem_limit:
+                problems.append(problem_text)
+            elif len(problems) == problem_limit:
+                problems.append("... further problems not listed")
+        
+        with self.storage_lock:
+            self.flushQueue()
+            self.reloadIfStale()
+            with self.folder_lock.hold():
+                ledger_balances, record_count, ledger_total = self.replayLedger(report, problem_limit, full_replay, worker_count)
+            
+            balance_total = 0
+            for account_record in self.account_index.values():
+                balance_total += account_record.balance
+                ledger_balance = ledger_balances.get(account_record.username, 0)
+                if account_record.balance != ledger_balance:
+                    report(f"Account {account_record.username}: balance {formatCents(account_record.balance)}, ledger deltas {formatCents(ledger_balance)}")
+            for account_username in ledger_balances:
+                if account_username not in self.account_index:
+                    report(f"Ledger entries for {account_username} have no matching account")
+            if balance_total != ledger_total:
+                report(f"Total balance {formatCents(balance_total)} differs from ledger total {formatCents(ledger_total)}")
+        
+        return {
+            'problems': problems,
+            'record_count': record_count,
+            'balance_total': centsToDecimal(balance_total),
+            'ledger_total': centsToDecimal(ledger_total)
+        }
+
+    def rebuildAccounts(self, worker_count=None):
+        # Sets every account balance to what its ledger entries add up to, replaying the whole ledger.
+        # Ledger entries for a username with no account are only reported: the ledger has no password.
+        with self.storage_lock:
+            account_usernames = list(self.account_index)
+        with self.lockAccounts(*account_usernames), self.writeAccess():
+            ledger_balances, record_count, ledger_total = self.replayLedger(lambda problem_text: None, full_replay=True, worker_count=worker_count)
+            changed_accounts = []
+            for account_record in list(self.account_index.values()):
+                ledger_balance = ledger_balances.get(account_record.username, 0)
+                if account_record.balance != ledger_balance:
+                    changed_accounts.append({'username': account_record.username, 'previous_balance': centsToDecimal(account_record.balance), 'balance': centsToDecimal(ledger_balance)})
+                    self.setBalance(account_record.username, ledger_balance)
+            self.flushAccounts()
+            if self.dirty_accounts:
+                raise StorageError("Accounts could not be saved!")
+            self.saveStats()
+            return {
+                'changed_accounts': changed_accounts,
+                'orphaned_users': sorted(account_username for account_username in ledger_balances if account_username not in self.account_index),
+                'record_count': record_count
+            }
+
+    def close(self):
+        self.stopWriter()
+        with self.storage_lock:
+            self.flushAccounts()
+            self.storage.saveSnapshot(self.account_index.values())
+            self.storage.close()
+        self.password_hasher.close()
+
+    def flushAccounts(self):
+        with self.storage_lock:
+            self.flushQueue()
+            if not self.dirty_accounts:
+                return
+            changed_accounts = [self.account_index[account_username] for account_username in self.dirty_accounts]
+            if self.storage.updateAccounts(changed_accounts, self.account_index.values()):
+                self.dirty_accounts.clear()
+
+    def getUser(self, username_to_find):
+        return self.account_index.get(username_to_find)
+
+    def updateBalance(self, username_for_update, updated_balance):
+        account_data = self.account_index.get(username_for_update)
+        if account_data is None:
+            return
+        previous_balance = account_data.balance
+        account_data.balance = updated_balance
+        self.trackBalance(username_for_update, previous_balance, updated_balance)
+        self.dirty_accounts.add(username_for_update)
+
+    def commitChanges(self, transactions_to_append):
+        if self.bank_config['durability'] != 'every-op':
+            return self.queueChanges(transactions_to_append)
+        changed_accounts = [self.account_index[account_username] for account_username in self.dirty_accounts]
+        journal_position = self.storage.commitChanges(changed_accounts, self.account_index.values(), transactions_to_append)
+        if journal_position is None:
+            self.storage.refresh()
+            self.loadAccounts()
+            return False
+        self.dirty_accounts.clear()
+        for transaction_item in transactions_to_append:
+            self.trackTrans(transaction_item)
+        self.committedChanges(journal_position)
+        return True
+
+    def queueChanges(self, transactions_to_append):
+        # Write-behind: the change is already applied in memory and the writer thread commits it with
+        # everything else queued in the same group. The folder lock stays held until then, so other
+        # processes cannot commit on top of balances they have not seen.
+        self.folder_lock.pin()
+        for transaction_item in transactions_to_append:
+            self.trackTrans(transaction_item)
+        with self.commit_condition:
+            if not self.queued_records:
+                self.queue_started = time.monotonic()
+            self.queued_records.extend(transactions_to_append)
+            self.queued_sequence += 1
+            self.commit_condition.notify_all()
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.writerLoop, name='bank-writer', daemon=True)
+            self.writer_thread.start()
+        return True
+
+    def writerLoop(self):
+        group_size = self.bank_config['group_commit_size']
+        group_interval = self.bank_config['group_commit_interval']
+        while True:
+            with self.commit_condition:
+                while not self.queued_records and not self.writer_stopping:
+                    self.commit_condition.wait()
+                if not self.queued_records:
+                    return
+                # A group is committed once it is large enough or its oldest change has waited long enough.
+                while len(self.queued_records) < group_size and not self.writer_stopping:
+                    remaining_seconds = self.queue_started + group_interval - time.monotonic()
+                    if remaining_seconds <= 0:
+                        break
+                    self.commit_condition.wait(remaining_seconds)
+            try:
+                self.flushQueue()
+            except Exception as err:
+                logProblem("Problem committing queued changes: " + str(err))
+
+    def stopWriter(self):
+        with self.commit_condition:
+            self.writer_stopping = True
+            self.commit_condition.notify_all()
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+            self.writer_thread = None
+
+    def flushQueue(self):
+        # Commits everything queued so far in one storage commit. Reads of the journal call this first,
+        # so this process always sees its own changes.
+        if self.queued_sequence == self.committed_sequence:
+            return True
+        with self.storage_lock:
+            with self.commit_condition:
+                queued_records = self.queued_records
+                queued_sequence = self.queued_sequence
+                self.queued_records = []
+            if queued_sequence == self.committed_sequence:
+                return True
+            changed_accounts = [self.account_index[account_username] for account_username in self.dirty_accounts]
+            journal_position = self.storage.commitChanges(changed_accounts, self.account_index.values(), queued_records)
+            if journal_position is None:
+                # Callers have already been told the change was made, so it stays queued and is retried.
+                with self.commit_condition:
+                    self.queued_records[:0] = queued_records
+                    self.failed_sequence = queued_sequence
+                    self.queue_started = time.monotonic()
+                    self.commit_condition.notify_all()
+                return False
+            self.dirty_accounts.clear()
+            with self.commit_condition:
+                self.committed_sequence = queued_sequence
+                self.commit_condition.notify_all()
+            self.committedChanges(journal_position)
+            if not self.queued_records:
+                self.folder_lock.unpin()
+            return True
+
+    def waitForCommit(self, commit_sequence=None):
+        # Returns once every change queued before the call (or up to commit_sequence) is on disk.
+        with self.commit_condition:
+            if commit_sequence is None:
+                commit_sequence = self.queued_sequence
+            while self.committed_sequence < commit_sequence:
+                if self.failed_sequence >= commit_sequence:
+                    raise StorageError("Queued changes could not be saved!")
+                self.commit_condition.wait()
+
+    def syncChanges(self):
+        if not self.flushQueue():
+            raise StorageError("Queued changes could not be saved!")
+
+    def committedChanges(self, journal_position):
+        self.transaction_stats['journal_position'] = journal_position
+        self.saveStats()
+        if self.storage.rotationDue(self.bank_config['segment_size'], self.bank_config['segment_days']):
+            self.rotateJournal()
+        elif self.bank_config['snapshot_interval'] and journal_position - self.snapshot_position >= self.bank_config['snapshot_interval']:
+            self.saveSnapshot()
+
+    def saveSnapshot(self):
+        with self.storage_lock:
+            self.flushAccounts()
+            self.snapshot_position = self.storage.journalPosition()
+            return self.storage.saveSnapshot(self.account_index.values())
+
+    def rotateJournal(self):
+        with self.storage_lock:
+            self.flushAccounts()
+            if self.bank_config['segment_compression'] not in SEGMENT_COMPRESSORS:
+                raise InvalidInputError("Unknown segment compression: " + str(self.bank_config['segment_compression']))
+            if not self.storage.rotateJournal(self.bank_config['segment_compression']):
+                return False
+            self.saveSnapshot()
+            return True
+
+    def appendTrans(self, transactions_to_append):
+        return self.commitChanges(transactions_to_append)
+
+    def newTransRecord(self, trans_user, trans_kind, trans_value, trans_bal, trans_desc=""):
+        return TransactionRecord(trans_user, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), trans_kind, trans_value, trans_bal, trans_desc)
+
+    def saveTrans(self, trans_user, trans_kind, trans_value, trans_bal, trans_desc=""):
+        return self.appendTrans([self.newTransRecord(trans_user, trans_kind, trans_value, trans_bal, trans_desc)])
+
+    def transferRecords(self, sender_username, recipient_username, transfer_amount, transfer_description):
+        sender_new_balance = self.account_index[sender_username].balance - transfer_amount
+        recipient_new_balance = self.account_index[recipient_username].balance + transfer_amount
+        self.setBalance(sender_username, sender_new_balance)
+        self.setBalance(recipient_username, recipient_new_balance)
+        return [
+            self.newTransRecord(
+                sender_username,
+                'TRANSFER_OUT',
+                transfer_amount,
+                sender_new_balance,
+                "Transfer to " + recipient_username + ": " + transfer_description
+            ),
+            self.newTransRecord(
+                recipient_username,
+                'TRANSFER_IN',
+                transfer_amount,
+                recipient_new_balance,
+                "Transfer from " + sender_username + ": " + transfer_description
+            )
+        ]
+
+    def countUserTrans(self, target_username):
+        with self.storage_lock:
+            self.flushQueue()
+            self.reloadIfStale()
+            return self.storage.countUserTrans(target_username)
+
+    def userTrans(self, target_username, record_limit=None, skip_newest=0):
+        with self.storage_lock:
+            self.flushQueue()
+            self.reloadIfStale()
+            return list(self.storage.userTrans(target_username, record_limit, skip_newest))
+
+    def validateAmount(self, operation_amount):
+        try:
+            amount_cents = toCents(operation_amount)
+        except ValueError:
+            raise InvalidAmountError("Invalid amount!")
+        if not -MAXIMUM_CENTS <= amount_cents <= MAXIMUM_CENTS:
+            raise InvalidAmountError("Amount is too large!")
+        return amount_cents
+
+    def requireAccount(self, account_username):
+        account_record = self.account_index.get(account_username)
+        if account_record is None:
+            raise AccountNotFoundError("Account not found!")
+        return account_record
+
+    def validateDescription(self, description_text):
+        # Each journal record is one line of transactions.csv, so a line break in its text would end it early.
+        if '\r' in str(description_text) or '\n' in str(description_text):
+            raise InvalidInputError("Description cannot contain line breaks!")
+
+    def validateDeposit(self, account_username, deposit_value, deposit_description=""):
+        self.validateDescription(deposit_description)
+        self.requireAccount(account_username)
+        deposit_cents = self.validateAmount(deposit_value)
+        if deposit_cents <= 0:
+            raise InvalidAmountError("Deposit amount must be positive!")
+        if self.account_index[account_username].balance + deposit_cents > MAXIMUM_CENTS:
+            raise InvalidAmountError("Balance would exceed the account limit!")
+        return deposit_cents
+
+    def validateWithdraw(self, account_username, withdrawal_value, withdrawal_description=""):
+        self.validateDescription(withdrawal_description)
+        account_record = self.requireAccount(account_username)
+        withdrawal_cents = self.validateAmount(withdrawal_value)
+        if withdrawal_cents <= 0:
+            raise InvalidAmountError("Withdrawal amount must be positive!")
+        if withdrawal_cents > account_record.balance:
+            raise InsufficientFundsError("Insufficient funds!")
+        return withdrawal_cents
+
+    def validateTransfer(self, sender_username, recipient_username, transfer_amount, transfer_description=""):
+        self.validateDescription(transfer_description)
+        sender_record = self.requireAccount(sender_username)
+        transfer_cents = self.validateAmount(transfer_amount)
+        if transfer_cents <= 0:
+            raise InvalidAmountError("Transfer amount must be positive!")
+        if transfer_cents > sender_record.balance:
+            raise InsufficientFundsError("Insufficient funds!")
+        if recipient_username == sender_username:
+            raise SelfTransferError("Cannot transfer to your own account!")
+        if recipient_username not in self.account_index:
+            raise AccountNotFoundError("Recipient account not found!")
+        if self.account_index[recipient_username].balance + transfer_cents > MAXIMUM_CENTS:
+            raise InvalidAmountError("Balance would exceed the recipient's account limit!")
+        return transfer_cents
+
+    def createAccount(self, chosen_username, password_input, initial_deposit_amount=0):
+        if not chosen_username:
+            raise InvalidInputError("Username cannot be empty!")
+        if '\r' in chosen_username or '\n' in chosen_username:
+            raise InvalidInputError("Username cannot contain line breaks!")
+        with self.lockAccounts(chosen_username):
+            if self.checkUser(chosen_username):
+                raise AccountExistsError("Username already exists!")
+            if not password_input:
+                raise InvalidInputError("Password cannot be empty!")
+            initial_deposit_cents = self.validateAmount(initial_deposit_amount)
+            if initial_deposit_cents < 0:
+                raise InvalidAmountError("Initial deposit cannot be negative!")
+            
+            stored_password = self.hidePass(password_input)
+            with self.writeAccess() as data_reloaded:
+                if data_reloaded and self.checkUser(chosen_username):
+                    raise AccountExistsError("Username already exists!")
+                self.account_index[chosen_username] = AccountRecord(chosen_username, stored_password, initial_deposit_cents)
+                if self.search_index is not None:
+                    self.search_index.add(chosen_username)
+                self.dirty_accounts.add(chosen_username)
+                self.trackBalance(chosen_username, None, initial_deposit_cents)
+                
+                creation_record = self.newTransRecord(chosen_username, 'ACCOUNT_CREATION', initial_deposit_cents, initial_deposit_cents, 'Initial deposit')
+                if not self.commitChanges([creation_record]):
+                    raise StorageError("Account could not be saved!")
+        return TransactionResult(creation_record)
+
+    def authenticate(self, input_username, input_password):
+        if self.checkPassword(input_username, input_password):
+            return publicAccount(self.getUser(input_username))
+        raise AuthenticationError("Invalid username or password!")
+
+    def changePassword(self, account_username, current_password, new_password):
+        with self.lockAccounts(account_username):
+            self.requireAccount(account_username)
+            if not self.checkPassword(account_username, current_password):
+                raise AuthenticationError("Incorrect current password!")
+            if not new_password:
+                raise InvalidInputError("Password cannot be empty!")
+            new_stored_password = self.hidePass(new_password)
+            with self.writeAccess() as data_reloaded:
+                if data_reloaded and not self.checkPassword(account_username, current_password):
+                    raise AuthenticationError("Incorrect current password!")
+                account_record = self.requireAccount(account_username)
+                account_record.password = new_stored_password
+                self.dirty_accounts.add(account_username)
+                self.flushAccounts()
+
+    def balance(self, account_username):
+        self.reloadIfStale()
+        return centsToDecimal(self.requireAccount(account_username).balance)
+
+    def deposit(self, account_username, deposit_value, deposit_description=""):
+        with self.lockAccounts(account_username):
+            deposit_cents = self.validateDeposit(account_username, deposit_value, deposit_description)
+            with self.writeAccess() as data_reloaded:
+                if data_reloaded:
+                    self.validateDeposit(account_username, deposit_value)
+                updated_balance_value = self.account_index[account_username].balance + deposit_cents
+                self.setBalance(account_username, updated_balance_value)
+                deposit_record = self.newTransRecord(account_username, 'DEPOSIT', deposit_cents, updated_balance_value, deposit_description or 'Cash deposit')
+                if not self.commitChanges([deposit_record]):
+                    raise StorageError("Deposit could not be saved!")
+        return TransactionResult(deposit_record)
+
+    def withdraw(self, account_username, withdrawal_value, withdrawal_description=""):
+        with self.lockAccounts(account_username):
+            withdrawal_cents = self.validateWithdraw(account_username, withdrawal_value, withdrawal_description)
+            with self.writeAccess() as data_reloaded:
+                if data_reloaded:
+                    self.validateWithdraw(account_username, withdrawal_value)
+                new_balance_after_withdrawal = self.account_index[account_username].balance - withdrawal_cents
+                self.setBalance(account_username, new_balance_after_withdrawal)
+                withdrawal_record = self.newTransRecord(account_username, 'WITHDRAWAL', withdrawal_cents, new_balance_after_withdrawal, withdrawal_description or 'Cash withdrawal')
+                if not self.commitChanges([withdrawal_record]):
+                    raise StorageError("Withdrawal could not be saved!")
+        return TransactionResult(withdrawal_record)
+
+    def transfer(self, sender_username, recipient_username, transfer_amount, transfer_description=""):
+        with self.lockAccounts(sender_username, recipient_username):
+            transfer_cents = self.validateTransfer(sender_username, recipient_username, transfer_amount, transfer_description)
+            with self.writeAccess() as data_reloaded:
+                if data_reloaded:
+                    self.validateTransfer(sender_username, recipient_username, transfer_amount)
+                transfer_records = self.transferRecords(sender_username, recipient_username, transfer_cents, transfer_description)
+                if not self.commitChanges(transfer_records):
+                    raise StorageError("Transfer could not be saved!")
+        return TransactionResult(transfer_records[0])
+
+    def history(self, account_username, record_limit=None, skip_newest=0):
+        return [publicRecord(transaction_record) for transaction_record in self.userTrans(account_username, record_limit, skip_newest)]
+
+    def recentTransactions(self, record_count=20):
+        return [publicRecord(transaction_record) for transaction_record in self.tailTrans(record_count)]
+
+    def transactionsBetween(self, start_position, end_position):
+        return [publicRecord(transaction_record) for transaction_record in self.readTransFrom(start_position, end_position)]
+
+    def listAccounts(self):
+        with self.storage_lock:
+            self.reloadIfStale()
+            return [publicAccount(account_record) for account_record in self.account_index.values()]
+
+    def searchAccounts(self, search_term, result_limit=None, skip_count=0):
+        with self.storage_lock:
+            self.reloadIfStale()
+            if self.search_index is None:
+                # Built on the first search rather than at startup, then kept up to date as accounts are created.
+                self.search_index = AccountSearchIndex(self.account_index)
+            matching_usernames = self.search_index.search(search_term, result_limit, skip_count)
+            return [publicAccount(self.account_index[account_username]) for account_username in matching_usernames if account_username in self.account_index]
+
+    def findTransactions(self, start_date=None, end_date=None, transaction_types=None, account_username=None,
+                         minimum_amount=None, maximum_amount=None, result_limit=None, skip_count=0):
+        start_day = reportDate(start_date)
+        end_day = reportDate(end_date)
+        type_names = None
+        if transaction_types:
+            type_names = {str(transaction_type).strip().upper() for transaction_type in transaction_types}
+            unknown_types = type_names - set(LEDGER_SIGNS)
+            if unknown_types:
+                raise InvalidInputError("Unknown transaction type: " + ", ".join(sorted(unknown_types)))
+        minimum_cents = None if minimum_amount in (None, '') else self.validateAmount(minimum_amount)
+        maximum_cents = None if maximum_amount in (None, '') else self.validateAmount(maximum_amount)
+        with self.storage_lock:
+            self.flushQueue()
+            self.reloadIfStale()
+            if account_username is not None:
+                self.requireAccount(account_username)
+            matching_records = self.storage.queryTrans(start_day, end_day, type_names, account_username, minimum_cents, maximum_cents)
+            return [publicRecord(transaction_record) for transaction_record in islice(matching_records, skip_count, None if result_limit is None else skip_count + result_limit)]
+
+    def statistics(self):
+        with self.storage_lock:
+            self.reloadIfStale()
+            lowest_balance, highest_balance = self.balanceExtremes()
+            total_accounts_count = self.account_stats['account_count']
+            balance_total = centsToDecimal(self.account_stats['balance_total'])
+            return {
+                'account_count': total_accounts_count,
+                'balance_total': balance_total,
+                'average_balance': (balance_total / total_accounts_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if total_accounts_count else Decimal('0.00'),
+                'lowest_balance': None if lowest_balance is None else centsToDecimal(lowest_balance),
+                'highest_balance': None if highest_balance is None else centsToDecimal(highest_balance),
+                'transaction_count': self.transaction_stats['transaction_count'],
+                'type_counts': dict(self.transaction_stats['type_counts']),
+                'type_volumes': {transaction_type: centsToDecimal(type_volume) for transaction_type, type_volume in self.transaction_stats['type_volumes'].items()}
+            }
+
+    @contextlib.contextmanager
+    def reportStorage(self):
+        # Reports stream from their own reader (own file handle or SQLite connection), so a long
+        # export does not hold storage_lock and block deposits and transfers while it runs.
+        report_storage = self.createStorage(self.bank_config['storage_backend'])
+        report_storage.openReader()
+        try:
+            yield report_storage
+        finally:
+            report_storage.close()
+
+    def reportRecords(self, report_name, account_username=None, start_date=None, end_date=None, top_count=10):
+        start_date = reportDate(start_date)
+        end_date = reportDate(end_date)
+        self.flushQueue()
+        if report_name == 'statement':
+            with self.storage_lock:
+                self.reloadIfStale()
+                self.requireAccount(account_username)
+            return self.statementReport(account_username, start_date, end_date)
+        if report_name == 'transactions':
+            return self.ledgerReport(start_date, end_date)
+        if report_name == 'daily':
+            return self.dailyVolumeReport(start_date, end_date)
+        if report_name == 'top':
+            try:
+                top_count = int(top_count)
+            except (TypeError, ValueError):
+                raise InvalidInputError("Top count must be a whole number!")
+            return self.topAccountsReport(top_count)
+        if report_name == 'accounts':
+            return self.accountsReport()
+        raise InvalidInputError("Unknown report: " + str(report_name))
+
+    def statementReport(self, account_username, start_date, end_date, chunk_size=1000):
+        record_count = self.countUserTrans(account_username)
+        for chunk_start in range(0, record_count, chunk_size):
+            chunk_length = min(chunk_size, record_count - chunk_start)
+            with self.storage_lock:
+                # Counting from the newest record again keeps the window in place if records were appended meanwhile.
+                chunk_records = self.userTrans(account_username, chunk_length, self.countUserTrans(account_username) - chunk_start - chunk_length)
+            for transaction_record in chunk_records:
+                if dateInRange(transaction_record.date, start_date, end_date):
+                    yield publicRecord(transaction_record)
+
+    def ledgerReport(self, start_date, end_date):
+        journal_end = self.journalPosition()
+        with self.reportStorage() as report_storage:
+            for transaction_record in report_storage.readTransFrom(0, journal_end):
+                if dateInRange(transaction_record.date, start_date, end_date):
+                    yield publicRecord(transaction_record)
+
+    def dailyVolumeReport(self, start_date, end_date):
+        journal_end = self.journalPosition()
+        daily_totals = {}
+        with self.reportStorage() as report_storage:
+            for transaction_record in report_storage.readTransFrom(0, journal_end):
+                if dateInRange(transaction_record.date, start_date, end_date):
+                    total_key = (transaction_record.date[:10], transaction_record.type)
+                    day_total = daily_totals.get(total_key)
+                    if day_total is None:
+                        day_total = daily_totals[total_key] = [0, 0]
+                    day_total[0] += 1
+                    day_total[1] += transaction_record.amount
+        for total_key in sorted(daily_totals):
+            yield {'date': total_key[0], 'type': total_key[1], 'count': daily_totals[total_key][0], 'volume': centsToDecimal(daily_totals[total_key][1])}
+
+    def topAccountsReport(self, top_count):
+        with self.storage_lock:
+            self.reloadIfStale()
+            top_accounts = heapq.nlargest(max(0, top_count), self.account_index.values(), key=lambda account_record: account_record.balance)
+        for account_rank, account_record in enumerate(top_accounts, start=1):
+            yield {'rank': account_rank, 'username': account_record.username, 'balance': centsToDecimal(account_record.balance)}
+
+    def accountsReport(self):
+        with self.storage_lock:
+            self.reloadIfStale()
+            account_usernames = list(self.account_index)
+        for account_username in account_usernames:
+            account_record = self.account_index.get(account_username)
+            if account_record is not None:
+                yield publicAccount(account_record)
+
+    def exportReport(self, report_name, output_target, output_format='csv', shard_count=1, worker_count=None, **report_options):
+        if shard_count <= 1:
+            report_rows = self.reportRecords(report_name, **report_options)
+            return [(output_target, writeReportRows(report_rows, output_target, output_format, REPORT_COLUMNS[report_name]))]
+        if report_name != 'transactions':
+            raise InvalidInputError("Only the transactions report can be split into shards!")
+        if not isinstance(output_target, str):
+            raise InvalidInputError("A sharded export needs an output file!")
+        if output_format not in REPORT_FORMATS:
+            raise InvalidInputError("Unknown report format: " + str(output_format))
+        start_date = reportDate(report_options.get('start_date'))
+        end_date = reportDate(report_options.get('end_date'))
+        journal_end = self.journalPosition()
+        with ProcessPoolExecutor(max_workers=worker_count or min(shard_count, os.cpu_count() or 1)) as export_pool:
+            pending_shards = [
+                (shardPath(output_target, shard_number), export_pool.submit(
+                    exportLedgerShard, self.bank_folder, self.storage.backend_name, journal_end, shard_number, shard_count,
+                    start_date, end_date, shardPath(output_target, shard_number), output_format
+                ))
+                for shard_number in range(shard_count)
+            ]
+            return [(shard_path, pending_shard.result()) for shard_path, pending_shard in pending_shards]
+
+    def readBatch(self, batch_file_path):
+        with open(batch_file_path, 'r', newline='') as file_handle:
+            if batch_file_path.lower().endswith(('.jsonl', '.json')):
+                for line_number, raw_line in enumerate(file_handle, start=1):
+                    if not raw_line.strip():
+                        continue
+                    try:
+                        yield line_number, json.loads(raw_line)
+                    except ValueError:
+                        yield line_number, None
+            else:
+                csv_reader = csv.DictReader(file_handle)
+                for row_data in csv_reader:
+                    yield csv_reader.line_num, row_data
+
+    def applyBatchRow(self, batch_row, pending_records):
+        operation_name = str(batch_row.get('operation') or '').strip().lower()
+        account_username = str(batch_row.get('username') or '').strip()
+        description_text = str(batch_row.get('description') or '').strip()
+        operation_amount = batch_row.get('amount')
+        
+        if operation_name == 'deposit':
+            operation_cents = self.validateDeposit(account_username, operation_amount, description_text)
+            updated_balance_value = self.account_index[account_username].balance + operation_cents
+            self.setBalance(account_username, updated_balance_value)
+            pending_records.append(self.newTransRecord(account_username, 'DEPOSIT', operation_cents, updated_balance_value, description_text or 'Cash deposit'))
+        elif operation_name in ('withdraw', 'withdrawal'):
+            operation_cents = self.validateWithdraw(account_username, operation_amount, description_text)
+            updated_balance_value = self.account_index[account_username].balance - operation_cents
+            self.setBalance(account_username, updated_balance_value)
+            pending_records.append(self.newTransRecord(account_username, 'WITHDRAWAL', operation_cents, updated_balance_value, description_text or 'Cash withdrawal'))
+        elif operation_name == 'transfer':
+            recipient_username = str(batch_row.get('recipient') or '').strip()
+            operation_cents = self.validateTransfer(account_username, recipient_username, operation_amount, description_text)
+            pending_records.extend(self.transferRecords(account_username, recipient_username, operation_cents, description_text))
+        else:
+            raise InvalidInputError("Unknown operation!")
+
+    def processBatch(self, batch_file_path):
+        batch_rows = list(self.readBatch(batch_file_path))
+        batch_usernames = set()
+        for line_number, batch_row in batch_rows:
+            if isinstance(batch_row, dict):
+                batch_usernames.add(str(batch_row.get('username') or '').strip())
+                batch_usernames.add(str(batch_row.get('recipient') or '').strip())
+        batch_usernames.discard('')
+        with self.lockAccounts(*batch_usernames), self.writeAccess():
+            return self.applyBatch(batch_rows)
+
+    def applyBatch(self, batch_rows):
+        batch_results = []
+        pending_records = []
+        for line_number, batch_row in batch_rows:
+            row_problem = None
+            if not isinstance(batch_row, dict):
+                row_problem = "Malformed row!"
+                batch_row = {}
+            else:
+                try:
+                    self.applyBatchRow(batch_row, pending_records)
+                except BankError as err:
+                    row_problem = str(err)
+            batch_results.append({
+                'line': line_number,
+                'operation': batch_row.get('operation', ''),
+                'username': batch_row.get('username', ''),
+                'amount': batch_row.get('amount', ''),
+                'recipient': batch_row.get('recipient', ''),
+                'status': 'REJECTED' if row_problem else 'ACCEPTED',
+                'reason': row_problem or ''
+            })
+        
+        if pending_records and not self.commitChanges(pending_records):
+            for result_item in batch_results:
+                if result_item['status'] == 'ACCEPTED':
+                    result_item['status'] = 'FAILED'
+                    result_item['reason'] = "Batch could not be saved!"
+        return batch_results
+
+
 class BankingSystem:
-    def __init__(self):
-        self.bank_folder = 'bank_data'
-        self.users_file_path = os.path.join(self.bank_folder, 'users.csv')
-        self.transactions_file_path = os.path.join(self.bank_folder, 'transactions.csv')
-        self.current_active_user = None
-        self.setupFiles()
+    def __init__(self, headless=None, bank_service=None):
+        self.headless = headlessDefault() if headless is None else headless
+        self.bank = bank_service or BankService()
+        self.bank.metrics.addTarget(self, ('processing',), 'ui.')
+        self.active_username = None
+
+    @property
+    def current_active_user(self):
+        if self.active_username is None:
+            return None
+        return self.bank.getUser(self.active_username)
 
     def logo(self):
+        if self.headless:
+            return
         print(r"""
 ╔════════════════════════════════════════════════════════════════════════╗
     /$$$$$$  /$$$$$$$   /$$$$$$        /$$$$$$$   /$$$$$$  /$$   /$$ /$$   /$$
@@ -29,29 +3783,40 @@ class BankingSystem:
         """)
 
     def sectionHeader(self, title_text):
+        if self.headless:
+            return
         print(f"\n┌{'─' * 58}┐")
         print(f"│ {title_text:^56} │")
         print(f"└{'─' * 58}┘")
 
     def successMsg(self, message_text):
+        if self.headless:
+            return
         print(f"\n┌{'─' * 58}┐")
         print(f"│ {'✅ SUCCESS':^56}│")
         print(f"│ {message_text:^56} │")
         print(f"└{'─' * 58}┘")
 
     def errorMsg(self, error_text):
+        if self.headless:
+            logProblem(error_text)
+            return
         print(f"\n┌{'─' * 58}┐")
         print(f"│ {'❌ ERROR':^56}│")
         print(f"│ {error_text:^56} │")
         print(f"└{'─' * 58}┘")
 
     def infoMsg(self, info_text):
+        if self.headless:
+            return
         print(f"\n┌{'─' * 58}┐")
         print(f"│ {'ℹ️  INFORMATION':^56}  │")
         print(f"│ {info_text:^56} │")
         print(f"└{'─' * 58}┘")
 
     def receipt(self, transaction_type, transaction_amount, account_balance, transaction_details=""):
+        if self.headless:
+            return
         current_time = datetime.now()
         formatted_time = current_time.strftime("%Y-%m-%d %H:%M")
         print(f"""
@@ -67,6 +3832,8 @@ class BankingSystem:
         """)
 
     def balanceShow(self, username_display, balance_amount):
+        if self.headless:
+            return
         current_time_display = datetime.now().strftime("%Y-%m-%d %H:%M")
         print(f"""
 ┌──────────────────────────────────────────────────────────┐
@@ -79,160 +3846,40 @@ class BankingSystem:
         """)
 
     def processing(self, process_message="Processing"):
+        if self.headless:
+            return
         print(f"\n⏳ {process_message}", end="", flush=True)
         for _ in range(3):
             time.sleep(0.3)
             print("▪", end="", flush=True)
         print(" ✅")
 
-    def checkUser(self, username_to_check):
-        account_list = self.getAccounts()
-        for account_record in account_list:
-            if account_record['username'] == username_to_check:
-                return True
-        return False
-
-    def getBal(self, username_for_balance):
-        user_record = self.getUser(username_for_balance)
-        if user_record:
-            return user_record['balance']
-        else:
-            return 0.0
-
-    def setBalance(self, user_to_update, new_balance_value):
-        self.updateBalance(user_to_update, new_balance_value)
-
-    def addTrans(self, trans_username, trans_type, trans_amount, trans_balance, trans_description=""):
-        self.saveTrans(trans_username, trans_type, trans_amount, trans_balance, trans_description)
-
-    def hidePass(self, plain_password):
-        encoded_bytes = base64.b64encode(plain_password.encode())
-        encoded_string = encoded_bytes.decode()
-        return encoded_string
-
-    def revealPass(self, encoded_password):
-        try:
-            decoded_bytes = base64.b64decode(encoded_password.encode())
-            decoded_string = decoded_bytes.decode()
-            return decoded_string
-        except Exception as e:
-            return None
-
-    def setupFiles(self):
-        if not os.path.isdir(self.bank_folder):
-            os.mkdir(self.bank_folder)
-
-        if not os.path.isfile(self.users_file_path):
-            with open(self.users_file_path, 'w', newline='') as file_handle:
-                csv_writer = csv.writer(file_handle)
-                csv_writer.writerow(['username', 'password', 'balance'])
-
-        if not os.path.isfile(self.transactions_file_path):
-            with open(self.transactions_file_path, 'w', newline='') as file_handle:
-                csv_writer = csv.writer(file_handle)
-                csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
-
-    def getAccounts(self):
-        accounts_collection = []
-        try:
-            if os.path.isfile(self.users_file_path):
-                with open(self.users_file_path, 'r') as file_handle:
-                    csv_reader = csv.DictReader(file_handle)
-                    for row_data in csv_reader:
-                        if 'username' in row_data and 'password' in row_data and 'balance' in row_data:
-                            try:
-                                row_data['balance'] = float(row_data['balance'])
-                                accounts_collection.append(row_data)
-                            except ValueError:
-                                continue
-        except Exception as err:
-            print("Problem reading account data: " + str(err))
-        return accounts_collection
 
-    def getTrans(self):
-        transactions_list = []
+    def runBatch(self, batch_file_path, results_file_path=None):
         try:
-            if os.path.isfile(self.transactions_file_path):
-                with open(self.transactions_file_path, 'r') as file_handle:
-                    csv_reader = csv.DictReader(file_handle)
-                    for row_data in csv_reader:
-                        required_fields = ['username', 'date', 'type', 'amount', 'balance', 'details']
-                        if all(field in row_data for field in required_fields):
-                            try:
-                                row_data['amount'] = float(row_data['amount'])
-                                row_data['balance'] = float(row_data['balance'])
-                                transactions_list.append(row_data)
-                            except ValueError:
-                                continue
-        except Exception as err:
-            print("Problem reading transaction data: " + str(err))
-        return transactions_list
-
-    def storeAccounts(self, accounts_to_save):
+            batch_results = self.bank.processBatch(batch_file_path)
+        except OSError as err:
+            logProblem("Problem reading batch file: " + str(err))
+            return False
         try:
-            with open(self.users_file_path, 'w', newline='') as file_handle:
-                csv_writer = csv.writer(file_handle)
-                csv_writer.writerow(['username', 'password', 'balance'])
-                for account_item in accounts_to_save:
-                    csv_writer.writerow([account_item['username'], account_item['password'], account_item['balance']])
-        except Exception as err:
-            print("Problem saving account data: " + str(err))
-
-    def storeTrans(self, transactions_to_save):
+            self.bank.syncChanges()
+        except StorageError as err:
+            logProblem("Problem saving batch: " + str(err))
+            return False
+        
+        results_file_path = results_file_path or os.path.splitext(batch_file_path)[0] + '.results.csv'
         try:
-            with open(self.transactions_file_path, 'w', newline='') as file_handle:
-                csv_writer = csv.writer(file_handle)
-                csv_writer.writerow(['username', 'date', 'type', 'amount', 'balance', 'details'])
-                for transaction_item in transactions_to_save:
-                    csv_writer.writerow([
-                        transaction_item['username'],
-                        transaction_item['date'],
-                        transaction_item['type'],
-                        transaction_item['amount'],
-                        transaction_item['balance'],
-                        transaction_item['details']
-                    ])
-        except Exception as err:
-            print("Problem saving transaction data: " + str(err))
-
-    def getUser(self, username_to_find):
-        account_records = self.getAccounts()
-        for account_data in account_records:
-            if account_data['username'] == username_to_find:
-                return account_data
-        return None
-
-    def updateBalance(self, username_for_update, updated_balance):
-        account_records = self.getAccounts()
-        for account_data in account_records:
-            if account_data['username'] == username_for_update:
-                account_data['balance'] = updated_balance
-        self.storeAccounts(account_records)
-        if self.current_active_user and self.current_active_user['username'] == username_for_update:
-            self.current_active_user['balance'] = updated_balance
-
-    def saveTrans(self, trans_user, trans_kind, trans_value, trans_bal, trans_desc=""):
-        transaction_records = self.getTrans()
-        
-        new_transaction_record = {
-            'username': trans_user,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'type': trans_kind,
-            'amount': trans_value,
-            'balance': trans_bal,
-            'details': trans_desc
-        }
+            with open(results_file_path, 'w', newline='') as file_handle:
+                csv_writer = csv.DictWriter(file_handle, fieldnames=['line', 'operation', 'username', 'amount', 'recipient', 'status', 'reason'])
+                csv_writer.writeheader()
+                csv_writer.writerows(batch_results)
+        except OSError as err:
+            logProblem("Problem saving batch results: " + str(err))
         
-        transaction_records.append(new_transaction_record)
-        self.storeTrans(transaction_records)
-
-    def userTrans(self, target_username):
-        all_transactions = self.getTrans()
-        user_transactions = []
-        for transaction_item in all_transactions:
-            if transaction_item['username'] == target_username:
-                user_transactions.append(transaction_item)
-        return user_transactions
+        accepted_count = sum(1 for result_item in batch_results if result_item['status'] == 'ACCEPTED')
+        print(f"Batch processed: {len(batch_results)} rows, {accepted_count} accepted, {len(batch_results) - accepted_count} rejected")
+        print("Results written to " + results_file_path)
+        return accepted_count == len(batch_results)
 
     def newAccount(self):
         self.sectionHeader("CREATE NEW ACCOUNT")
@@ -247,7 +3894,7 @@ class BankingSystem:
             self.errorMsg("Username cannot be empty!")
             return
         
-        if self.checkUser(chosen_username):
+        if self.bank.checkUser(chosen_username):
             self.errorMsg("Username already exists!")
             return
         
@@ -266,36 +3913,22 @@ class BankingSystem:
             account_type_selection = 'Savings'
         
         try:
-            initial_deposit_amount = float(input(" Initial deposit amount: $"))
-            if initial_deposit_amount < 0:
-                self.errorMsg("Initial deposit cannot be negative!")
-                return
-        except ValueError:
-            self.errorMsg("Invalid amount!")
+            initial_deposit_amount = input(" Initial deposit amount: $").strip()
+            creation_result = self.bank.createAccount(chosen_username, password_input, initial_deposit_amount)
+        except BankError as err:
+            self.errorMsg(str(err))
             return
         
-        encrypted_password = self.hidePass(password_input)
-        
-        new_account_data = {
-            'username': chosen_username,
-            'password': encrypted_password,
-            'balance': initial_deposit_amount
-        }
-        
-        existing_accounts = self.getAccounts()
-        existing_accounts.append(new_account_data)
-        self.storeAccounts(existing_accounts)
-        
-        self.addTrans(chosen_username, 'ACCOUNT_CREATION', initial_deposit_amount, initial_deposit_amount, 'Initial deposit')
-        
         self.successMsg("Account created successfully!")
+        if self.headless:
+            return
         print(f"┌{'─' * 58}┐")
         print(f"│ {'Account Details':^56} │")
         print(f"├{'─' * 58}┤")
         print(f" Username: {chosen_username:<45} ")
         print(f" Full Name: {full_name_input:<44} ")
         print(f" Account Type: {account_type_selection:<41} ")
-        print(f" Initial Balance: ${initial_deposit_amount:>36.2f} ")
+        print(f" Initial Balance: ${creation_result.balance:>36.2f} ")
         print(f"└{'─' * 58}┘")
 
     def doLogin(self):
@@ -304,29 +3937,28 @@ class BankingSystem:
         input_username = input(" Username: ").strip()
         input_password = getpass.getpass(" Password: ")
         
-        user_data = self.getUser(input_username)
-        if user_data:
-            stored_password_decoded = self.revealPass(user_data['password'])
-            if stored_password_decoded and stored_password_decoded == input_password:
-                self.current_active_user = user_data
-                self.processing("Authenticating")
-                self.successMsg("Welcome back, " + input_username + "!")
-                return True
+        try:
+            self.bank.authenticate(input_username, input_password)
+        except BankError as err:
+            self.errorMsg(str(err))
+            return False
         
-        self.errorMsg("Invalid username or password!")
-        return False
+        self.active_username = input_username
+        self.processing("Authenticating")
+        self.successMsg("Welcome back, " + input_username + "!")
+        return True
 
     def doLogout(self):
         if self.current_active_user:
-            self.infoMsg("Goodbye, " + self.current_active_user['username'] + "!")
-            self.current_active_user = None
+            self.infoMsg("Goodbye, " + self.current_active_user.username + "!")
+            self.active_username = None
 
     def viewBalance(self):
         if not self.current_active_user:
             self.errorMsg("Please login first!")
             return
         
-        self.balanceShow(self.current_active_user['username'], self.current_active_user['balance'])
+        self.balanceShow(self.active_username, self.bank.balance(self.active_username))
 
     def doDeposit(self):
         if not self.current_active_user:
@@ -336,29 +3968,18 @@ class BankingSystem:
         self.sectionHeader("DEPOSIT FUNDS")
         
         try:
-            deposit_value = float(input(" Enter deposit amount: $"))
-            if deposit_value <= 0:
-                self.errorMsg("Deposit amount must be positive!")
-                return
+            deposit_value = input(" Enter deposit amount: $").strip()
+            self.bank.validateDeposit(self.active_username, deposit_value)
             
             deposit_description = input(" Enter description (optional): ").strip()
             
             self.processing("Processing deposit")
-            updated_balance_value = self.current_active_user['balance'] + deposit_value
-            self.setBalance(self.current_active_user['username'], updated_balance_value)
-            
-            self.addTrans(
-                self.current_active_user['username'],
-                'DEPOSIT',
-                deposit_value,
-                updated_balance_value,
-                deposit_description or 'Cash deposit'
-            )
+            deposit_result = self.bank.deposit(self.active_username, deposit_value, deposit_description)
             
-            self.receipt('DEPOSIT', deposit_value, updated_balance_value, deposit_description or 'Cash deposit')
+            self.receipt(deposit_result.type, deposit_result.amount, deposit_result.balance, deposit_result.details)
             
-        except ValueError:
-            self.errorMsg("Invalid amount!")
+        except BankError as err:
+            self.errorMsg(str(err))
 
     def doWithdraw(self):
         if not self.current_active_user:
@@ -368,33 +3989,18 @@ class BankingSystem:
         self.sectionHeader("WITHDRAW FUNDS")
         
         try:
-            withdrawal_value = float(input(" Enter withdrawal amount: $"))
-            if withdrawal_value <= 0:
-                self.errorMsg("Withdrawal amount must be positive!")
-                return
-            
-            if withdrawal_value > self.current_active_user['balance']:
-                self.errorMsg("Insufficient funds!")
-                return
+            withdrawal_value = input(" Enter withdrawal amount: $").strip()
+            self.bank.validateWithdraw(self.active_username, withdrawal_value)
             
             withdrawal_description = input(" Enter description (optional): ").strip()
             
             self.processing("Processing withdrawal")
-            new_balance_after_withdrawal = self.current_active_user['balance'] - withdrawal_value
-            self.setBalance(self.current_active_user['username'], new_balance_after_withdrawal)
-            
-            self.addTrans(
-                self.current_active_user['username'],
-                'WITHDRAWAL',
-                withdrawal_value,
-                new_balance_after_withdrawal,
-                withdrawal_description or 'Cash withdrawal'
-            )
+            withdrawal_result = self.bank.withdraw(self.active_username, withdrawal_value, withdrawal_description)
             
-            self.receipt('WITHDRAWAL', withdrawal_value, new_balance_after_withdrawal, withdrawal_description or 'Cash withdrawal')
+            self.receipt(withdrawal_result.type, withdrawal_result.amount, withdrawal_result.balance, withdrawal_result.details)
             
-        except ValueError:
-            self.errorMsg("Invalid amount!")
+        except BankError as err:
+            self.errorMsg(str(err))
 
     def doTransfer(self):
         if not self.current_active_user:
@@ -405,89 +4011,67 @@ class BankingSystem:
         
         try:
             recipient_username = input(" Enter recipient username: ").strip()
-            transfer_amount = float(input(" Enter transfer amount: $"))
-            
-            if transfer_amount <= 0:
-                self.errorMsg("Transfer amount must be positive!")
-                return
-            
-            if transfer_amount > self.current_active_user['balance']:
-                self.errorMsg("Insufficient funds!")
-                return
-            
-            if recipient_username == self.current_active_user['username']:
-                self.errorMsg("Cannot transfer to your own account!")
-                return
+            transfer_amount = input(" Enter transfer amount: $").strip()
             
-            recipient_user_data = self.getUser(recipient_username)
-            if not recipient_user_data:
-                self.errorMsg("Recipient account not found!")
-                return
+            self.bank.validateTransfer(self.active_username, recipient_username, transfer_amount)
             
             transfer_description = input(" Enter transfer description: ").strip()
             
             self.processing("Processing transfer")
-            sender_new_balance = self.current_active_user['balance'] - transfer_amount
-            self.setBalance(self.current_active_user['username'], sender_new_balance)
-            
-            recipient_new_balance = recipient_user_data['balance'] + transfer_amount
-            self.setBalance(recipient_username, recipient_new_balance)
-            
-            self.addTrans(
-                self.current_active_user['username'],
-                'TRANSFER_OUT',
-                transfer_amount,
-                sender_new_balance,
-                "Transfer to " + recipient_username + ": " + transfer_description
-            )
+            transfer_result = self.bank.transfer(self.active_username, recipient_username, transfer_amount, transfer_description)
             
-            self.addTrans(
-                recipient_username,
-                'TRANSFER_IN',
-                transfer_amount,
-                recipient_new_balance,
-                "Transfer from " + self.current_active_user['username'] + ": " + transfer_description
-            )
-            
-            self.receipt('TRANSFER_OUT', transfer_amount, sender_new_balance, "To: " + recipient_username)
+            self.receipt(transfer_result.type, transfer_result.amount, transfer_result.balance, "To: " + recipient_username)
             self.successMsg("Transfer completed to " + recipient_username)
             
-        except ValueError:
-            self.errorMsg("Invalid amount!")
+        except BankError as err:
+            self.errorMsg(str(err))
 
     def viewHistory(self):
         if not self.current_active_user:
             self.errorMsg("Please login first!")
             return
         
-        user_transaction_history = self.userTrans(self.current_active_user['username'])
-        
-        self.sectionHeader("TRANSACTION HISTORY")
-        print(f"  Account: {self.current_active_user['username']:49} ")
-        print(f"├{'─' * 58}┤")
+        history_page_size = 15
+        history_username = self.current_active_user.username
+        total_history_count = self.bank.countUserTrans(history_username)
+        records_skipped = 0
         
-        if len(user_transaction_history) == 0:
-            print(f"│ {'No transactions found.':^56} │")
+        while True:
+            user_transaction_history = self.bank.history(history_username, history_page_size, records_skipped)
+            
+            self.sectionHeader("TRANSACTION HISTORY")
+            print(f"  Account: {history_username:49} ")
+            print(f"├{'─' * 58}┤")
+            
+            if len(user_transaction_history) == 0:
+                print(f"│ {'No transactions found.':^56} │")
+                print(f"└{'─' * 58}┘")
+                return
+            
+            for transaction_item in reversed(user_transaction_history):
+                transaction_date = transaction_item['date']
+                transaction_type = transaction_item['type']
+                transaction_amount = transaction_item['amount']
+                transaction_balance = transaction_item['balance']
+                transaction_details = transaction_item['details']
+                
+                arrow_symbol = "↗ " if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "↘ "
+                color_indicator = "🟢" if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "🔴"
+                
+                print(f" {color_indicator} {transaction_date:16} {transaction_type:12} {arrow_symbol}${transaction_amount:8.2f} ")
+                print(f"   Balance: ${transaction_balance:8.2f} {transaction_details[:30]:30} ")
+                print(f"├{'─' * 58}┤")
+            
+            records_skipped += history_page_size
+            shown_count = min(records_skipped, total_history_count)
+            print(f"  Showing {shown_count} of {total_history_count} transactions")
             print(f"└{'─' * 58}┘")
-            return
-        
-        recent_transactions = user_transaction_history[-15:]
-        
-        for transaction_item in reversed(recent_transactions):
-            transaction_date = transaction_item['date']
-            transaction_type = transaction_item['type']
-            transaction_amount = transaction_item['amount']
-            transaction_balance = transaction_item['balance']
-            transaction_details = transaction_item['details']
             
-            arrow_symbol = "↗ " if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "↘ "
-            color_indicator = "🟢" if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "🔴"
+            if records_skipped >= total_history_count:
+                return
             
-            print(f" {color_indicator} {transaction_date:16} {transaction_type:12} {arrow_symbol}${transaction_amount:8.2f} ")
-            print(f"   Balance: ${transaction_balance:8.2f} {transaction_details[:30]:30} ")
-            print(f"├{'─' * 58}┤")
-        
-        print(f"└{'─' * 58}┘")
+            if input(" Press O for older transactions or Enter to return: ").strip().lower() != 'o':
+                return
 
     def changePass(self):
         if not self.current_active_user:
@@ -497,7 +4081,7 @@ class BankingSystem:
         self.sectionHeader("CHANGE PASSWORD")
         
         current_password_input = getpass.getpass(" Enter current password: ")
-        if current_password_input != self.revealPass(self.current_active_user['password']):
+        if not self.bank.checkPassword(self.active_username, current_password_input):
             self.errorMsg("Incorrect current password!")
             return
         
@@ -511,14 +4095,11 @@ class BankingSystem:
             self.errorMsg("Passwords do not match!")
             return
         
-        existing_accounts = self.getAccounts()
-        for account_record in existing_accounts:
-            if account_record['username'] == self.current_active_user['username']:
-                account_record['password'] = self.hidePass(new_password_input)
-                self.current_active_user['password'] = account_record['password']
-                break
-        
-        self.storeAccounts(existing_accounts)
+        try:
+            self.bank.changePassword(self.active_username, current_password_input, new_password_input)
+        except BankError as err:
+            self.errorMsg(str(err))
+            return
         self.successMsg("Password changed successfully!")
 
     def userMenu(self):
@@ -527,8 +4108,8 @@ class BankingSystem:
 ┌──────────────────────────────────────────────────────────┐
 │                 CUSTOMER BANKING PORTAL                  │
 ├──────────────────────────────────────────────────────────┤
-  Account: {self.current_active_user['username']:<43} 
-  Balance: ${self.current_active_user['balance']:>38.2f} 
+  Account: {self.current_active_user.username:<43} 
+  Balance: ${self.bank.balance(self.active_username):>38.2f} 
 ├──────────────────────────────────────────────────────────┤
   1. 💰  Check Balance                                    
   2. 💵  Deposit Money                                    
@@ -570,11 +4151,15 @@ class BankingSystem:
   2. 📋  View All Transactions                            
   3. 📊  System Statistics                                
   4. 🔍  Search Account                                   
-  5. ↩️   Back to Main Menu                                
+  5. 📡  Live Transaction Feed                            
+  6. 📁  Export Report                                    
+  7. 🗓️   Search Transactions                              
+  8. ⏱️   Performance Metrics                              
+  9. ↩️   Back to Main Menu                                
 └──────────────────────────────────────────────────────────┘
             """)
             
-            admin_choice = input("│ Select option (1-5): ").strip()
+            admin_choice = input("│ Select option (1-9): ").strip()
             
             if admin_choice == '1':
                 self.showAllAccounts()
@@ -585,12 +4170,20 @@ class BankingSystem:
             elif admin_choice == '4':
                 self.findAccount()
             elif admin_choice == '5':
+                self.followTrans()
+            elif admin_choice == '6':
+                self.exportScreen()
+            elif admin_choice == '7':
+                self.transactionSearch()
+            elif admin_choice == '8':
+                self.metricsScreen()
+            elif admin_choice == '9':
                 break
             else:
                 self.errorMsg("Invalid selection!")
 
     def showAllAccounts(self):
-        account_collection = self.getAccounts()
+        account_collection = self.bank.listAccounts()
         
         self.sectionHeader("ALL ACCOUNTS")
         
@@ -612,55 +4205,84 @@ class BankingSystem:
         print(f"  Total Balance: ${total_balance_sum:>37.2f} ")
         print(f"└{'─' * 58}┘")
 
+    def transRow(self, transaction_item):
+        transaction_time = transaction_item['date'][11:16]
+        transaction_user = transaction_item['username']
+        transaction_type = transaction_item['type']
+        transaction_amount = transaction_item['amount']
+        transaction_balance = transaction_item['balance']
+        transaction_details = transaction_item['details'][:20]
+        
+        direction_symbol = "↗ " if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "↘ "
+        
+        print(f" {transaction_time:5} {transaction_user:12} {transaction_type:12} {direction_symbol}${transaction_amount:7.2f} ")
+        print(f" {transaction_details:20} Balance: ${transaction_balance:7.2f} {'':15} ")
+        print(f"├{'─' * 58}┤")
+
     def showAllTrans(self):
-        transaction_collection = self.getTrans()
+        recent_transactions = self.bank.recentTransactions(20)
         
         self.sectionHeader("ALL TRANSACTIONS")
         
-        if not transaction_collection:
+        if not recent_transactions:
             print(f"│ {'No transactions found.':^56} │")
             print(f"├{'─' * 58}├")
             return
         
-        recent_transactions = transaction_collection[-20:]
-        
-        for transaction_item in reversed(recent_transactions):
-            transaction_time = transaction_item['date'][11:16]
-            transaction_user = transaction_item['username']
-            transaction_type = transaction_item['type']
-            transaction_amount = transaction_item['amount']
-            transaction_balance = transaction_item['balance']
-            transaction_details = transaction_item['details'][:20]
-            
-            direction_symbol = "↗ " if transaction_type in ['DEPOSIT', 'TRANSFER_IN', 'ACCOUNT_CREATION'] else "↘ "
-            
-            print(f" {transaction_time:5} {transaction_user:12} {transaction_type:12} {direction_symbol}${transaction_amount:7.2f} ")
-            print(f" {transaction_details:20} Balance: ${transaction_balance:7.2f} {'':15} ")
-            print(f"├{'─' * 58}┤")
+        for transaction_item in recent_transactions:
+            self.transRow(transaction_item)
         
         print(f"└{'─' * 58}┘")
 
+    def followTrans(self, poll_interval=1.0):
+        self.sectionHeader("LIVE TRANSACTION FEED")
+        print(f"  Press Ctrl+C to stop {'':35} ")
+        print(f"├{'─' * 58}┤")
+        
+        for transaction_item in reversed(self.bank.recentTransactions(10)):
+            self.transRow(transaction_item)
+        
+        try:
+            read_position = self.bank.journalPosition()
+            while True:
+                journal_position = self.bank.journalPosition()
+                if journal_position < read_position:
+                    read_position = journal_position
+                if journal_position > read_position:
+                    for transaction_record in self.bank.transactionsBetween(read_position, journal_position):
+                        self.transRow(transaction_record)
+                    read_position = journal_position
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print(f"└{'─' * 58}┘")
+        except Exception as err:
+            logProblem("Problem reading transaction data: " + str(err))
+
     def showStats(self):
-        account_collection = self.getAccounts()
-        transaction_collection = self.getTrans()
+        system_statistics = self.bank.statistics()
+        total_accounts_count = system_statistics['account_count']
         
-        if not account_collection:
+        if not total_accounts_count:
             self.errorMsg("No accounts in the system.")
             return
         
-        total_balance_calc = sum(account_record['balance'] for account_record in account_collection)
-        average_balance_calc = total_balance_calc / len(account_collection)
+        total_balance_calc = system_statistics['balance_total']
+        average_balance_calc = system_statistics['average_balance']
+        lowest_balance = system_statistics['lowest_balance']
+        highest_balance = system_statistics['highest_balance']
         
         self.sectionHeader("SYSTEM STATISTICS")
-        print(f" Total Accounts: {len(account_collection):<41} ")
+        print(f" Total Accounts: {total_accounts_count:<41} ")
         print(f" Total Balance: ${total_balance_calc:>38.2f} ")
         print(f" Average Balance: ${average_balance_calc:>36.2f} ")
+        print(f" Highest Balance: ${highest_balance:>36.2f} ")
+        print(f" Lowest Balance: ${lowest_balance:>37.2f} ")
         
-        balance_values = [account_record['balance'] for account_record in account_collection]
-        print(f" Highest Balance: ${max(balance_values):>36.2f} ")
-        print(f" Lowest Balance: ${min(balance_values):>37.2f} ")
-        
-        print(f" Total Transactions: {len(transaction_collection):<36} ")
+        print(f" Total Transactions: {system_statistics['transaction_count']:<36} ")
+        for transaction_type in sorted(system_statistics['type_counts']):
+            type_count = system_statistics['type_counts'][transaction_type]
+            type_volume = system_statistics['type_volumes'][transaction_type]
+            print(f"   {transaction_type:18} {type_count:>10}  ${type_volume:>20.2f} ")
         print(f"└{'─' * 58}┘")
 
     def findAccount(self):
@@ -668,26 +4290,176 @@ class BankingSystem:
         
         search_term = input(" Enter username to search: ").strip().lower()
         
-        account_collection = self.getAccounts()
-        if not account_collection:
+        if not self.bank.statistics()['account_count']:
             self.errorMsg("No accounts found.")
             return
         
-        search_results = []
-        for account_record in account_collection:
-            if search_term in account_record['username'].lower():
-                search_results.append(account_record)
+        search_page_size = 10
+        results_skipped = 0
         
-        if len(search_results) == 0:
-            self.errorMsg("No accounts found matching your search.")
-            return
+        while True:
+            # One extra result tells whether another page follows.
+            search_results = self.bank.searchAccounts(search_term, search_page_size + 1, results_skipped)
+            
+            if len(search_results) == 0:
+                self.errorMsg("No accounts found matching your search.")
+                return
+            
+            shown_results = search_results[:search_page_size]
+            self.successMsg("Showing account(s) " + str(results_skipped + 1) + "-" + str(results_skipped + len(shown_results)))
+            for account_result in shown_results:
+                print(f"┌{'─' * 58}┐")
+                print(f" Username: {account_result['username']:<46} ")
+                print(f" Balance: ${account_result['balance']:>46.2f} ")
+                print(f"└{'─' * 58}┘")
+            
+            if len(search_results) <= search_page_size:
+                return
+            
+            results_skipped += search_page_size
+            if input(" Press N for more results or Enter to return: ").strip().lower() != 'n':
+                return
+
+    def transactionSearch(self):
+        self.sectionHeader("SEARCH TRANSACTIONS")
+        print(f"  Leave a field blank to match everything {'':17} ")
+        print(f"├{'─' * 58}┤")
+        
+        start_date = input(" From date YYYY-MM-DD: ").strip() or None
+        end_date = input(" To date YYYY-MM-DD: ").strip() or None
+        type_text = input(" Types (e.g. DEPOSIT,TRANSFER_OUT): ").strip()
+        account_username = input(" Username: ").strip() or None
+        minimum_amount = input(" Minimum amount: $").strip() or None
+        maximum_amount = input(" Maximum amount: $").strip() or None
+        transaction_types = [type_name for type_name in type_text.split(',') if type_name.strip()]
+        
+        search_page_size = 10
+        results_skipped = 0
         
-        self.successMsg("Found " + str(len(search_results)) + " account(s)")
-        for account_result in search_results:
-            print(f"┌{'─' * 58}┐")
-            print(f" Username: {account_result['username']:<46} ")
-            print(f" Balance: ${account_result['balance']:>46.2f} ")
+        while True:
+            try:
+                matching_transactions = self.bank.findTransactions(
+                    start_date, end_date, transaction_types, account_username, minimum_amount, maximum_amount,
+                    search_page_size + 1, results_skipped
+                )
+            except BankError as err:
+                self.errorMsg(str(err))
+                return
+            
+            if len(matching_transactions) == 0:
+                self.errorMsg("No transactions found matching your search.")
+                return
+            
+            shown_transactions = matching_transactions[:search_page_size]
+            self.sectionHeader("MATCHING TRANSACTIONS")
+            for transaction_item in shown_transactions:
+                print(f" {transaction_item['date']:19} {transaction_item['username']:12} {transaction_item['type']:16} ${transaction_item['amount']:8.2f} ")
+                print(f"   Balance: ${transaction_item['balance']:8.2f} {transaction_item['details'][:30]:30} ")
+                print(f"├{'─' * 58}┤")
+            print(f"  Showing {results_skipped + 1}-{results_skipped + len(shown_transactions)} {'':40} ")
             print(f"└{'─' * 58}┘")
+            
+            if len(matching_transactions) <= search_page_size:
+                return
+            
+            results_skipped += search_page_size
+            if input(" Press N for more results or Enter to return: ").strip().lower() != 'n':
+                return
+
+    def exportScreen(self):
+        self.sectionHeader("EXPORT REPORT")
+        print(f"  Reports: {', '.join(REPORT_COLUMNS):<47} ")
+        print(f"├{'─' * 58}┤")
+        
+        report_name = input(" Report name: ").strip().lower()
+        report_options = {}
+        if report_name == 'statement':
+            report_options['account_username'] = input(" Username: ").strip()
+        if report_name == 'top':
+            report_options['top_count'] = input(" Number of accounts (default 10): ").strip() or 10
+        if report_name in ('statement', 'transactions', 'daily'):
+            report_options['start_date'] = input(" From date YYYY-MM-DD (blank for all): ").strip() or None
+            report_options['end_date'] = input(" To date YYYY-MM-DD (blank for all): ").strip() or None
+        output_format = input(" Format csv/jsonl (default csv): ").strip().lower() or 'csv'
+        output_path = input(" Output file: ").strip()
+        
+        if not output_path:
+            self.errorMsg("Please enter an output file!")
+            return
+        
+        try:
+            exported_files = self.bank.exportReport(report_name, output_path, output_format, **report_options)
+        except BankError as err:
+            self.errorMsg(str(err))
+            return
+        
+        self.successMsg("Exported " + str(exported_files[0][1]) + " row(s) to " + output_path)
+
+    def metricsTable(self):
+        metrics_document = self.bank.metrics.metricsDocument()
+        self.sectionHeader("PERFORMANCE METRICS")
+        status_text = "on since " + metrics_document['since'] if metrics_document['enabled'] else "off"
+        print(f"  Metrics: {status_text:<47} ")
+        if metrics_document['profile_mode']:
+            print(f"  Profiling ({metrics_document['profile_mode']}): {', '.join(metrics_document['profiled_operations']) or 'nothing'} ")
+        print(f"├{'─' * 58}┤")
+        if not metrics_document['operations']:
+            print(f"│ {'No calls recorded.':^56} │")
+        else:
+            print(f" {'Operation':24} {'Calls':>6} {'Total s':>8} {'Avg ms':>8} {'Max ms':>8} ")
+            print(f" {'':24} {'Rows':>6} {'Read KB':>8} {'Write KB':>8} {'Errors':>8} ")
+            print(f"├{'─' * 58}┤")
+            for operation_row in metrics_document['operations']:
+                print(f" {operation_row['operation']:24} {operation_row['calls']:>6} {operation_row['seconds']:>8.3f} {operation_row['average_ms']:>8.2f} {operation_row['max_seconds'] * 1000:>8.2f} ")
+                print(f" {'':24} {operation_row['rows']:>6} {operation_row['bytes_read'] / 1024:>8.1f} {operation_row['bytes_written'] / 1024:>8.1f} {operation_row['errors']:>8} ")
+        print(f"└{'─' * 58}┘")
+
+    def metricsScreen(self):
+        while True:
+            self.metricsTable()
+            print("  1. Turn metrics " + ("off" if self.bank.metrics.enabled else "on"))
+            print("  2. Reset counters")
+            print("  3. Show profile of an operation")
+            print("  4. Save metrics as JSON")
+            print("  5. Back")
+            metrics_choice = input(" Select option (1-5): ").strip()
+            
+            if metrics_choice == '1':
+                if self.bank.metrics.enabled:
+                    self.bank.metrics.disable()
+                    continue
+                profile_mode = input(" Profile mode cprofile/tracemalloc (blank for none): ").strip().lower() or None
+                profiled_operations = []
+                if profile_mode:
+                    profiled_operations = [operation_name.strip() for operation_name in input(" Operations to profile, e.g. service.transfer: ").split(',') if operation_name.strip()]
+                try:
+                    self.bank.metrics.enable(profile_mode, profiled_operations)
+                except BankError as err:
+                    self.errorMsg(str(err))
+            elif metrics_choice == '2':
+                self.bank.metrics.reset()
+            elif metrics_choice == '3':
+                profile_text = self.bank.metrics.profileReport(input(" Operation: ").strip())
+                if profile_text is None:
+                    self.errorMsg("No profile recorded for that operation!")
+                else:
+                    print(profile_text)
+            elif metrics_choice == '4':
+                output_path = input(" Output file: ").strip()
+                if not output_path:
+                    self.errorMsg("Please enter an output file!")
+                    continue
+                try:
+                    with open(output_path, 'w') as file_handle:
+                        json.dump(self.bank.metrics.metricsDocument(), file_handle, indent=2)
+                except OSError as err:
+                    self.errorMsg("Could not write " + output_path + ": " + str(err))
+                    continue
+                self.successMsg("Metrics saved to " + output_path)
+            elif metrics_choice == '5':
+                break
+            else:
+                self.errorMsg("Invalid selection!")
 
     def mainScreen(self):
         while True:
@@ -713,13 +4485,138 @@ class BankingSystem:
             elif main_choice == '3':
                 self.adminScreen()
             elif main_choice == '4':
+                self.bank.saveSnapshot()
                 self.successMsg("Thank you for using our Bank System!")
                 break
             else:
                 self.errorMsg("Invalid selection!")
 
+def saveMetrics(operation_metrics, output_path):
+    try:
+        with open(output_path, 'w') as file_handle:
+            json.dump(operation_metrics.metricsDocument(), file_handle, indent=2)
+    except OSError as err:
+        logProblem("Problem saving metrics: " + str(err))
+
+def optionValue(option_name, default_value):
+    if option_name in sys.argv[1:]:
+        option_index = sys.argv.index(option_name)
+        if option_index + 1 < len(sys.argv):
+            return sys.argv[option_index + 1]
+    return default_value
+
+def runReport():
+    report_name = optionValue('--report', None)
+    output_path = optionValue('--output', None)
+    shard_count = int(optionValue('--shards', 1))
+    if report_name not in REPORT_COLUMNS or (shard_count > 1 and not output_path):
+        print("Usage: python BankSystem.py --report <" + "|".join(REPORT_COLUMNS) + "> [--user NAME] [--from YYYY-MM-DD] [--to YYYY-MM-DD]")
+        print("       [--top N] [--format csv|jsonl] [--output FILE] [--shards N --workers N]")
+        return False
+    worker_count = optionValue('--workers', None)
+    report_options = {'start_date': optionValue('--from', None), 'end_date': optionValue('--to', None)}
+    if report_name == 'statement':
+        report_options['account_username'] = optionValue('--user', None)
+    if report_name == 'top':
+        report_options['top_count'] = optionValue('--top', 10)
+    bank = BankService()
+    try:
+        exported_files = bank.exportReport(
+            report_name, output_path or sys.stdout, optionValue('--format', 'csv'), shard_count,
+            int(worker_count) if worker_count else None, **report_options
+        )
+    except BankError as err:
+        print(str(err), file=sys.stderr)
+        return False
+    finally:
+        bank.close()
+    if output_path:
+        for exported_path, exported_count in exported_files:
+            print("Exported " + str(exported_count) + " row(s) to " + exported_path)
+    return True
+
 def initialize():
-    system_instance = BankingSystem()
+    if '--hash-benchmark' in sys.argv[1:]:
+        benchmarkPasswordHashing()
+        sys.exit(0)
+    if '--memory-benchmark' in sys.argv[1:]:
+        benchmarkRecordMemory()
+        sys.exit(0)
+    if '--report' in sys.argv[1:]:
+        sys.exit(0 if runReport() else 1)
+    system_instance = BankingSystem(headless=True if '--headless' in sys.argv[1:] else None)
+    metrics_path = optionValue('--metrics-output', None)
+    if metrics_path:
+        profile_operations = optionValue('--profile-ops', '')
+        system_instance.bank.metrics.enable(optionValue('--profile', None), [operation_name for operation_name in profile_operations.split(',') if operation_name])
+        atexit.register(saveMetrics, system_instance.bank.metrics, metrics_path)
+    if '--migrate' in sys.argv[1:]:
+        argument_index = sys.argv.index('--migrate')
+        target_backend = sys.argv[argument_index + 1] if argument_index + 1 < len(sys.argv) else 'sqlite'
+        try:
+            migrated_accounts, migrated_transactions = system_instance.bank.migrateStorage(target_backend)
+        except BankError as err:
+            print(str(err))
+            sys.exit(1)
+        print("Migrated " + str(migrated_accounts) + " accounts and " + str(migrated_transactions) + " transactions to " + target_backend)
+        sys.exit(0)
+    if '--batch' in sys.argv[1:]:
+        argument_index = sys.argv.index('--batch')
+        if argument_index + 1 >= len(sys.argv):
+            print("Usage: python BankSystem.py --batch <operations.csv|operations.jsonl> [--results <results.csv>]")
+            sys.exit(2)
+        results_file_path = None
+        if '--results' in sys.argv[1:] and sys.argv.index('--results') + 1 < len(sys.argv):
+            results_file_path = sys.argv[sys.argv.index('--results') + 1]
+        sys.exit(0 if system_instance.runBatch(sys.argv[argument_index + 1], results_file_path) else 1)
+    if '--verify' in sys.argv[1:]:
+        stats_mismatches = system_instance.bank.verifyStats()
+        for mismatch_text in stats_mismatches:
+            print(mismatch_text)
+        print("Statistics verified: " + ("OK" if not stats_mismatches else str(len(stats_mismatches)) + " mismatch(es)"))
+        sys.exit(1 if stats_mismatches else 0)
+    if '--check-ledger' in sys.argv[1:]:
+        worker_count = optionValue('--workers', None)
+        ledger_table = system_instance.bank.getTrans(int(worker_count) if worker_count else None)
+        for rejected_row in ledger_table.rejected_rows:
+            print(f"{rejected_row['source']} line {rejected_row['line']}: {rejected_row['reason']}")
+        print(f"Ledger check: {len(ledger_table)} rows loaded, {len(ledger_table.rejected_rows)} rejected")
+        sys.exit(1 if ledger_table.rejected_rows else 0)
+    if '--snapshot' in sys.argv[1:]:
+        if not system_instance.bank.saveSnapshot():
+            print("No snapshot written (snapshots are used by the csv backend only)")
+            sys.exit(1)
+        print("Snapshot written at journal position " + str(system_instance.bank.snapshot_position))
+        sys.exit(0)
+    if '--rotate' in sys.argv[1:]:
+        if not system_instance.bank.rotateJournal():
+            print("No segment written (the journal is empty, or the backend is not csv)")
+            sys.exit(1)
+        print("Journal closed into segment ending at position " + str(system_instance.bank.storage.closed_segments[-1]['end_position']))
+        sys.exit(0)
+    if '--rebuild-accounts' in sys.argv[1:]:
+        worker_count = optionValue('--workers', None)
+        try:
+            rebuild_report = system_instance.bank.rebuildAccounts(int(worker_count) if worker_count else None)
+        except BankError as err:
+            print(str(err))
+            sys.exit(1)
+        for changed_account in rebuild_report['changed_accounts']:
+            print(f"{changed_account['username']}: ${changed_account['previous_balance']:,.2f} -> ${changed_account['balance']:,.2f}")
+        for account_username in rebuild_report['orphaned_users']:
+            print(f"Ledger entries for {account_username} have no matching account (not rebuilt)")
+        print(f"Rebuilt {len(rebuild_report['changed_accounts'])} account balance(s) from {rebuild_report['record_count']} ledger records")
+        sys.exit(0)
+    if '--reconcile' in sys.argv[1:]:
+        worker_count = optionValue('--workers', None)
+        reconciliation_report = system_instance.bank.reconcile(full_replay='--full' in sys.argv[1:], worker_count=int(worker_count) if worker_count else None)
+        for problem_text in reconciliation_report['problems']:
+            print(problem_text)
+        if reconciliation_report['problems']:
+            print("Reconciliation: " + str(len(reconciliation_report['problems'])) + " problem(s) in " + str(reconciliation_report['record_count']) + " records")
+            sys.exit(1)
+        print(f"Reconciliation: OK ({reconciliation_report['record_count']} records, balances ${reconciliation_report['balance_total']:,.2f} = ledger deltas ${reconciliation_report['ledger_total']:,.2f})")
+        sys.exit(0)
     system_instance.mainScreen()
 
 if __name__ == "__main__":
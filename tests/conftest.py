@@ -0,0 +1,27 @@
+import os
+import sys
+import json
+
+import pytest
+
+# The bank modules live in the repository root, next to this folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BankSystem import BankService
+
+@pytest.fixture
+def bank_folder(tmp_path):
+    return str(tmp_path / 'bank_data')
+
+@pytest.fixture
+def open_bank(bank_folder):
+    # Opens a bank on the test's folder, as a new program would. Cheap password hashing keeps account
+    # creation fast; other settings can be given for the first open.
+    def openBank(**config_settings):
+        config_path = os.path.join(bank_folder, 'config.json')
+        if not os.path.isfile(config_path):
+            os.makedirs(bank_folder, exist_ok=True)
+            with open(config_path, 'w') as file_handle:
+                json.dump(dict({'scrypt_n': 1024}, **config_settings), file_handle)
+        return BankService(bank_folder)
+    return openBank
@@ -0,0 +1,51 @@
+import csv
+
+import pytest
+
+from BankSystem import toCents, parseCents, InvalidAmountError, MAXIMUM_CENTS
+
+# Amounts typed by users, sent by clients or read from batch files all pass through toCents().
+
+BAD_AMOUNTS = ['1e999999999', '-1e999999999', '1e-999999999', 'nan', 'inf', '0.001', '1,000', '', 'ten', True]
+
+@pytest.mark.parametrize('amount_value', BAD_AMOUNTS)
+def testBadAmountsRaiseValueError(amount_value):
+    with pytest.raises(ValueError):
+        toCents(amount_value)
+
+@pytest.mark.parametrize('amount_value, amount_cents', [
+    ('10', 1000), ('0.10', 10), (' 2.5 ', 250), ('1e2', 10000), (7, 700), (0.1, 10), ('1e13', MAXIMUM_CENTS)
+])
+def testGoodAmounts(amount_value, amount_cents):
+    assert toCents(amount_value) == amount_cents
+
+def testStoredAmountOutOfRange():
+    with pytest.raises(ValueError):
+        parseCents('1e999999999')
+    assert parseCents('1e-05') == 0
+    assert parseCents('10.0') == 1000
+
+@pytest.mark.parametrize('amount_value', BAD_AMOUNTS)
+def testBankRejectsBadAmounts(open_bank, amount_value):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.createAccount('bob', 'bob-password', 10)
+    for bank_operation in (lambda: bank.deposit('alice', amount_value), lambda: bank.withdraw('alice', amount_value),
+                           lambda: bank.transfer('alice', 'bob', amount_value)):
+        with pytest.raises(InvalidAmountError):
+            bank_operation()
+    assert bank.balance('alice') == 10
+
+def testBatchKeepsGoingPastHugeAmount(open_bank, tmp_path):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    batch_path = str(tmp_path / 'postings.csv')
+    with open(batch_path, 'w', newline='') as file_handle:
+        csv_writer = csv.writer(file_handle)
+        csv_writer.writerow(['operation', 'username', 'amount'])
+        csv_writer.writerows([['deposit', 'alice', '1e999999999'], ['deposit', 'alice', 'nan'], ['deposit', 'alice', '5']])
+    batch_results = bank.processBatch(batch_path)
+    assert [(result_item['status'], result_item['reason']) for result_item in batch_results] == [
+        ('REJECTED', 'Invalid amount!'), ('REJECTED', 'Invalid amount!'), ('ACCEPTED', '')
+    ]
+    assert bank.balance('alice') == 15
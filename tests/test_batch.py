@@ -0,0 +1,76 @@
+import os
+import csv
+import json
+
+from BankSystem import BankingSystem
+
+# Batch rows are applied in order against the running balances and saved in one commit at the end.
+
+BATCH_HEADER = ['operation', 'username', 'amount', 'recipient', 'description']
+
+def writeCsvBatch(batch_path, batch_rows):
+    with open(batch_path, 'w', newline='') as file_handle:
+        csv_writer = csv.writer(file_handle)
+        csv_writer.writerow(BATCH_HEADER)
+        csv_writer.writerows(batch_rows)
+
+def openAccounts(open_bank):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.createAccount('bob', 'bob-password', 0)
+    return bank
+
+def testRowsUseRunningBalances(open_bank, tmp_path):
+    bank = openAccounts(open_bank)
+    batch_path = str(tmp_path / 'postings.csv')
+    writeCsvBatch(batch_path, [
+        ['withdraw', 'alice', '15', '', ''],
+        ['deposit', 'alice', '20', '', 'paycheck'],
+        ['withdraw', 'alice', '15', '', ''],
+        ['transfer', 'alice', '15.01', 'bob', 'too much'],
+        ['transfer', 'alice', '15', 'bob', 'rent'],
+        ['transfer', 'bob', '1', 'bob', ''],
+        ['deposit', 'carol', '1', '', ''],
+        ['refund', 'alice', '1', '', ''],
+        ['deposit', 'alice', '-3', '', ''],
+        ['deposit', 'alice', '0.001', '', '']
+    ])
+    batch_results = bank.processBatch(batch_path)
+    assert [result_item['status'] for result_item in batch_results] == ['REJECTED', 'ACCEPTED', 'ACCEPTED', 'REJECTED', 'ACCEPTED'] + ['REJECTED'] * 5
+    assert [result_item['line'] for result_item in batch_results] == list(range(2, 12))
+    assert batch_results[0]['reason'] == "Insufficient funds!"
+    assert batch_results[7]['reason'] == "Unknown operation!"
+    assert bank.balance('alice') == 0
+    assert bank.balance('bob') == 15
+    
+    restarted_bank = open_bank()
+    assert restarted_bank.balance('bob') == 15
+    assert [history_record['details'] for history_record in restarted_bank.history('bob')] == ['Initial deposit', 'Transfer from alice: rent']
+    assert restarted_bank.reconcile()['problems'] == []
+
+def testJsonLinesBatchWithResultsFile(open_bank, tmp_path):
+    bank = openAccounts(open_bank)
+    batch_path = str(tmp_path / 'postings.jsonl')
+    with open(batch_path, 'w') as file_handle:
+        file_handle.write(json.dumps({'operation': 'deposit', 'username': 'bob', 'amount': '2.50'}) + '\n')
+        file_handle.write('{not json\n')
+        file_handle.write('\n')
+        file_handle.write(json.dumps({'operation': 'transfer', 'username': 'bob', 'recipient': 'alice', 'amount': 1}) + '\n')
+    banking_system = BankingSystem(headless=True, bank_service=bank)
+    assert not banking_system.runBatch(batch_path)
+    
+    with open(os.path.join(str(tmp_path), 'postings.results.csv'), newline='') as file_handle:
+        result_rows = list(csv.DictReader(file_handle))
+    assert [(result_row['line'], result_row['status'], result_row['reason']) for result_row in result_rows] == [
+        ('1', 'ACCEPTED', ''), ('2', 'REJECTED', 'Malformed row!'), ('4', 'ACCEPTED', '')
+    ]
+    assert bank.balance('alice') == 11
+    assert bank.balance('bob') == 1.5
+
+def testBatchOfRejectedRowsWritesNothing(open_bank, tmp_path):
+    bank = openAccounts(open_bank)
+    journal_position = bank.storage.journalPosition()
+    batch_path = str(tmp_path / 'postings.csv')
+    writeCsvBatch(batch_path, [['withdraw', 'bob', '1', '', ''], ['deposit', 'alice', 'ten', '', '']])
+    assert [result_item['status'] for result_item in bank.processBatch(batch_path)] == ['REJECTED', 'REJECTED']
+    assert bank.storage.journalPosition() == journal_position
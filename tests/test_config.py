@@ -0,0 +1,28 @@
+import os
+import json
+
+# config.json holds only what the user put there, plus the backend chosen by a migration.
+
+def readConfig(bank_folder):
+    with open(os.path.join(bank_folder, 'config.json')) as file_handle:
+        return json.load(file_handle)
+
+def testMigrationWritesOnlyTheBackend(open_bank, bank_folder):
+    bank = open_bank(segment_days=7)
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.migrateStorage('sqlite')
+    assert readConfig(bank_folder) == {'scrypt_n': 1024, 'segment_days': 7, 'storage_backend': 'sqlite'}
+    assert [file_name for file_name in os.listdir(bank_folder) if file_name.endswith('.tmp')] == []
+    restarted_bank = open_bank()
+    assert restarted_bank.bank_config['storage_backend'] == 'sqlite'
+    assert restarted_bank.balance('alice') == 10
+
+def testEnvironmentOverrideIsNotSaved(open_bank, bank_folder, monkeypatch):
+    open_bank()
+    monkeypatch.setenv('BANK_STORAGE_BACKEND', 'sqlite')
+    bank = open_bank()
+    assert bank.bank_config['storage_backend'] == 'sqlite'
+    bank.saveConfig({'segment_days': 3})
+    assert readConfig(bank_folder) == {'scrypt_n': 1024, 'segment_days': 3}
+    monkeypatch.delenv('BANK_STORAGE_BACKEND')
+    assert open_bank().bank_config['storage_backend'] == 'csv'
@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+
+from BankSystem import InvalidInputError
+
+# Records are normally written in date order; the dated rows below also include one written after a later
+# day (a "late" record) and one whose date is not in the usual layout.
+DATED_DEPOSITS = [
+    ('alice', '2026-01-01 09:00:00', 100),
+    ('bob', '2026-01-01 17:30:00', 250),
+    ('alice', '2026-01-02 08:00:00', 300),
+    ('bob', '2026-01-04 12:00:00', 50),
+    ('alice', '2026-01-02 23:59:59', 700),
+    ('bob', '2026-01-05 00:00:00', 1000),
+    ('alice', '2026/01/06', 25),
+    ('alice', '2026-01-06 10:00:00', 400)
+]
+
+def postDeposits(bank):
+    bank.createAccount('alice', 'alice-password', 0)
+    bank.createAccount('bob', 'bob-password', 0)
+    for account_username, record_date, amount_cents in DATED_DEPOSITS:
+        deposit_record = bank.newTransRecord(account_username, 'DEPOSIT', amount_cents, int(bank.getBal(account_username) * 100) + amount_cents, 'dated')
+        deposit_record.date = record_date
+        bank.setBalance(account_username, deposit_record.balance)
+        assert bank.commitChanges([deposit_record])
+
+def scanDeposits(start_date=None, end_date=None, account_username=None, minimum_cents=None):
+    return [
+        (record_username, record_date) for record_username, record_date, amount_cents in DATED_DEPOSITS
+        if (start_date is None or record_date[:10] >= start_date) and (end_date is None or record_date[:10] <= end_date)
+        and account_username in (None, record_username) and (minimum_cents is None or amount_cents >= minimum_cents)
+    ]
+
+QUERIES = [
+    {}, {'start_date': '2026-01-02'}, {'end_date': '2026-01-02'}, {'start_date': '2026-01-02', 'end_date': '2026-01-02'},
+    {'start_date': '2026-01-03', 'end_date': '2026-01-03'}, {'start_date': '2026-01-04', 'end_date': '2026-01-05'},
+    {'start_date': '2025-12-01', 'end_date': '2025-12-31'}, {'start_date': '2026-01-06'}, {'start_date': '2026-01-07'},
+    {'start_date': '2026-01-02', 'account_username': 'alice'}, {'end_date': '2026-01-04', 'account_username': 'bob'},
+    {'start_date': '2026-01-01', 'end_date': '2026-01-05', 'minimum_cents': 300}
+]
+
+def findDeposits(bank, query_options):
+    query_options = dict(query_options)
+    minimum_cents = query_options.pop('minimum_cents', None)
+    if minimum_cents is not None:
+        query_options['minimum_amount'] = Decimal(minimum_cents).scaleb(-2)
+    return [(found_record['username'], found_record['date']) for found_record in bank.findTransactions(transaction_types=['deposit'], **query_options)]
+
+@pytest.mark.parametrize('backend_name', ['csv', 'sqlite'])
+def testDateRangesMatchScan(open_bank, backend_name):
+    bank = open_bank(storage_backend=backend_name)
+    postDeposits(bank)
+    for query_options in QUERIES:
+        assert findDeposits(bank, query_options) == scanDeposits(**query_options), query_options
+    bank.close()
+    
+    restarted_bank = open_bank()
+    for query_options in QUERIES:
+        assert findDeposits(restarted_bank, query_options) == scanDeposits(**query_options), query_options
+    assert findDeposits(restarted_bank, {'start_date': '2026-01-02', 'end_date': '2026-01-02'}) == [('alice', '2026-01-02 08:00:00'), ('alice', '2026-01-02 23:59:59')]
+
+def testDateRangeAcrossSegments(open_bank):
+    bank = open_bank()
+    postDeposits(bank)
+    assert bank.rotateJournal()
+    bank.deposit('bob', '1')
+    assert findDeposits(bank, {'start_date': '2026-01-02', 'end_date': '2026-01-04'}) == scanDeposits('2026-01-02', '2026-01-04')
+    assert findDeposits(bank, {'account_username': 'alice', 'end_date': '2026-01-02'}) == scanDeposits(end_date='2026-01-02', account_username='alice')
+
+def testQueryPagingAndValidation(open_bank):
+    bank = open_bank()
+    postDeposits(bank)
+    assert findDeposits(bank, {'start_date': '2026-01-01', 'end_date': '2026-01-06'})[2:5] == [
+        (found_record['username'], found_record['date'])
+        for found_record in bank.findTransactions('2026-01-01', '2026-01-06', ['DEPOSIT'], result_limit=3, skip_count=2)
+    ]
+    with pytest.raises(InvalidInputError):
+        bank.findTransactions(start_date='2026/01/01')
+    with pytest.raises(InvalidInputError):
+        bank.findTransactions(transaction_types=['REFUND'])
@@ -0,0 +1,72 @@
+import os
+import csv
+
+import pytest
+
+import BankSystem
+from BankSystem import BankError
+
+# Older versions could write a line break inside a quoted field. Every reader of the ledger must leave
+# such a record out in the same way, so they all agree on what the ledger holds.
+
+LEGACY_DETAILS = 'line one\nbogus,2026-01-01 00:00:00,DEPOSIT,999.00,999.00,x\n"quoted"'
+
+def openLegacyBank(open_bank):
+    # The record is appended the way older versions wrote it, between two runs of the program.
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.createAccount('bob', 'bob-password', 10)
+    for deposit_number in range(30):
+        bank.deposit('alice', 1, 'a%d' % deposit_number)
+    with open(bank.storage.transactions_file_path, 'a', newline='') as file_handle:
+        csv.writer(file_handle).writerow(['alice', '2026-01-01 00:00:00', 'DEPOSIT', '0.00', '40.00', LEGACY_DETAILS])
+    bank = open_bank()
+    for deposit_number in range(30):
+        bank.deposit('bob', 1, 'b%d' % deposit_number)
+    return bank
+
+@pytest.mark.parametrize('line_break', ['\n', '\r', 'a\r\nb'])
+def testLineBreaksAreRefused(open_bank, line_break):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.createAccount('bob', 'bob-password', 10)
+    with pytest.raises(BankError):
+        bank.deposit('alice', 1, 'one' + line_break + 'two')
+    with pytest.raises(BankError):
+        bank.transfer('alice', 'bob', 1, line_break)
+    with pytest.raises(BankError):
+        bank.createAccount('carol' + line_break, 'carol-password', 1)
+    assert bank.balance('alice') == 10
+
+def testReadersAgreeOnMultiLineRecord(open_bank, monkeypatch):
+    bank = openLegacyBank(open_bank)
+    ledger_records = bank.transactionsBetween(0, bank.storage.journalPosition())
+    assert len(ledger_records) == 62
+    assert not any('bogus' in ledger_record['username'] or 'line one' in ledger_record['details'] for ledger_record in ledger_records)
+    assert 'bogus' not in bank.storage.transaction_index
+    assert bank.history('alice', 2) == [ledger_record for ledger_record in ledger_records if ledger_record['username'] == 'alice'][-2:]
+    assert bank.recentTransactions(62) == list(reversed(ledger_records))
+    assert bank.findTransactions(minimum_amount='500') == []
+    
+    restarted_bank = open_bank()
+    assert restarted_bank.history('alice') == bank.history('alice')
+    for chunk_size in (BankSystem.LEDGER_CHUNK_SIZE, 500):
+        monkeypatch.setattr(BankSystem, 'LEDGER_CHUNK_SIZE', chunk_size)
+        transaction_table = restarted_bank.getTrans(1)
+        assert len(transaction_table) == 62
+        assert [(rejected_row['line'], rejected_row['reason']) for rejected_row in transaction_table.rejected_rows] == [(34, 'record spans 3 lines')]
+        reconcile_report = restarted_bank.reconcile(full_replay=True, worker_count=1)
+        assert reconcile_report['record_count'] == 62
+        assert reconcile_report['problems'] == ['transactions.csv line 34: record spans 3 lines']
+
+def testSegmentFooterSkipsMultiLineRecord(open_bank):
+    bank = openLegacyBank(open_bank)
+    assert bank.rotateJournal()
+    # The footer totals are used in place of the segment's records, so they must count the same records.
+    closed_summary = bank.storage.closedSummary()
+    assert closed_summary['transaction_count'] == len(bank.getTrans(1)) == 62
+    assert closed_summary['type_volumes']['DEPOSIT'] == 6000
+    assert closed_summary['closing_balances'] == {'alice': 4000, 'bob': 4000}
+    assert bank.reconcile()['problems'] == []
+    assert bank.reconcile(full_replay=True)['problems'] == ['segments/' + os.path.basename(bank.storage.closed_segments[0]['path']) + ' line 33: record spans 3 lines']
+    assert bank.recentTransactions(62) == list(reversed(bank.transactionsBetween(0, bank.storage.journalPosition())))
@@ -0,0 +1,85 @@
+import pytest
+
+import BankSystem
+
+# The ledger is replayed in parts (closed segments and slices of the journal) that are folded on their
+# own and merged in order; these tests cut it so that every record is its own part.
+
+def fillBank(bank):
+    bank.createAccount('alice', 'alice-password', 100)
+    bank.createAccount('bob', 'bob-password', 50)
+    bank.deposit('alice', '12.50', 'paycheck')
+    bank.transfer('alice', 'bob', 30, 'rent')
+    bank.withdraw('bob', 5)
+    bank.transfer('bob', 'alice', '7.25', 'lunch')
+
+def readJournal(bank):
+    with open(bank.storage.transactions_file_path, 'rb') as file_handle:
+        return file_handle.read()
+
+def writeJournal(bank, journal_lines):
+    with open(bank.storage.transactions_file_path, 'wb') as file_handle:
+        file_handle.write(b''.join(journal_lines))
+
+@pytest.mark.parametrize('worker_count', [1, 2])
+def testTransfersPairAcrossParts(open_bank, monkeypatch, worker_count):
+    bank = open_bank()
+    fillBank(bank)
+    bank.transfer('alice', 'bob', 1, 'last')
+    # Both halves of each transfer are replayed in different parts.
+    monkeypatch.setattr(BankSystem, 'LEDGER_CHUNK_SIZE', 1)
+    assert len(bank.storage.ledgerChunks()) == readJournal(bank).count(b'\n') - 1
+    reconcile_report = bank.reconcile(full_replay=True, worker_count=worker_count)
+    assert reconcile_report['problems'] == []
+    assert reconcile_report['record_count'] == 10
+
+@pytest.mark.parametrize('dropped_type, expected_problem', [
+    ('TRANSFER_IN', "transfer of 30.00 from alice has no matching TRANSFER_IN"),
+    ('TRANSFER_OUT', "transfer of 30.00 to bob has no matching TRANSFER_OUT")
+])
+def testUnpairedTransferAcrossParts(open_bank, monkeypatch, dropped_type, expected_problem):
+    bank = open_bank()
+    fillBank(bank)
+    journal_lines = readJournal(bank).splitlines(keepends=True)
+    journal_lines.remove(next(journal_line for journal_line in journal_lines if (',' + dropped_type + ',').encode() in journal_line))
+    writeJournal(bank, journal_lines)
+    
+    damaged_bank = open_bank()
+    whole_problems = damaged_bank.reconcile(full_replay=True, worker_count=1)['problems']
+    monkeypatch.setattr(BankSystem, 'LEDGER_CHUNK_SIZE', 1)
+    part_problems = damaged_bank.reconcile(full_replay=True, worker_count=1)['problems']
+    assert any(expected_problem in problem_text for problem_text in part_problems)
+    assert part_problems == whole_problems
+
+def testBrokenBalanceChainAcrossParts(open_bank, monkeypatch):
+    bank = open_bank()
+    fillBank(bank)
+    # The withdrawal records a balance 1.00 too high; each later record of bob follows from it.
+    writeJournal(bank, [journal_line.replace(b',5.00,75.00,', b',5.00,76.00,') for journal_line in readJournal(bank).splitlines(keepends=True)])
+    
+    damaged_bank = open_bank()
+    whole_problems = damaged_bank.reconcile(full_replay=True, worker_count=1)['problems']
+    monkeypatch.setattr(BankSystem, 'LEDGER_CHUNK_SIZE', 1)
+    part_problems = damaged_bank.reconcile(full_replay=True, worker_count=1)['problems']
+    assert part_problems == whole_problems
+    assert any("bob balance 76.00 does not follow from previous balance (expected 75.00)" in problem_text for problem_text in part_problems)
+
+def testSegmentFootersMatchFullReplay(open_bank):
+    bank = open_bank()
+    fillBank(bank)
+    assert bank.rotateJournal()
+    bank.transfer('alice', 'bob', 1, 'after rotation')
+    assert bank.reconcile() == bank.reconcile(full_replay=True)
+    assert bank.reconcile()['problems'] == []
+
+def testRebuildAccountsFromLedger(open_bank):
+    bank = open_bank()
+    fillBank(bank)
+    bank.setBalance('bob', 1)
+    bank.flushAccounts()
+    assert bank.reconcile()['problems'] != []
+    rebuild_report = bank.rebuildAccounts(worker_count=1)
+    assert [changed_account['username'] for changed_account in rebuild_report['changed_accounts']] == ['bob']
+    assert rebuild_report['orphaned_users'] == []
+    assert bank.reconcile()['problems'] == []
+    assert open_bank().balance('bob') == bank.balance('bob')
@@ -0,0 +1,67 @@
+import json
+import tracemalloc
+
+import pytest
+
+from BankSystem import InsufficientFundsError, InvalidInputError, OperationMetrics
+
+def operationTotals(bank):
+    return {operation_row['operation']: operation_row for operation_row in bank.metrics.metricsReport()}
+
+def testDisabledMetricsWrapNothing(open_bank):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.deposit('alice', '1')
+    assert 'deposit' not in vars(bank)
+    assert 'commitChanges' not in vars(bank.storage)
+    assert bank.metrics.metricsReport() == []
+
+def testCallsErrorsAndRowsAreCounted(open_bank):
+    bank = open_bank(metrics=True)
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.deposit('alice', '5')
+    bank.deposit('alice', '2')
+    with pytest.raises(InsufficientFundsError):
+        bank.withdraw('alice', '100')
+    assert len(bank.history('alice')) == 3
+    operation_totals = operationTotals(bank)
+    assert operation_totals['service.deposit']['calls'] == 2
+    assert operation_totals['service.deposit']['errors'] == 0
+    assert operation_totals['service.withdraw']['errors'] == 1
+    assert operation_totals['service.history']['rows'] == 3
+    assert operation_totals['storage.commitChanges']['calls'] == 3
+    assert operation_totals['service.deposit']['max_seconds'] <= operation_totals['service.deposit']['seconds']
+    assert operation_totals['service.deposit']['average_ms'] == pytest.approx(operation_totals['service.deposit']['seconds'] / 2 * 1000)
+    
+    bank.metrics.disable()
+    assert 'deposit' not in vars(bank)
+    bank.deposit('alice', '1')
+    assert operationTotals(bank)['service.deposit']['calls'] == 2
+    bank.metrics.reset()
+    assert bank.metrics.metricsReport() == []
+    bank.metrics.enable()
+    bank.deposit('alice', '1')
+    assert operationTotals(bank)['service.deposit']['calls'] == 1
+
+@pytest.mark.parametrize('profile_mode', ['cprofile', 'tracemalloc'])
+def testProfiledOperation(open_bank, profile_mode):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    was_tracing = tracemalloc.is_tracing()
+    bank.metrics.enable(profile_mode, ['service.deposit'])
+    try:
+        bank.deposit('alice', '1')
+        bank.withdraw('alice', '1')
+        profile_text = bank.metrics.profileReport('service.deposit')
+        assert profile_text
+        assert bank.metrics.profileReport('service.withdraw') is None
+        metrics_document = json.loads(json.dumps(bank.metrics.metricsDocument()))
+        assert metrics_document['profile_mode'] == profile_mode
+        assert list(metrics_document['profiles']) == ['service.deposit']
+    finally:
+        bank.metrics.disable()
+    assert tracemalloc.is_tracing() == was_tracing
+
+def testUnknownProfileMode():
+    with pytest.raises(InvalidInputError):
+        OperationMetrics().enable('perf')
@@ -0,0 +1,79 @@
+import base64
+
+import pytest
+
+import BankSystem
+from BankSystem import PasswordHasher, AuthenticationError
+
+def storedPassword(bank, account_username):
+    return bank.getUser(account_username).password
+
+def testLegacyPasswordIsRehashedOnLogin(open_bank):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    # Older versions kept the password Base64-encoded.
+    bank.getUser('alice').password = base64.b64encode(b'alice-password').decode()
+    bank.dirty_accounts.add('alice')
+    bank.flushAccounts()
+    bank.close()
+    
+    bank = open_bank()
+    with pytest.raises(AuthenticationError):
+        bank.authenticate('alice', 'wrong-password')
+    assert '$' not in storedPassword(bank, 'alice')
+    bank.authenticate('alice', 'alice-password')
+    assert storedPassword(bank, 'alice').startswith('scrypt$1024$8$1$')
+    bank.close()
+    
+    bank = open_bank()
+    assert storedPassword(bank, 'alice').startswith('scrypt$1024$8$1$')
+    assert bank.authenticate('alice', 'alice-password')['username'] == 'alice'
+
+def testChangedCostIsRehashedOnLogin(open_bank, bank_folder):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    bank.saveConfig({'password_hash': 'pbkdf2', 'pbkdf2_iterations': 1000})
+    bank.close()
+    
+    bank = open_bank()
+    assert storedPassword(bank, 'alice').startswith('scrypt$')
+    bank.authenticate('alice', 'alice-password')
+    assert storedPassword(bank, 'alice').startswith('pbkdf2_sha256$1000$')
+
+def testVerifiedPasswordsAreCached(monkeypatch):
+    password_hasher = PasswordHasher('pbkdf2', pbkdf2_iterations=1000, cache_size=1)
+    try:
+        derive_calls = []
+        original_derive = password_hasher.derive
+        monkeypatch.setattr(password_hasher, 'derive', lambda *derive_arguments: derive_calls.append(1) or original_derive(*derive_arguments))
+        alice_password = password_hasher.hash('alice-password')
+        bob_password = password_hasher.hashNow('bob-password')
+        assert len(derive_calls) == 2
+        
+        assert password_hasher.verify('alice-password', alice_password) == (True, False)
+        assert password_hasher.verify('wrong-password', alice_password) == (False, False)
+        assert len(derive_calls) == 3
+        assert password_hasher.verify('bob-password', bob_password) == (True, False)
+        assert password_hasher.verify('bob-password', bob_password) == (True, False)
+        assert len(derive_calls) == 4
+        # With room for one entry, remembering bob dropped alice.
+        assert password_hasher.verify('alice-password', alice_password) == (True, False)
+        assert len(derive_calls) == 5
+        assert bob_password.encode() not in b''.join(password_hasher.verified_cache.values())
+    finally:
+        password_hasher.close()
+
+def testHashersShareOnePool():
+    first_hasher = PasswordHasher('pbkdf2', pbkdf2_iterations=1000, worker_count=3)
+    second_hasher = PasswordHasher('pbkdf2', pbkdf2_iterations=1000, worker_count=3)
+    shared_pool = first_hasher.hash_pool
+    assert second_hasher.hash_pool is shared_pool
+    first_hasher.close()
+    first_hasher.close()
+    assert second_hasher.verify('password', second_hasher.hash('password')) == (True, False)
+    second_hasher.close()
+    assert 3 not in BankSystem.HASH_POOLS
+    with pytest.raises(RuntimeError):
+        shared_pool.submit(len, '')
+    with pytest.raises(ValueError):
+        PasswordHasher(worker_count=-1)
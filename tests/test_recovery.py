@@ -0,0 +1,149 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from BankSystem import JOURNAL_HEADER
+
+# Every test opens a bank, stops it at one step of a write as a crash would, then opens the folder
+# again and checks that balances, journal, index, statistics and reconcile() all agree.
+
+def fillBank(bank):
+    bank.createAccount('alice', 'alice-password', 100)
+    bank.createAccount('bob', 'bob-password', 50)
+    bank.deposit('alice', '12.50', 'paycheck')
+    bank.transfer('alice', 'bob', 30, 'rent')
+    bank.withdraw('bob', 5)
+    bank.transfer('bob', 'alice', '7.25', 'lunch')
+
+def readJournal(bank):
+    with open(bank.storage.transactions_file_path, 'rb') as file_handle:
+        return file_handle.read()
+
+def assertConsistent(bank, expected_balances):
+    assert not os.path.exists(bank.storage.pending_file_path)
+    assert readJournal(bank).endswith(b'\n')
+    reconcile_report = bank.reconcile(full_replay=True)
+    assert reconcile_report['problems'] == []
+    assert reconcile_report['balance_total'] == sum(Decimal(expected_balance) for expected_balance in expected_balances.values())
+    ledger_records = bank.transactionsBetween(0, bank.storage.journalPosition())
+    for account_username, expected_balance in expected_balances.items():
+        user_records = [ledger_record for ledger_record in ledger_records if ledger_record['username'] == account_username]
+        assert bank.balance(account_username) == Decimal(expected_balance)
+        assert user_records[-1]['balance'] == Decimal(expected_balance)
+        # History is read through the offset index, so it must point at exactly these records.
+        assert bank.history(account_username) == user_records
+    assert bank.verifyStats() == []
+
+EXPECTED_BALANCES = {'alice': '89.75', 'bob': '67.75'}
+CRASHED_BALANCES = {'alice': '79.75', 'bob': '77.75'}
+
+def writeAt(target_path, target_offset, target_rows):
+    with open(target_path, 'rb+') as file_handle:
+        file_handle.truncate(target_offset)
+        file_handle.seek(target_offset)
+        file_handle.write(target_rows)
+
+def applyNothing(storage, journal_offset, journal_rows, accounts_offset, account_rows):
+    pass
+
+def applyTornJournal(storage, journal_offset, journal_rows, accounts_offset, account_rows):
+    writeAt(storage.transactions_file_path, journal_offset, journal_rows[:len(journal_rows) // 2])
+
+def applyJournalOnly(storage, journal_offset, journal_rows, accounts_offset, account_rows):
+    writeAt(storage.transactions_file_path, journal_offset, journal_rows)
+
+def applyTornAccountLog(storage, journal_offset, journal_rows, accounts_offset, account_rows):
+    writeAt(storage.transactions_file_path, journal_offset, journal_rows)
+    writeAt(storage.account_log_path, accounts_offset, account_rows[:len(account_rows) // 2])
+
+def applyTwice(storage, journal_offset, journal_rows, accounts_offset, account_rows):
+    # A replay that itself crashed after writing everything leaves the rows in place already.
+    writeAt(storage.transactions_file_path, journal_offset, journal_rows)
+    writeAt(storage.account_log_path, accounts_offset, account_rows)
+
+@pytest.mark.parametrize('apply_part', [applyNothing, applyTornJournal, applyJournalOnly, applyTornAccountLog, applyTwice])
+def testPendingCommitIsReplayed(open_bank, monkeypatch, apply_part):
+    bank = open_bank()
+    fillBank(bank)
+    def crashingApply(journal_offset, journal_rows, accounts_offset, account_rows, all_accounts):
+        assert accounts_offset is not None
+        apply_part(bank.storage, journal_offset, journal_rows, accounts_offset, account_rows)
+        raise OSError("simulated crash")
+    monkeypatch.setattr(bank.storage, 'applyCommit', crashingApply)
+    # The commit is durable once commit.pending is written, so the transfer is reported as done.
+    bank.transfer('alice', 'bob', 10, 'crash')
+    assert os.path.isfile(bank.storage.pending_file_path)
+    
+    restarted_bank = open_bank()
+    assertConsistent(restarted_bank, CRASHED_BALANCES)
+    assert [ledger_record['details'] for ledger_record in restarted_bank.history('bob')][-1] == 'Transfer from alice: crash'
+    restarted_bank.deposit('bob', 1)
+    assertConsistent(open_bank(), {'alice': '79.75', 'bob': '78.75'})
+
+def testPendingCompactionIsReplayed(open_bank, monkeypatch):
+    # Without an account log offset the commit rewrites users.csv, which must also survive a crash first.
+    bank = open_bank()
+    fillBank(bank)
+    bank.storage.account_log_ready = False
+    def crashingApply(journal_offset, journal_rows, accounts_offset, account_rows, all_accounts):
+        assert accounts_offset is None
+        raise OSError("simulated crash")
+    monkeypatch.setattr(bank.storage, 'applyCommit', crashingApply)
+    bank.transfer('alice', 'bob', 10, 'crash')
+    
+    restarted_bank = open_bank()
+    assertConsistent(restarted_bank, CRASHED_BALANCES)
+    with open(restarted_bank.storage.account_log_path, 'rb') as file_handle:
+        assert file_handle.read().count(b'\n') == 1
+
+@pytest.mark.parametrize('torn_row', [b'alice,2026-01-01 00:00:00,DEPOSIT,5.00,', b'alice,2026-01-01 00:00:00,TRANSFER_OUT,5.00,84.75,"Transfer to bob: ren'])
+def testTornLastLineIsDropped(open_bank, torn_row):
+    bank = open_bank()
+    fillBank(bank)
+    journal_content = readJournal(bank)
+    with open(bank.storage.transactions_file_path, 'ab') as file_handle:
+        file_handle.write(torn_row)
+    
+    restarted_bank = open_bank()
+    assert readJournal(restarted_bank) == journal_content
+    assertConsistent(restarted_bank, EXPECTED_BALANCES)
+
+def testRotationIsRolledForward(open_bank, monkeypatch):
+    bank = open_bank()
+    fillBank(bank)
+    replace_file = bank.storage.replaceFile
+    def crashingReplace(target_path, file_content):
+        # The segment is written; the crash comes before the journal is started again.
+        if target_path == bank.storage.transactions_file_path:
+            raise OSError("simulated crash")
+        replace_file(target_path, file_content)
+    monkeypatch.setattr(bank.storage, 'replaceFile', crashingReplace)
+    assert not bank.rotateJournal()
+    assert len(os.listdir(bank.storage.segments_folder)) == 1
+    assert readJournal(bank).count(b'\n') > 1
+    
+    restarted_bank = open_bank()
+    assert len(restarted_bank.storage.closed_segments) == 1
+    assert readJournal(restarted_bank) == JOURNAL_HEADER
+    assertConsistent(restarted_bank, EXPECTED_BALANCES)
+    restarted_bank.deposit('alice', 1)
+    assertConsistent(open_bank(), {'alice': '90.75', 'bob': '67.75'})
+
+def testRewriteIsRolledForward(open_bank, monkeypatch):
+    bank = open_bank()
+    fillBank(bank)
+    assert bank.rotateJournal()
+    bank.deposit('bob', 2)
+    ledger_records = list(bank.storage.readTransFrom(0, bank.storage.journalPosition()))
+    def crashingRemove():
+        # The rewritten journal is in place; the crash comes before the old segments are removed.
+        raise OSError("simulated crash")
+    monkeypatch.setattr(bank.storage, 'removeSegments', crashingRemove)
+    assert not bank.storage.storeTrans(ledger_records)
+    assert os.path.isfile(bank.storage.rewrite_file_path)
+    
+    restarted_bank = open_bank()
+    assert restarted_bank.storage.closed_segments == []
+    assert not os.path.exists(restarted_bank.storage.rewrite_file_path)
+    assertConsistent(restarted_bank, {'alice': '89.75', 'bob': '69.75'})
@@ -0,0 +1,98 @@
+import io
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from BankSystem import AccountNotFoundError, InvalidInputError
+
+def fillBank(bank):
+    bank.createAccount('alice', 'alice-password', 100)
+    bank.createAccount('bob', 'bob-password', 50)
+    bank.createAccount('carol', 'carol-password', 75)
+    bank.deposit('alice', '10.50', 'paycheck')
+    bank.withdraw('bob', '20')
+    bank.transfer('alice', 'carol', '5.25', 'lunch')
+
+def readCsvReport(report_path):
+    with open(report_path, newline='', encoding='utf-8') as file_handle:
+        return list(csv.DictReader(file_handle))
+
+def testTransactionsReportFormats(open_bank, tmp_path):
+    bank = open_bank()
+    fillBank(bank)
+    csv_path = str(tmp_path / 'ledger.csv')
+    jsonl_path = str(tmp_path / 'ledger.jsonl')
+    assert bank.exportReport('transactions', csv_path) == [(csv_path, 7)]
+    assert bank.exportReport('transactions', jsonl_path, 'jsonl') == [(jsonl_path, 7)]
+    csv_rows = readCsvReport(csv_path)
+    with open(jsonl_path, encoding='utf-8') as file_handle:
+        jsonl_rows = [json.loads(report_line) for report_line in file_handle]
+    assert [report_row['type'] for report_row in csv_rows] == ['ACCOUNT_CREATION'] * 3 + ['DEPOSIT', 'WITHDRAWAL', 'TRANSFER_OUT', 'TRANSFER_IN']
+    assert [(report_row['username'], report_row['amount'], report_row['balance']) for report_row in csv_rows[3:]] == [
+        ('alice', '10.50', '110.50'), ('bob', '20.00', '30.00'), ('alice', '5.25', '105.25'), ('carol', '5.25', '80.25')
+    ]
+    assert [{column_name: str(column_value) for column_name, column_value in report_row.items()} for report_row in jsonl_rows] == csv_rows
+
+def testDatedReports(open_bank):
+    bank = open_bank()
+    fillBank(bank)
+    today = datetime.now().strftime("%Y-%m-%d")
+    assert len(list(bank.reportRecords('transactions', start_date=today, end_date=today))) == 7
+    assert list(bank.reportRecords('transactions', end_date='2000-01-01')) == []
+    assert list(bank.reportRecords('daily', start_date=today)) == [
+        {'date': today, 'type': 'ACCOUNT_CREATION', 'count': 3, 'volume': Decimal('225.00')},
+        {'date': today, 'type': 'DEPOSIT', 'count': 1, 'volume': Decimal('10.50')},
+        {'date': today, 'type': 'TRANSFER_IN', 'count': 1, 'volume': Decimal('5.25')},
+        {'date': today, 'type': 'TRANSFER_OUT', 'count': 1, 'volume': Decimal('5.25')},
+        {'date': today, 'type': 'WITHDRAWAL', 'count': 1, 'volume': Decimal('20.00')}
+    ]
+    assert [report_row['details'] for report_row in bank.reportRecords('statement', account_username='carol')] == ['Initial deposit', 'Transfer from alice: lunch']
+    with pytest.raises(InvalidInputError):
+        list(bank.reportRecords('transactions', start_date='18/10/2026'))
+
+def testAccountReports(open_bank):
+    bank = open_bank()
+    fillBank(bank)
+    assert list(bank.reportRecords('top', top_count='2')) == [
+        {'rank': 1, 'username': 'alice', 'balance': Decimal('105.25')},
+        {'rank': 2, 'username': 'carol', 'balance': Decimal('80.25')}
+    ]
+    report_output = io.StringIO()
+    bank.exportReport('accounts', report_output)
+    assert report_output.getvalue().splitlines() == ['username,balance', 'alice,105.25', 'bob,30.00', 'carol,80.25']
+    with pytest.raises(AccountNotFoundError):
+        bank.reportRecords('statement', account_username='dave')
+    with pytest.raises(InvalidInputError):
+        bank.reportRecords('balances')
+
+def testShardedExportCoversLedger(open_bank, tmp_path):
+    bank = open_bank()
+    fillBank(bank)
+    report_path = str(tmp_path / 'ledger.csv')
+    exported_files = bank.exportReport('transactions', report_path, shard_count=2, worker_count=1)
+    assert [shard_path for shard_path, row_count in exported_files] == [str(tmp_path / 'ledger.part0.csv'), str(tmp_path / 'ledger.part1.csv')]
+    assert sum(row_count for shard_path, row_count in exported_files) == 7
+    shard_rows = [report_row for shard_path, row_count in exported_files for report_row in readCsvReport(shard_path)]
+    bank.exportReport('transactions', report_path)
+    sortKey = lambda report_row: (report_row['username'], report_row['type'])
+    assert sorted(shard_rows, key=sortKey) == sorted(readCsvReport(report_path), key=sortKey)
+
+@pytest.mark.parametrize('backend_name', ['csv', 'sqlite'])
+def testReportReaderKeepsItsLedger(open_bank, backend_name):
+    bank = open_bank(storage_backend=backend_name)
+    fillBank(bank)
+    journal_end = bank.journalPosition()
+    ledger_usernames = ['alice', 'bob', 'carol', 'alice', 'bob', 'alice', 'carol']
+    with bank.reportStorage() as report_storage:
+        bank.deposit('bob', '1')
+        bank.rotateJournal()
+        bank.deposit('bob', '2')
+        assert [transaction_record.username for transaction_record in report_storage.readTransFrom(0, journal_end)] == ledger_usernames
+        report_records = report_storage.readTransFrom(0, journal_end)
+        first_record = next(report_records)
+        bank.rotateJournal()
+        assert [first_record.username] + [transaction_record.username for transaction_record in report_records] == ledger_usernames
+        assert len(list(report_storage.readTransFrom(0, journal_end))) == 7
@@ -0,0 +1,52 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from BankSystem import AccountSearchIndex
+
+def expectedMatches(indexed_usernames, search_term):
+    # Names that start with the term come in alphabetical order, the rest in the order they were indexed.
+    lowered_term = search_term.lower()
+    prefix_matches = sorted((account_username for account_username in indexed_usernames if account_username.lower().startswith(lowered_term)), key=str.lower)
+    other_matches = [account_username for account_username in indexed_usernames if lowered_term in account_username.lower() and not account_username.lower().startswith(lowered_term)]
+    return prefix_matches + other_matches
+
+def randomNames(name_count, random_source):
+    # A small alphabet gives many shared and repeated trigrams ("aaaa", "abab").
+    return list({''.join(random_source.choice('abAB_1') for letter_number in range(random_source.randint(1, 7))) for name_number in range(name_count)})
+
+@pytest.mark.parametrize('search_term', ['', 'a', 'B', '_1', 'ab', 'aaa', 'abab', 'Ba_', 'zzz', 'a1b1a'])
+def testSearchMatchesScan(search_term):
+    random_source = random.Random(search_term)
+    account_usernames = randomNames(400, random_source)
+    built_index = AccountSearchIndex(account_usernames[:300])
+    for account_username in account_usernames[300:] + account_usernames[:5]:
+        built_index.add(account_username)
+    indexed_usernames = sorted(account_usernames[:300], key=str.lower) + account_usernames[300:]
+    assert len(built_index) == len(account_usernames)
+    assert built_index.search(search_term) == expectedMatches(indexed_usernames, search_term)
+    assert built_index.search(search_term, 5, 3) == expectedMatches(indexed_usernames, search_term)[3:8]
+
+def testSearchAccounts(open_bank):
+    bank = open_bank()
+    for account_username, opening_balance in [('Alice', 10), ('malice', 20), ('al', 30), ('bob', 40)]:
+        bank.createAccount(account_username, 'password-' + account_username, opening_balance)
+    assert bank.searchAccounts('al') == [
+        {'username': 'al', 'balance': Decimal('30.00')},
+        {'username': 'Alice', 'balance': Decimal('10.00')},
+        {'username': 'malice', 'balance': Decimal('20.00')}
+    ]
+    bank.createAccount('Palace', 'password-Palace', 5)
+    assert [found_account['username'] for found_account in bank.searchAccounts('ALI')] == ['Alice', 'malice']
+    assert [found_account['username'] for found_account in bank.searchAccounts('ala', result_limit=1)] == ['Palace']
+    assert [found_account['username'] for found_account in bank.searchAccounts('l', skip_count=2)] == ['malice', 'Palace']
+
+def testSearchSeesAccountsFromOtherPrograms(open_bank):
+    bank = open_bank()
+    bank.createAccount('alice', 'alice-password', 10)
+    assert [found_account['username'] for found_account in bank.searchAccounts('lic')] == ['alice']
+    other_bank = open_bank()
+    other_bank.createAccount('felicia', 'felicia-password', 10)
+    other_bank.close()
+    assert [found_account['username'] for found_account in bank.searchAccounts('lic')] == ['alice', 'felicia']
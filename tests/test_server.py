@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+from BankSystem import AuthenticationError
+from BankServer import BankServer, BankClient, loadTest
+
+def runWithServer(open_bank, tmp_path, client_function, **bank_patches):
+    # Runs client_function(unix_path, bank_server) against a server on a Unix socket in tmp_path.
+    bank_server = BankServer(bank_service=open_bank(), worker_count=4)
+    for method_name, replacement in bank_patches.items():
+        setattr(bank_server.bank, method_name, replacement)
+    unix_path = str(tmp_path / 'bank.sock')
+    async def serveAndRun():
+        listening_server = await asyncio.start_unix_server(bank_server.handleSession, path=unix_path)
+        async with listening_server:
+            return await asyncio.wait_for(client_function(unix_path, bank_server), 60)
+    try:
+        return asyncio.run(serveAndRun())
+    finally:
+        bank_server.close()
+
+def testOperations(open_bank, tmp_path):
+    async def clientSession(unix_path, bank_server):
+        bank_client = await BankClient.connect(unix_path=unix_path)
+        try:
+            assert await bank_client.call('ping') == {'ok': True, 'result': 'pong', 'id': 1}
+            assert (await bank_client.call('create_account', username='alice', password='alice-password', amount='100'))['ok']
+            assert (await bank_client.call('create_account', username='bob', password='bob-password'))['ok']
+            assert (await bank_client.call('balance'))['error'] == 'AuthenticationError'
+            assert (await bank_client.call('login', username='alice', password='wrong'))['error'] == 'AuthenticationError'
+            assert (await bank_client.call('login', username='alice', password='alice-password'))['result'] == {'username': 'alice'}
+            deposit_response = await bank_client.call('deposit', amount=12.5, description='paycheck')
+            assert (deposit_response['result']['amount'], deposit_response['result']['balance']) == ('12.50', '112.50')
+            assert (await bank_client.call('withdraw', amount='500'))['error'] == 'InsufficientFundsError'
+            assert (await bank_client.call('withdraw', amount=True))['error'] == 'InvalidAmountError'
+            assert (await bank_client.call('transfer', recipient='bob', amount='2.50'))['ok']
+            assert (await bank_client.call('balance'))['result'] == '110.00'
+            assert (await bank_client.call('stats'))['result']['account_count'] == 2
+            assert (await bank_client.call('sync'))['ok']
+            assert (await bank_client.call('refund'))['message'] == "Unknown operation!"
+            assert (await bank_client.call('logout'))['ok']
+            assert (await bank_client.call('balance'))['error'] == 'AuthenticationError'
+            
+            for raw_request, error_message in [(b'{not json\n', "Malformed request!"), (b'[1, 2]\n', "Request must be a JSON object!")]:
+                bank_client.stream_writer.write(b'\n' + raw_request)
+                raw_response = json.loads(await bank_client.stream_reader.readline())
+                assert raw_response == {'ok': False, 'error': 'InvalidInputError', 'message': error_message}
+            assert (await bank_client.call('ping'))['ok']
+        finally:
+            await bank_client.close()
+    runWithServer(open_bank, tmp_path, clientSession)
+
+def testHistoryPaging(open_bank, tmp_path):
+    async def clientSession(unix_path, bank_server):
+        bank_client = await BankClient.connect(unix_path=unix_path)
+        try:
+            await bank_client.call('create_account', username='alice', password='alice-password', amount='1')
+            await bank_client.call('login', username='alice', password='alice-password')
+            for deposit_number in range(5):
+                await bank_client.call('deposit', amount=1, description='deposit ' + str(deposit_number))
+            history_response = await bank_client.call('history', limit='2', skip=1)
+            assert [history_record['details'] for history_record in history_response['result']] == ['deposit 2', 'deposit 3']
+            assert len((await bank_client.call('history'))['result']) == 6
+            for bad_count in [-1, 'abc', True, 1.5, [2]]:
+                history_response = await bank_client.call('history', limit=bad_count)
+                assert history_response['error'] == 'InvalidInputError', bad_count
+                assert (await bank_client.call('history', skip=bad_count))['error'] == 'InvalidInputError'
+        finally:
+            await bank_client.close()
+    runWithServer(open_bank, tmp_path, clientSession)
+
+def testSessionsAreSeparate(open_bank, tmp_path):
+    def failingStatistics():
+        raise RuntimeError("disk on fire")
+    async def clientSessions(unix_path, bank_server):
+        first_client = await BankClient.connect(unix_path=unix_path)
+        second_client = await BankClient.connect(unix_path=unix_path)
+        try:
+            await first_client.call('create_account', username='alice', password='alice-password', amount='5')
+            await first_client.call('login', username='alice', password='alice-password')
+            assert (await second_client.call('balance'))['error'] == 'AuthenticationError'
+            assert await first_client.call('stats') == {'ok': False, 'error': 'InternalError', 'message': "Request could not be processed!", 'id': 3}
+            # The failed request did not end the session or its login.
+            assert (await first_client.call('balance'))['result'] == '5.00'
+            assert bank_server.open_sessions == 2
+        finally:
+            await first_client.close()
+            await second_client.close()
+    runWithServer(open_bank, tmp_path, clientSessions, statistics=failingStatistics)
+
+def testLoadTest(open_bank, tmp_path, capsys):
+    async def runLoadTest(unix_path, bank_server):
+        return await loadTest(3, 20, unix_path=unix_path)
+    assert runWithServer(open_bank, tmp_path, runLoadTest)
+    assert 'Balance check: OK' in capsys.readouterr().out
+
+def testLoadTestStopsWhenAClientFails(open_bank, tmp_path, capsys):
+    async def runLoadTest(unix_path, bank_server):
+        return await loadTest(4, 20, unix_path=unix_path)
+    def refuseThirdClient(account_username, input_password):
+        if account_username.endswith('_2'):
+            raise AuthenticationError("Invalid username or password!")
+        return {'username': account_username}
+    assert not runWithServer(open_bank, tmp_path, runLoadTest, authenticate=refuseThirdClient)
+    assert "Load test failed: " in capsys.readouterr().out
+
+def testLoadTestWithoutServer(tmp_path, capsys):
+    assert not asyncio.run(asyncio.wait_for(loadTest(3, 5, unix_path=str(tmp_path / 'missing.sock')), 60))
+    assert "Load test failed: " in capsys.readouterr().out
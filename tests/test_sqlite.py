@@ -0,0 +1,66 @@
+import os
+import sqlite3
+from decimal import Decimal
+
+# The SQLite backend keeps amounts as INTEGER cents; databases written with REAL dollar columns are
+# converted the first time they are opened.
+
+def fillBank(bank):
+    bank.createAccount('alice', 'alice-password', '0.10')
+    bank.createAccount('bob', 'bob-password', '0.20')
+    bank.deposit('alice', '0.20', 'coffee')
+    bank.transfer('bob', 'alice', '0.05', 'split')
+    bank.withdraw('alice', '0.30')
+
+def testMigrationRoundTrip(open_bank, bank_folder):
+    bank = open_bank()
+    fillBank(bank)
+    csv_history = bank.history('alice')
+    assert bank.migrateStorage('sqlite') == (2, 6)
+    bank.close()
+    
+    sqlite_bank = open_bank()
+    assert sqlite_bank.storage.backend_name == 'sqlite'
+    assert sqlite_bank.balance('alice') == Decimal('0.05')
+    assert sqlite_bank.balance('bob') == Decimal('0.15')
+    assert sqlite_bank.history('alice') == csv_history
+    assert [found_record['amount'] for found_record in sqlite_bank.findTransactions(minimum_amount='0.10', maximum_amount='0.20')] == [Decimal('0.10'), Decimal('0.20'), Decimal('0.20')]
+    assert sqlite_bank.reconcile()['problems'] == []
+    with sqlite3.connect(os.path.join(bank_folder, 'bank.db')) as connection:
+        assert connection.execute("SELECT typeof(amount), typeof(balance) FROM transactions").fetchall() == [('integer', 'integer')] * 6
+        assert connection.execute("SELECT balance FROM accounts ORDER BY rowid").fetchall() == [(5,), (15,)]
+    
+    sqlite_bank.deposit('bob', '0.85')
+    assert sqlite_bank.migrateStorage('csv') == (2, 7)
+    sqlite_bank.close()
+    csv_bank = open_bank()
+    assert csv_bank.balance('bob') == 1
+    assert csv_bank.reconcile()['problems'] == []
+
+def testRealColumnsAreConverted(open_bank, bank_folder):
+    os.makedirs(bank_folder)
+    with sqlite3.connect(os.path.join(bank_folder, 'bank.db')) as connection:
+        connection.executescript("""
+            CREATE TABLE accounts (username TEXT PRIMARY KEY, password TEXT NOT NULL, balance REAL NOT NULL);
+            CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, date TEXT NOT NULL,
+                type TEXT NOT NULL, amount REAL NOT NULL, balance REAL NOT NULL, details TEXT NOT NULL);
+            CREATE INDEX transactions_username ON transactions (username, id);
+            CREATE INDEX transactions_date ON transactions (date, id);
+        """)
+        connection.execute("INSERT INTO accounts VALUES ('alice', 'x', ?)", (0.1 + 0.2,))
+        connection.executemany("INSERT INTO transactions (username, date, type, amount, balance, details) VALUES (?, ?, ?, ?, ?, ?)", [
+            ('alice', '2026-01-01 09:00:00', 'ACCOUNT_CREATION', 0.1, 0.1, 'Initial deposit'),
+            ('alice', '2026-01-02 09:00:00', 'DEPOSIT', 0.2, 0.1 + 0.2, '')
+        ])
+    
+    bank = open_bank(storage_backend='sqlite')
+    assert bank.balance('alice') == Decimal('0.30')
+    assert [found_record['amount'] for found_record in bank.findTransactions(minimum_amount='0.20')] == [Decimal('0.20')]
+    assert bank.reconcile()['problems'] == []
+    bank.deposit('alice', '1.00')
+    bank.close()
+    with sqlite3.connect(os.path.join(bank_folder, 'bank.db')) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == 1
+        assert connection.execute("SELECT id, amount, balance FROM transactions").fetchall() == [(1, 10, 10), (2, 20, 30), (3, 100, 130)]
+        assert sorted(row_data[1] for row_data in connection.execute("PRAGMA index_list(transactions)")) == ['transactions_date', 'transactions_username']
+        assert connection.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_real'").fetchall() == []